@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Measures the time taken to import the modules of capybara_tw in a fresh interpreter,
+and checks that the headless modules do not load Qt.
+
+Usage:
+    python benchmarks/import_time.py [--max-ms MS]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must be usable without Qt
+HEADLESS_MODULES = (
+    'capybara_tw',
+    'capybara_tw.model.capy_xliff',
+    'capybara_tw.util.segmenter',
+    'capybara_tw.cli',
+)
+GUI_MODULES = (
+    'capybara_tw.app',
+)
+
+
+def measure(module: str):
+    """ Imports module in a new interpreter.
+
+    Returns: A tuple of the cumulative import time in milliseconds and whether PyQt5 has been loaded.
+    """
+    code = f'import sys, {module}; print("PyQt5" in sys.modules)'
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+    cumulative = 0
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            cumulative = int(fields[1])
+    return cumulative / 1000, proc.stdout.strip() == 'True'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-ms', type=float, default=None, help='fail if a headless module takes longer to import')
+    args = parser.parse_args()
+
+    failed = False
+    for module in HEADLESS_MODULES + GUI_MODULES:
+        elapsed, loads_qt = measure(module)
+        headless = module in HEADLESS_MODULES
+        print(f'{module:35} {elapsed:8.1f} ms{"  (loads Qt)" if loads_qt else ""}')
+        if headless and (loads_qt or (args.max_ms is not None and elapsed > args.max_ms)):
+            failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Measures the memory used by the model per trans-unit once a capyxliff file has been loaded.
+
+Usage:
+    python benchmarks/memory_footprint.py [-n COUNT] [FILE]
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.sample import generate  # noqa: E402
+from capybara_tw.model.capy_xliff import CapyXliff  # noqa: E402
+
+
+def measure(path: str) -> None:
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    xliff = CapyXliff.load(path)
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(xliff.get_all_trans_units())
+    print(f'{count} trans-units')
+    print(f'total:             {(after - before) / 1024 / 1024:.1f} MiB (peak {(peak - before) / 1024 / 1024:.1f} MiB)')
+    print(f'per trans-unit:    {(after - before) / max(count, 1):.0f} bytes')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('file', nargs='?', help='capyxliff file to load. A synthetic file is generated if omitted.')
+    parser.add_argument('-n', '--count', type=int, default=100000, help='number of trans-units to generate')
+    args = parser.parse_args()
+    if args.file:
+        measure(args.file)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sample.capyxliff')
+            generate(path, args.count)
+            measure(path)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Generates synthetic capyxliff files for the benchmarks."""
+import argparse
+
+HEADER = ('<?xml version=\'1.0\' encoding=\'utf-8\'?>\n'
+          '<xliff xmlns="urn:oasis:names:tc:xliff:document:1.2" xmlns:capy="http://capybaratranslation.com/capyxliff/1.0"'
+          ' version="1.2" capy:version="1.0">\n')
+
+TRANS_UNIT = '''        <trans-unit id="{id}" capy:original-id="x{id}" translate="yes">
+          <source>An {{1&gt;apple&lt;1}} a day keeps the {{b&gt;doctor&lt;b}} away, number {n}.{{2}}</source>
+          {target}
+          <capy:source-props>
+            <capy:tag id="1">
+              <capy:content>&lt;a href="https://example.com/{n}"&gt;</capy:content>
+            </capy:tag>
+            <capy:tag id="2">
+              <capy:content>&lt;br/&gt;</capy:content>
+            </capy:tag>
+          </capy:source-props>
+          <capy:target-props/>
+        </trans-unit>
+'''
+
+# Number of trans-units in a group
+GROUP_SIZE = 10
+
+
+def generate(path: str, count: int) -> None:
+    """ Writes a capyxliff file with count trans-units, every other one translated.
+
+    Args:
+        path: Path to the file to write
+        count: Number of trans-units
+    """
+    with open(path, 'w', encoding='utf-8') as outfile:
+        outfile.write(HEADER)
+        outfile.write('  <file original="sample.docx" source-language="en-US" target-language="ja-JP" datatype="x-docx">\n'
+                      '    <body>\n')
+        for n in range(count):
+            if n % GROUP_SIZE == 0:
+                if n:
+                    outfile.write('      </group>\n')
+                outfile.write(f'      <group id="g{n}" capy:original-id="o{n}">\n')
+            if n % 2:
+                target = f'<target state="translated">{{1&gt;リンゴ&lt;1}}を一日一個食べれば{{b&gt;医者&lt;b}}いらず、{n}番。{{2}}</target>'
+            else:
+                target = '<target/>'
+            outfile.write(TRANS_UNIT.format(id=n, n=n, target=target))
+        if count:
+            outfile.write('      </group>\n')
+        outfile.write('    </body>\n  </file>\n</xliff>\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('output', help='path to the file to write')
+    parser.add_argument('-n', '--count', type=int, default=10000, help='number of trans-units')
+    args = parser.parse_args()
+    generate(args.output, args.count)
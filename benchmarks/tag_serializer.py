@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Times TagEditor.to_model_data on tag-dense segments, against the former per-character serializer.
+
+Usage:
+    QT_QPA_PLATFORM=offscreen python benchmarks/tag_serializer.py [-t TAGS] [-r REPEAT]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+from capybara_tw.gui.tageditor import (TagEditor, TagKind, TagTextObject, OBJECT_REPLACEMENT_CHARACTER,  # noqa: E402
+                                       LINE_SEPARATOR, PARAGRAPH_SEPARATOR)
+
+
+def per_character(editor: TagEditor) -> str:
+    """The former serializer, which looks up the fragment of every tag from the start of its block."""
+    doc = editor.document()
+    substrings = []
+    for pos in range(0, doc.characterCount() - 1):
+        char = doc.characterAt(pos)
+        if ord(char) == OBJECT_REPLACEMENT_CHARACTER:
+            it = doc.findBlock(pos).begin()
+            while not it.atEnd():
+                fragment = it.fragment()
+                if fragment.contains(pos):
+                    substrings.append(TagTextObject.stringify(fragment.charFormat()))
+                    break
+                it += 1
+        elif ord(char) in (LINE_SEPARATOR, PARAGRAPH_SEPARATOR):
+            substrings.append('\n')
+        else:
+            substrings.append(char)
+    return ''.join(substrings)
+
+
+def fill(editor: TagEditor, tags: int) -> None:
+    """Fills the editor with a segment made of tag pairs around short words, with a line break every 10 pairs."""
+    cursor = editor.textCursor()
+    for i in range(tags // 2):
+        tag_id = str(i % 99 + 1)
+        TagEditor.insert_tag(cursor, tag_id, f'<span id="{i}">', TagKind.START)
+        cursor.insertText(f'word{i}')
+        TagEditor.insert_tag(cursor, tag_id, '', TagKind.END)
+        cursor.insertText(chr(LINE_SEPARATOR) if i % 10 == 9 else ' ')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-t', '--tags', type=int, nargs='+', default=[10, 50, 200, 1000], help='numbers of tags per segment')
+    parser.add_argument('-r', '--repeat', type=int, default=20, help='number of calls to time')
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    for count in args.tags:
+        editor = TagEditor()
+        fill(editor, count)
+        assert editor.to_model_data() == per_character(editor)
+        single_pass = timeit.timeit(editor.to_model_data, number=args.repeat) / args.repeat
+        reference = timeit.timeit(lambda: per_character(editor), number=args.repeat) / args.repeat
+        print(f'{count:5} tags: single pass {single_pass * 1000:8.3f} ms, per character {reference * 1000:8.3f} ms')
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Times fuzzy lookups in a translation memory of synthetic sentences.
+
+Usage:
+    python benchmarks/tm_lookup.py [-n UNITS] [-q QUERIES] [--db PATH]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from capybara_tw.tm.translation_memory import TranslationMemory  # noqa: E402
+
+# Number of distinct words the sentences are made of
+VOCABULARY_SIZE = 5000
+
+
+def make_vocabulary(rng: random.Random):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(2, 10))) for _ in range(VOCABULARY_SIZE)]
+
+
+def make_sentence(rng: random.Random, vocabulary) -> str:
+    # Zipf-like word frequencies, as in natural text
+    words = [vocabulary[min(int(rng.paretovariate(1.0)) - 1, VOCABULARY_SIZE - 1)] if rng.random() < 0.5
+             else rng.choice(vocabulary) for _ in range(rng.randint(5, 20))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def perturb(rng: random.Random, vocabulary, sentence: str) -> str:
+    """Replaces a word of the sentence, to look up a fuzzy match."""
+    words = sentence.split(' ')
+    words[rng.randrange(len(words))] = rng.choice(vocabulary)
+    return ' '.join(words)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--units', type=int, default=100000, help='number of units in the TM')
+    parser.add_argument('-q', '--queries', type=int, default=200, help='number of lookups to time')
+    parser.add_argument('--db', help='TM to reuse or create (default: a temporary file)')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = make_vocabulary(rng)
+    sentences = [make_sentence(rng, vocabulary) for _ in range(args.units)]
+    with tempfile.TemporaryDirectory() as tempdir:
+        with TranslationMemory(args.db or os.path.join(tempdir, 'tm.db')) as tm:
+            if not len(tm):
+                start = time.perf_counter()
+                tm.add_all(((s, s.upper()) for s in sentences), 'en-US', 'ja-JP')
+                print(f'imported {len(tm)} units in {time.perf_counter() - start:.1f} s')
+
+            queries = [perturb(rng, vocabulary, rng.choice(sentences)) for _ in range(args.queries)]
+            timings = []
+            found = 0
+            for query in queries:
+                start = time.perf_counter()
+                matches = tm.lookup(query, 'en-US', 'ja-JP')
+                timings.append(time.perf_counter() - start)
+                found += bool(matches)
+            timings.sort()
+            print(f'{len(queries)} lookups: median {timings[len(timings) // 2] * 1000:.2f} ms, '
+                  f'p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} ms, {found} with a match')
@@ -1,7 +1,5 @@
 #!/usr/bin/env python3
 import sys
-from PyQt5.QtWidgets import QApplication
-from capybara_tw.app import MainWindow
 
 __version__ = '0.1'
 __application_name__ = 'Capybara Translation Workbench'
@@ -9,6 +7,11 @@ __organization_name__ = 'Capybara Translation'
 
 
 def run():
+    # Qt and the GUI modules are imported here rather than at package import time,
+    # so that the model, util and cli modules can be used without loading Qt.
+    from PyQt5.QtWidgets import QApplication
+    from capybara_tw.app import MainWindow
+
     app_ = QApplication(sys.argv)
     app_.setApplicationName(__application_name__)
     app_.setOrganizationName(__organization_name__)
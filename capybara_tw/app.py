@@ -1,17 +1,37 @@
 #!/usr/bin/env python3
 import os
+import re
+import time
+from bisect import bisect_right
 from typing import Optional
 
 from PyQt5.Qt import QMainWindow, PYQT_VERSION_STR
-from PyQt5.QtCore import QDir, QSettings, QT_VERSION_STR
-from PyQt5.QtGui import QIcon, QKeySequence
-from PyQt5.QtWidgets import QFileDialog, QDialog, QMessageBox, QApplication
+from PyQt5.QtCore import QDir, QSettings, QT_VERSION_STR, QTimer, Qt
+from PyQt5.QtGui import QIcon, QKeySequence, QCloseEvent
+from PyQt5.QtWidgets import (QFileDialog, QDialog, QMessageBox, QApplication, QProgressBar, QLineEdit, QAction,
+                             QComboBox)
 
 from capybara_tw.gui.main_window import Ui_MainWindow
 from capybara_tw.gui.preferences_dialog import Ui_PreferencesDialog
-from capybara_tw.xliff_model import XliffModel
+from capybara_tw.gui.qa_panel import QaPanel
+from capybara_tw.gui.tm_panel import TmPanel
+from capybara_tw.model.capy_trans_unit import CapyTransUnit
+from capybara_tw.qa_model import QaIssueModel
+from capybara_tw.tm.translation_memory import TranslationMemory
+from capybara_tw.util.xliff_util import State
+from capybara_tw.xliff_filter_model import XliffFilterModel
+from capybara_tw.xliff_model import GetTransUnitRole, XliffModel
 
 DEFAULT_FONT_SIZE = 15
+# Files larger than this (in bytes) are opened in lazy mode
+LAZY_LOADING_THRESHOLD = 50 * 1000000
+# Interval (in milliseconds) between automatic saves of a modified file
+AUTOSAVE_INTERVAL = 60 * 1000
+# Items of the filter combo box besides the states
+FILTER_EMPTY_TARGET = 'empty-target'
+FILTER_TAG_MISMATCH = 'tag-mismatch'
+# Number of matches of the current segment looked up in the translation memory
+TM_MATCH_LIMIT = 5
 
 
 class PreferencesDialog(QDialog, Ui_PreferencesDialog):
@@ -38,21 +58,85 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.setupUi(self)
 
         self.model: Optional[XliffModel] = None
+        self.filterModel = XliffFilterModel(self)
         self.srcEditor.set_readonly_with_text_selectable()
 
+        self.loadingProgressBar = QProgressBar(self)
+        self.loadingProgressBar.setMaximumWidth(200)
+        self.loadingProgressBar.setRange(0, 100)
+        self.loadingProgressBar.hide()
+        self.statusbar.addPermanentWidget(self.loadingProgressBar)
+
+        self.findLineEdit = QLineEdit(self)
+        self.findLineEdit.setPlaceholderText('Find in source and target')
+        self.findLineEdit.setClearButtonEnabled(True)
+        self.findLineEdit.setMaximumWidth(300)
+        self.findLineEdit.returnPressed.connect(self.find_next)
+        self.findLineEdit.textChanged.connect(self.on_find_text_changed)
+        self.toolBar.addSeparator()
+        self.toolBar.addWidget(self.findLineEdit)
+
+        self.filterComboBox = QComboBox(self)
+        self.filterComboBox.addItem('All segments', None)
+        self.filterComboBox.addItem('Empty target', FILTER_EMPTY_TARGET)
+        self.filterComboBox.addItem('Tag mismatch', FILTER_TAG_MISMATCH)
+        for state in State:
+            self.filterComboBox.addItem(f'State: {state.value}', state)
+        self.filterComboBox.currentIndexChanged.connect(self.apply_filter)
+        self.filterLineEdit = QLineEdit(self)
+        self.filterLineEdit.setPlaceholderText('Filter (regular expression)')
+        self.filterLineEdit.setClearButtonEnabled(True)
+        self.filterLineEdit.setMaximumWidth(300)
+        self.filterLineEdit.returnPressed.connect(self.apply_filter)
+        self.toolBar.addSeparator()
+        self.toolBar.addWidget(self.filterComboBox)
+        self.toolBar.addWidget(self.filterLineEdit)
+
+        self.qaModel = QaIssueModel(self)
+        self.qaPanel = QaPanel(self)
+        self.qaPanel.setModel(self.qaModel)
+        self.qaPanel.runButton.clicked.connect(self.run_qa)
+        self.qaPanel.segmentActivated.connect(self.move_to_segment)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.qaPanel)
+        self.qaPanel.hide()
+
+        self.tm: Optional[TranslationMemory] = None
+        self.tmPanel = TmPanel(self)
+        self.tmPanel.openButton.clicked.connect(self.open_tm)
+        self.tmPanel.translationActivated.connect(self.insert_tm_match)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.tmPanel)
+        # The lookup is deferred to the event loop, so that moving quickly over segments only looks up the last one.
+        self._tm_lookup_tu: Optional[CapyTransUnit] = None
+        self.tmLookupTimer = QTimer(self)
+        self.tmLookupTimer.setSingleShot(True)
+        self.tmLookupTimer.setInterval(0)
+        self.tmLookupTimer.timeout.connect(self.look_up_tm)
+
+        self.autosaveTimer = QTimer(self)
+        self.autosaveTimer.setInterval(AUTOSAVE_INTERVAL)
+        self.autosaveTimer.timeout.connect(self.autosave)
+        self.autosaveTimer.start()
+
         self.translationGrid.currentSourceSegmentChanged.connect(self.srcEditor.initialize)
         self.translationGrid.currentTargetSegmentChanged.connect(self.tgtEditor.initialize)
+        self.translationGrid.currentSourceSegmentChanged.connect(self.schedule_tm_lookup)
+
+        self.translationGrid.adjacentSegmentsChanged.connect(self.srcEditor.prefetch)
+        self.translationGrid.adjacentSegmentsChanged.connect(self.tgtEditor.prefetch)
 
         self.srcEditor.segmentEdited.connect(self.translationGrid.set_source_segment)
         self.tgtEditor.segmentEdited.connect(self.translationGrid.set_target_segment)
-        self.srcEditor.segmentEdited.connect(self.translationGrid.resize_current_row)
-        self.tgtEditor.segmentEdited.connect(self.translationGrid.resize_current_row)
+        self.srcEditor.lineCountChanged.connect(self.translationGrid.resize_current_row)
+        self.tgtEditor.lineCountChanged.connect(self.translationGrid.resize_current_row)
 
         self.initialize_actions()
         self.enable_actions(False)
         self.enable_widgets(False)
 
         self.apply_preferences()
+        tm_path = self.preferences.value('tm/path', '', type=str)
+        if tm_path and os.path.isfile(tm_path):
+            self.set_tm(tm_path)
 
         self.show()
 
@@ -100,11 +184,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.actionConfirmSegment.setIcon(confirm_icon)
         self.actionConfirmSegment.setToolTip(
             f'{self.actionConfirmSegment.toolTip()} ({self.actionConfirmSegment.shortcut().toString(QKeySequence.NativeText)})')
+        self.actionConfirmSegment.triggered.connect(self.confirm_segment)
 
         unconfirm_icon = QIcon(':/icon/unconfirm.png')
         self.actionUnconfirmSegment.setIcon(unconfirm_icon)
         self.actionUnconfirmSegment.setToolTip(
             f'{self.actionUnconfirmSegment.toolTip()} ({self.actionUnconfirmSegment.shortcut().toString(QKeySequence.NativeText)})')
+        self.actionUnconfirmSegment.triggered.connect(self.unconfirm_segment)
 
         self.actionOpen.triggered.connect(self.open_file)
         self.actionSave.triggered.connect(self.save)
@@ -115,6 +201,20 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.actionExpandTags.triggered.connect(self.srcEditor.expand_tags)
         self.actionExpandTags.triggered.connect(self.tgtEditor.expand_tags)
 
+        self.actionFind = QAction('&Find', self)
+        self.actionFind.setShortcut(QKeySequence.Find)
+        self.actionFind.triggered.connect(self.focus_find)
+        self.menuEdit.addAction(self.actionFind)
+
+        self.actionRunQa = QAction('Run &QA', self)
+        self.actionRunQa.setShortcut(QKeySequence(Qt.Key_F7))
+        self.actionRunQa.triggered.connect(self.run_qa)
+        self.menuTools.addAction(self.actionRunQa)
+
+        self.actionOpenTm = QAction('Open &Translation Memory...', self)
+        self.actionOpenTm.triggered.connect(self.open_tm)
+        self.menuTools.addAction(self.actionOpenTm)
+
         self.actionPreferences.triggered.connect(self.show_preferences_dialog)
 
         message = (
@@ -139,8 +239,17 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.actionConfirmSegment.setEnabled(is_enabled)
         self.actionUnconfirmSegment.setEnabled(is_enabled)
         self.actionInsertTag.setEnabled(is_enabled)
+        self.actionFind.setEnabled(is_enabled)
+        self.actionRunQa.setEnabled(is_enabled)
 
     def enable_widgets(self, is_enabled: bool) -> None:
+        self.enable_editors(is_enabled)
+        self.findLineEdit.setEnabled(is_enabled)
+        self.filterComboBox.setEnabled(is_enabled)
+        self.filterLineEdit.setEnabled(is_enabled)
+        self.qaPanel.runButton.setEnabled(is_enabled)
+
+    def enable_editors(self, is_enabled: bool) -> None:
         self.srcEditor.setEnabled(is_enabled)
         self.tgtEditor.setEnabled(is_enabled)
 
@@ -148,7 +257,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         tu_grid_font = self.translationGrid.font()
         tu_grid_font.setPointSize(self.preferences.value('appearance/tu_grid/font_size', DEFAULT_FONT_SIZE, type=int))
         self.translationGrid.setFont(tu_grid_font)
-        self.translationGrid.resizeRowsToContents()
+        self.translationGrid.refresh_row_heights()
 
         editor_font_size = self.preferences.value('appearance/editors/font_size', DEFAULT_FONT_SIZE, type=int)
         self.srcEditor.setStyleSheet(f'font-size: {editor_font_size}pt')
@@ -170,15 +279,246 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             filter='Capyxliff Files (*.capyxliff) ;;All Files (*)',
         )
         if filename:
+            if self.model:
+                self.flush_pending_edits()
+                self.model.stop_loading()
+                self.model.finish_saving()
             self.setWindowTitle(f'{self.application_name} - {os.path.basename(filename)}')
-            self.model = XliffModel(filename)
-            self.translationGrid.setModel(self.model)
-            self.translationGrid.selectionModel().selectionChanged.connect(self.translationGrid.selection_changed)
-            self.translationGrid.selectRow(0)
-            self.translationGrid.resizeRowsToContents()
+            self.model = XliffModel(filename, lazy=os.path.getsize(filename) > LAZY_LOADING_THRESHOLD)
+            self.model.loadingProgressed.connect(self.loadingProgressBar.setValue)
+            self.model.loadingFinished.connect(self.loadingProgressBar.hide)
+            self.model.loadingFinished.connect(self.recover_pending_edits)
+            self.model.loadingFailed.connect(self.on_loading_failed)
+            self.model.indexingFailed.connect(self.on_indexing_failed)
+            self.model.savingFinished.connect(lambda: self.statusbar.showMessage('Saved.', 3000))
+            self.model.savingFailed.connect(self.on_saving_failed)
+            self.qaModel.set_xliff_model(self.model)
+            self.filterModel.setSourceModel(self.model)
+            self.filterComboBox.setCurrentIndex(0)
+            self.filterLineEdit.clear()
+            self.set_grid_model(self.model)
+            self.loadingProgressBar.setValue(0)
+            self.loadingProgressBar.show()
+            # Rows are added and measured by TranslationGrid as they are fetched
+            self.model.load()
             self.enable_actions(True)
             self.enable_widgets(True)
 
+    def set_grid_model(self, model) -> None:
+        if self.translationGrid.model() is not model:
+            self.translationGrid.setModel(model)
+            self.translationGrid.selectionModel().selectionChanged.connect(self.translationGrid.selection_changed)
+
+    def apply_filter(self) -> None:
+        """Shows the segments meeting the filter chosen in the toolbar, or all of them."""
+        if not self.model:
+            return
+        choice = self.filterComboBox.currentData()
+        pattern = None
+        if self.filterLineEdit.text():
+            try:
+                pattern = re.compile(self.filterLineEdit.text(), re.IGNORECASE)
+            except re.error as e:
+                self.statusbar.showMessage(f'Invalid regular expression: {e}', 5000)
+                return
+        self.flush_pending_edits()
+        if choice is None and pattern is None:
+            self.set_grid_model(self.model)
+            self.filterModel.clear_filter()
+            self.enable_editors(True)
+            self.translationGrid.selectRow(0)
+            return
+        self.filterModel.set_filter(states=[choice] if isinstance(choice, State) else None,
+                                    empty_target=choice == FILTER_EMPTY_TARGET,
+                                    tag_mismatch=choice == FILTER_TAG_MISMATCH,
+                                    pattern=pattern)
+        self.set_grid_model(self.filterModel)
+        count = self.filterModel.rowCount()
+        # The editors are disabled when no segment is shown, since edits could not be written back to any row.
+        self.enable_editors(count > 0)
+        if count:
+            self.translationGrid.selectRow(0)
+        self.statusbar.showMessage(f'{count} segment(s) shown{self.index_status()}', 5000)
+
+    def index_status(self) -> str:
+        """Returns a note to append to the results of searches and filters when some rows have not been indexed."""
+        if self.model.is_indexing:
+            return ' (indexing is in progress)'
+        if not self.model.is_index_complete:
+            return ' (indexing failed, some segments are left out)'
+        return ''
+
+    def focus_find(self) -> None:
+        self.findLineEdit.setFocus()
+        self.findLineEdit.selectAll()
+
+    def find_next(self) -> None:
+        """Highlights the segments matching the text to find, and moves to the next one after the current segment."""
+        if not self.model:
+            return
+        self.flush_pending_edits()
+        start = time.perf_counter()
+        rows = self.model.search(self.findLineEdit.text())
+        elapsed = (time.perf_counter() - start) * 1000
+        self.statusbar.showMessage(f'{len(rows)} segment(s) found in {elapsed:.1f} ms{self.index_status()}', 5000)
+        if self.translationGrid.model() is self.filterModel:
+            rows = self.filterModel.rows_from_source(rows)
+        if rows:
+            i = bisect_right(rows, self.translationGrid.currentIndex().row())
+            self.translationGrid.move_to_row(rows[i % len(rows)])
+
+    def run_qa(self) -> None:
+        """Checks all the segments in the background, listing the issues in the QA panel as they are found."""
+        if not self.model:
+            return
+        if self.model.is_loading:
+            self.statusbar.showMessage('QA cannot be run until the file has been loaded.', 3000)
+            return
+        self.flush_pending_edits()
+        self.qaPanel.show()
+        self.qaModel.run()
+
+    def open_tm(self) -> None:
+        filename, _ = QFileDialog.getOpenFileName(
+            self,
+            caption="Select a translation memory to open...",
+            directory=QDir.homePath(),
+            filter='Translation Memories (*.db) ;;All Files (*)',
+        )
+        if filename:
+            self.set_tm(filename)
+            self.preferences.setValue('tm/path', filename)
+
+    def set_tm(self, path: str) -> None:
+        if self.tm:
+            self.tm.close()
+        self.tm = TranslationMemory(path, read_only=True)
+        self.tmPanel.tmLabel.setText(os.path.basename(path))
+        self.schedule_tm_lookup(self._tm_lookup_tu)
+
+    def schedule_tm_lookup(self, tu: Optional[CapyTransUnit]) -> None:
+        self._tm_lookup_tu = tu
+        self.tmLookupTimer.start()
+
+    def look_up_tm(self) -> None:
+        """Lists the matches of the current segment found in the translation memory as alt-trans entries."""
+        tu = self._tm_lookup_tu
+        if not self.tm or not self.model or tu is None:
+            self.tmPanel.set_alt_translations([])
+            return
+        self.tmPanel.set_alt_translations(self.tm.find_alt_translations(
+            tu, self.model.source_language, self.model.target_language, limit=TM_MATCH_LIMIT))
+
+    def insert_tm_match(self, text: str) -> None:
+        """Replaces the target of the current segment with the translation of a match."""
+        self.flush_pending_edits()
+        row = self.current_row()
+        if row < 0 or not self.tgtEditor.isEnabled():
+            return
+        self.translationGrid.set_target_segment(text)
+        tu = self.model.data(self.model.index(row, 1), GetTransUnitRole)
+        tu.sync_target_tags()
+        self.tgtEditor.initialize(tu)
+
+    def move_to_segment(self, row: int) -> None:
+        """Moves to a row of the model, showing all the segments if the filter hides it."""
+        if self.translationGrid.model() is self.filterModel:
+            rows = self.filterModel.rows_from_source([row])
+            if rows:
+                self.translationGrid.move_to_row(rows[0])
+                return
+            self.filterComboBox.blockSignals(True)
+            self.filterComboBox.setCurrentIndex(0)
+            self.filterComboBox.blockSignals(False)
+            self.filterLineEdit.clear()
+            self.apply_filter()
+        self.translationGrid.move_to_row(row)
+
+    def on_find_text_changed(self, text: str) -> None:
+        if self.model and not text:
+            self.model.search('')
+
+    def current_row(self) -> int:
+        """Returns the row of the model the current segment is in, or -1 if there is none."""
+        index = self.translationGrid.currentIndex()
+        if not self.model or not index.isValid():
+            return -1
+        if self.translationGrid.model() is self.filterModel:
+            return self.filterModel.source_row(index.row())
+        return index.row()
+
+    def confirm_segment(self) -> None:
+        """Confirms the translation of the current segment, fills it into the repetitions, and moves to the next segment."""
+        self.flush_pending_edits()
+        row = self.current_row()
+        if row < 0:
+            return
+        if not self.model.data(self.model.index(row, 1), Qt.DisplayRole):
+            self.statusbar.showMessage('An empty translation cannot be confirmed.', 3000)
+            return
+        count = self.model.confirm(row)
+        if count:
+            self.statusbar.showMessage(f'Translation propagated to {count} repetition(s).', 3000)
+        self.translationGrid.move_to_adjacent_segment(False)
+
+    def unconfirm_segment(self) -> None:
+        self.flush_pending_edits()
+        row = self.current_row()
+        if row >= 0:
+            self.model.unconfirm(row)
+
+    def flush_pending_edits(self) -> None:
+        self.srcEditor.flush_pending_edit()
+        self.tgtEditor.flush_pending_edit()
+
+    def closeEvent(self, e: QCloseEvent) -> None:
+        self.flush_pending_edits()
+        self.qaModel.shutdown()
+        if self.tm:
+            self.tm.close()
+        if self.model:
+            self.model.stop_loading()
+            self.model.finish_saving()
+        super().closeEvent(e)
+
+    def on_loading_failed(self, message: str) -> None:
+        self.loadingProgressBar.hide()
+        QMessageBox.critical(self, 'Error', f'Failed to load the file.\n{message}')
+
+    def on_indexing_failed(self, message: str) -> None:
+        QMessageBox.critical(self, 'Error', f'Failed to index the file. Searches and filters will miss some segments.\n{message}')
+
+    def recover_pending_edits(self) -> None:
+        """Offers to recover the edits left unsaved by a previous session, as recorded in the edit journal."""
+        if not self.model.has_pending_edits:
+            return
+        ret = QMessageBox.question(
+            self, 'Recover',
+            'The file has unsaved changes from a previous session.\nDo you want to recover them?',
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if ret == QMessageBox.Yes:
+            self.model.recover_pending_edits()
+        else:
+            self.model.discard_pending_edits()
+
+    def on_saving_failed(self, message: str) -> None:
+        QMessageBox.critical(self, 'Error', f'Failed to save the file.\n{message}')
+
     def save(self):
         if self.model:
+            if self.model.is_loading:
+                self.statusbar.showMessage('The file cannot be saved until it has been loaded.', 3000)
+                return
+            if self.model.is_saving:
+                self.statusbar.showMessage('The file is being saved.', 3000)
+                return
+            self.flush_pending_edits()
+            self.statusbar.showMessage('Saving...')
+            self.model.save_data()
+
+    def autosave(self) -> None:
+        if not self.model or self.model.is_loading or self.model.is_saving or self.model.has_pending_edits:
+            return
+        self.flush_pending_edits()
+        if self.model.is_modified:
             self.model.save_data()
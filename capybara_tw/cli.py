@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""Headless batch processing of capyxliff files.
+
+Usage:
+    python -m capybara_tw.cli stats [--by {file,group,state}] FILE...
+    python -m capybara_tw.cli validate FILE...
+    python -m capybara_tw.cli pretranslate [-o DIR] (--tm TM [--min-score SCORE] | --copy-source) FILE...
+    python -m capybara_tw.cli export [-o DIR] FILE...
+    python -m capybara_tw.cli tm-import --tm TM [--source-language LANG --target-language LANG] FILE...
+
+Files are processed in parallel by a pool of processes (see --jobs).
+When pre-translating from a TM, the files are processed one at a time and the TM lookups are run by the pool instead.
+Files are imported into a TM one at a time, as SQLite allows a single writer.
+The throughput is reported on stderr once all files have been processed.
+"""
+import argparse
+import dataclasses
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+from capybara_tw.model.capy_trans_unit import CapyTransUnit
+from capybara_tw.model.capy_xliff import CapyXliff
+from capybara_tw.tm import pretranslation
+from capybara_tw.tm.translation_memory import TranslationMemory
+from capybara_tw.util import qa, statistics, tag_util
+from capybara_tw.util.xliff_util import State
+
+# Exit status when validation issues or errors have been found
+EXIT_FAILURE = 1
+
+
+@dataclasses.dataclass
+class FileResult:
+    filename: str
+    segments: int = 0
+    lines: List[str] = dataclasses.field(default_factory=list)  # Lines to print on stdout
+    counts: Dict[str, int] = dataclasses.field(default_factory=dict)  # Totals to add up over all files
+    error: Optional[str] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None or bool(self.counts.get('issues'))
+
+
+def output_path(filename: str, output_dir: Optional[str], extension: Optional[str] = None) -> str:
+    """ Returns the path of the file to write for filename, in output_dir if given, otherwise next to filename."""
+    if extension:
+        filename = os.path.splitext(filename)[0] + extension
+    if output_dir:
+        return os.path.join(output_dir, os.path.basename(filename))
+    return filename
+
+
+def compute_stats(filename: str, args: argparse.Namespace) -> FileResult:
+    stats = statistics.SegmentStatistics.of(CapyXliff.load(filename))
+    counts = stats.aggregate().get('total', dict.fromkeys(STATS_COLUMNS, 0))
+    states = stats.aggregate('state')
+    line = '\t'.join([filename] + [str(counts[key]) for key in STATS_COLUMNS])
+    line += '\t' + ', '.join(f'{state}={states[state]["segments"]}' for state in sorted(states))
+    lines = [line]
+    if args.by:
+        # Indented under the line of the file. Repetitions are counted within each file, as the files are processed separately.
+        for key, totals in stats.aggregate(args.by).items():
+            lines.append('\t'.join([f'  {key}'] + [str(totals[column]) for column in STATS_COLUMNS]))
+    return FileResult(filename, len(stats), lines, counts)
+
+
+def find_issues(tu: CapyTransUnit) -> List[str]:
+    """ Checks a trans-unit for problems that would break the generation of the translated document.
+
+    Returns: A list of messages. Empty if no problem has been found.
+    """
+    issues = []
+    if tu.target.text:
+        issues += qa.check_tags(tu.source.text, tu.target.text)
+        undefined = {tag_id for tag_id in tag_util.find_tag_ids(tu.target.text)
+                     if not tag_util.is_builtin(tag_id)
+                     and not tu.find_tag_by_id(tag_id, from_source=False)
+                     and not tu.find_tag_by_id(tag_id, from_source=True)}
+        if undefined:
+            issues.append(f'undefined tags {" ".join(sorted(undefined))}')
+    elif tu.target.state in (State.TRANSLATED, State.SIGNED_OFF, State.FINAL):
+        issues.append(f'empty target in state {tu.target.state.value}')
+    return issues
+
+
+def validate(filename: str, args: argparse.Namespace) -> FileResult:
+    xliff = CapyXliff.load(filename)
+    tus = xliff.get_all_trans_units()
+    lines = [f'{filename}: trans-unit {tu.id}: {issue}' for tu in tus for issue in find_issues(tu)]
+    return FileResult(filename, len(tus), lines, {'issues': len(lines)})
+
+
+def pretranslate(filename: str, args: argparse.Namespace) -> FileResult:
+    """Copies the source to the empty targets, to be translated over."""
+    xliff = CapyXliff.load(filename)
+    tus = xliff.get_all_trans_units()
+    count = 0
+    for tu in tus:
+        if tu.translate and not tu.target.text and tu.source.text:
+            tu.target.text = tu.source.text
+            tu.target.state = State.NEEDS_TRANSLATION
+            tu.sync_target_tags()
+            count += 1
+    return save_pretranslated(xliff, filename, args, count)
+
+
+def pretranslate_from_tm(filename: str, args: argparse.Namespace, executor: Executor) -> FileResult:
+    """Fills the empty targets from the TM, looking up the sources in the worker processes of executor."""
+    try:
+        xliff = CapyXliff.load(filename)
+        count = pretranslation.pretranslate(xliff, executor, args.min_score)
+        return save_pretranslated(xliff, filename, args, count)
+    except Exception as e:
+        return FileResult(filename, error=f'{type(e).__name__}: {e}')
+
+
+def save_pretranslated(xliff: CapyXliff, filename: str, args: argparse.Namespace, count: int) -> FileResult:
+    destination = output_path(filename, args.output_dir)
+    if count or destination != filename:
+        xliff.save(destination)
+    return FileResult(filename, len(xliff.get_all_trans_units()), [f'{destination}\t{count}'], {'pretranslated': count})
+
+
+def escape_tsv(text: str) -> str:
+    return (text or '').replace('\\', '\\\\').replace('\t', '\\t').replace('\r', '\\r').replace('\n', '\\n')
+
+
+def export(filename: str, args: argparse.Namespace) -> FileResult:
+    """Exports the segments into a tab-separated file of id, source, target and state."""
+    xliff = CapyXliff.load(filename)
+    tus = xliff.get_all_trans_units()
+    destination = output_path(filename, args.output_dir, '.tsv')
+    with open(destination, 'w', encoding='utf-8', newline='\n') as outfile:
+        outfile.write('id\tsource\ttarget\tstate\n')
+        for tu in tus:
+            fields = (tu.id, tu.source.text, tu.target.text, tu.target.state.value)
+            outfile.write('\t'.join(escape_tsv(field) for field in fields) + '\n')
+    return FileResult(filename, len(tus), [destination])
+
+
+def import_into_tm(filename: str, args: argparse.Namespace, tm: TranslationMemory) -> FileResult:
+    """Adds the units of a TMX file, or the confirmed translations of a capyxliff file, to the TM."""
+    try:
+        if filename.lower().endswith('.tmx'):
+            if not args.source_language or not args.target_language:
+                raise ValueError('--source-language and --target-language are required to import TMX files')
+            count = tm.import_tmx(filename, args.source_language, args.target_language)
+            # The units of a TMX file are only counted as they are added.
+            segments = count
+        else:
+            xliff = CapyXliff.load(filename)
+            tus = xliff.get_all_trans_units()
+            count = tm.import_trans_units(tus, args.source_language or xliff.source_language,
+                                          args.target_language or xliff.target_language, origin=filename)
+            segments = len(tus)
+        return FileResult(filename, segments, [f'{filename}\t{count}'], {'imported': count})
+    except Exception as e:
+        return FileResult(filename, error=f'{type(e).__name__}: {e}')
+
+
+STATS_COLUMNS = statistics.FIELDS
+
+COMMANDS: Dict[str, Callable[[str, argparse.Namespace], FileResult]] = {
+    'stats': compute_stats,
+    'validate': validate,
+    'pretranslate': pretranslate,
+    'export': export,
+}
+
+
+def process(command: str, filename: str, args: argparse.Namespace) -> FileResult:
+    """Runs a command on a file in a worker process. Errors are reported in the result instead of being raised."""
+    try:
+        return COMMANDS[command](filename, args)
+    except Exception as e:
+        return FileResult(filename, error=f'{type(e).__name__}: {e}')
+
+
+def create_executor(args: argparse.Namespace) -> Executor:
+    if args.command == 'pretranslate' and args.tm:
+        return pretranslation.create_executor(args.tm, args.jobs)
+    return ProcessPoolExecutor(max_workers=args.jobs)
+
+
+def iter_results(executor: Executor, args: argparse.Namespace) -> Iterator[FileResult]:
+    """Yields the results in the order of the files given."""
+    if args.command == 'tm-import':
+        with TranslationMemory(args.tm) as tm:
+            for filename in args.files:
+                yield import_into_tm(filename, args, tm)
+        return
+    if args.tm:
+        for filename in args.files:
+            yield pretranslate_from_tm(filename, args, executor)
+        return
+    futures = [executor.submit(process, args.command, filename, args) for filename in args.files]
+    for future in futures:
+        yield future.result()
+
+
+def run_command(args: argparse.Namespace) -> int:
+    files = args.files
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    if args.command == 'stats':
+        print('\t'.join(('file',) + STATS_COLUMNS + ('states',)))
+
+    start = time.perf_counter()
+    totals = Counter()
+    segments = 0
+    failed = False
+    with create_executor(args) as executor:
+        for result in iter_results(executor, args):
+            if result.error:
+                print(f'{result.filename}: {result.error}', file=sys.stderr)
+            for line in result.lines:
+                print(line)
+            segments += result.segments
+            totals.update(result.counts)
+            failed = failed or result.failed
+    elapsed = time.perf_counter() - start
+
+    if args.command == 'stats' and len(files) > 1:
+        print('\t'.join(['total'] + [str(totals[key]) for key in STATS_COLUMNS]))
+    if args.command == 'validate':
+        print(f'{totals["issues"]} issue(s) found', file=sys.stderr)
+    if args.command == 'tm-import':
+        print(f'{totals["imported"]} unit(s) added to {args.tm}', file=sys.stderr)
+    print(f'{len(files)} file(s), {segments} segments in {elapsed:.2f} s '
+          f'({segments / elapsed if elapsed else 0:.0f} segments/sec)', file=sys.stderr)
+    return EXIT_FAILURE if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m capybara_tw.cli', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: number of processors)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    stats = subparsers.add_parser('stats', help='count segments, words, characters, tags and repetitions, and segments per state')
+    stats.add_argument('--by', choices=statistics.GROUP_BY,
+                       help='also print the counts of each file, group or state of the documents')
+    stats.add_argument('files', nargs='+', metavar='FILE')
+
+    validate_ = subparsers.add_parser('validate', help='check the tags and states of the translations')
+    validate_.add_argument('files', nargs='+', metavar='FILE')
+
+    pretranslate_ = subparsers.add_parser('pretranslate', help='copy the source or the TM matches to the empty targets')
+    pretranslate_.add_argument('-o', '--output-dir', help='directory to write the files to (default: overwrite)')
+    # Copying the source over the empty targets must be asked for explicitly, not be a fallback for a missing TM.
+    source_ = pretranslate_.add_mutually_exclusive_group(required=True)
+    source_.add_argument('--tm', help='translation memory to fill the targets from')
+    source_.add_argument('--copy-source', action='store_true', help='copy the source to the empty targets')
+    pretranslate_.add_argument('--min-score', type=float, default=pretranslation.DEFAULT_MIN_SCORE,
+                               help='minimum score of the fuzzy matches, between 0 and 1 (default: %(default)s)')
+    pretranslate_.add_argument('files', nargs='+', metavar='FILE')
+
+    export_ = subparsers.add_parser('export', help='export the segments into tab-separated files')
+    export_.add_argument('-o', '--output-dir', help='directory to write the files to (default: next to the files)')
+    export_.add_argument('files', nargs='+', metavar='FILE')
+
+    tm_import = subparsers.add_parser('tm-import', help='add the units of TMX files or the confirmed translations of '
+                                                        'capyxliff files to a translation memory')
+    tm_import.add_argument('--tm', required=True, help='translation memory to add the units to, created if missing')
+    tm_import.add_argument('--source-language', help='source language (required for TMX files, '
+                                                     'default: that of each capyxliff file)')
+    tm_import.add_argument('--target-language', help='target language (required for TMX files, '
+                                                     'default: that of each capyxliff file)')
+    tm_import.add_argument('files', nargs='+', metavar='FILE')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    args.output_dir = getattr(args, 'output_dir', None)
+    args.tm = getattr(args, 'tm', None)
+    args.by = getattr(args, 'by', None)
+    return run_command(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
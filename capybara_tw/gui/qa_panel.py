@@ -0,0 +1,56 @@
+from PyQt5.QtCore import QModelIndex, pyqtSignal
+from PyQt5.QtWidgets import (QAbstractItemView, QDockWidget, QHBoxLayout, QLabel, QPushButton, QTableView,
+                             QVBoxLayout, QWidget)
+
+from capybara_tw.qa_model import QaIssueModel
+
+
+class QaPanel(QDockWidget):
+    """Lists the issues found by the QA checks. Activating an issue moves to its segment."""
+    segmentActivated = pyqtSignal(int)  # Row of the segment in the XliffModel
+
+    def __init__(self, parent=None):
+        super().__init__('QA', parent)
+        self.setObjectName('qaPanel')
+        widget = QWidget(self)
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(0, 0, 0, 0)
+        header = QHBoxLayout()
+        self.runButton = QPushButton('Run QA', widget)
+        self.summaryLabel = QLabel(widget)
+        header.addWidget(self.runButton)
+        header.addWidget(self.summaryLabel, 1)
+        layout.addLayout(header)
+        self.issueView = QTableView(widget)
+        self.issueView.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.issueView.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.issueView.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.issueView.verticalHeader().hide()
+        self.issueView.horizontalHeader().setStretchLastSection(True)
+        self.issueView.activated.connect(self.__on_activated)
+        layout.addWidget(self.issueView)
+        self.setWidget(widget)
+        self._progress = -1  # Progress of the running check in percent, -1 when not running
+
+    def setModel(self, model: QaIssueModel) -> None:
+        self.issueView.setModel(model)
+        model.rowsInserted.connect(self.update_summary)
+        model.rowsRemoved.connect(self.update_summary)
+        model.modelReset.connect(self.update_summary)
+        model.runProgressed.connect(self.__on_run_progressed)
+        model.runFinished.connect(lambda: self.__on_run_progressed(-1))
+        model.runFailed.connect(lambda message: self.summaryLabel.setText(f'QA failed: {message}'))
+
+    def __on_run_progressed(self, progress: int) -> None:
+        self._progress = progress
+        self.update_summary()
+
+    def update_summary(self) -> None:
+        text = f'{self.issueView.model().rowCount()} issue(s)'
+        if self._progress >= 0:
+            text += f' ({self._progress}% checked)'
+        self.summaryLabel.setText(text)
+
+    def __on_activated(self, index: QModelIndex) -> None:
+        model: QaIssueModel = self.issueView.model()
+        self.segmentActivated.emit(model.issue(index.row()).row)
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
-import re
 from enum import Enum, auto
-from typing import Optional
+from typing import List, Optional, Tuple
 import dataclasses
+from bisect import bisect_left
+from collections import OrderedDict
 
-from PyQt5.QtCore import (Qt, QMimeData, QObject, QSizeF, QRectF, QEvent, pyqtSignal)
+from PyQt5.QtCore import (Qt, QMimeData, QObject, QSizeF, QRectF, QEvent, QTimer, pyqtSignal)
 from PyQt5.QtGui import (QTextOption, QContextMenuEvent, QTextObjectInterface, QTextFormat, QTextCharFormat,
                          QTextDocument, QFontMetrics, QPainter, QPainterPath, QColor, QBrush, QPen, QKeySequence,
                          QTextCursor, QFocusEvent)
@@ -12,11 +13,18 @@ from PyQt5.QtWidgets import (QTextEdit, QApplication)
 
 from capybara_tw.gui.wordboundary import BoundaryHandler
 from capybara_tw.model.capy_trans_unit import CapyTransUnit
+from capybara_tw.util import tag_util
+from capybara_tw.util.tag_util import TagMultiset
 
 OBJECT_REPLACEMENT_CHARACTER = 0xfffc
 LINE_SEPARATOR = 0x2028
 PARAGRAPH_SEPARATOR = 0x2029
 
+# Idle time (in milliseconds) after the last keystroke before an edit is propagated to the model
+EDIT_IDLE_INTERVAL = 150
+# Number of prepared documents kept for the segments around the current one
+DOCUMENT_CACHE_SIZE = 8
+
 
 class TagKind(Enum):
     START = auto()
@@ -117,13 +125,14 @@ class TagInfo:
 
 
 class TagEditor(QTextEdit):
-    start_tags = re.compile(r'({[biu_^]+?>|{[0-9]{1,2}>)')
-    end_tags = re.compile(r'(<[biu_^]+?\}|<[0-9]{1,2}\})')
-    empty_tags = re.compile(r'({[0-9]{1,2}\}|{j\})')
-    all_tags = re.compile(r'({[biu_^]+?>|<[biu_^]+?\}|{[0-9]{1,2}>|<[0-9]{1,2}\}|{[0-9]{1,2}\}|{j\})')
+    start_tags = tag_util.START_TAGS
+    end_tags = tag_util.END_TAGS
+    empty_tags = tag_util.EMPTY_TAGS
+    all_tags = tag_util.ALL_TAGS
 
     focusedIn = pyqtSignal(bool)
     segmentEdited = pyqtSignal(str)
+    lineCountChanged = pyqtSignal(int)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -140,6 +149,31 @@ class TagEditor(QTextEdit):
         document_layout = self.document().documentLayout()
         document_layout.registerHandler(TagTextObject.type, self.tag_object_handler)
 
+        # Keystrokes are coalesced, and segmentEdited is only emitted when the serialized text has changed.
+        self._edit_timer = QTimer(self)
+        self._edit_timer.setSingleShot(True)
+        self._edit_timer.setInterval(EDIT_IDLE_INTERVAL)
+        self._edit_timer.timeout.connect(self.flush_pending_edit)
+        self._is_edit_pending = False
+        self._last_text = ''
+        self._last_line_count = 0
+
+        # Documents prepared for the segments around the current one, keyed by id of the translation unit.
+        # The text they were built from is kept to tell whether they are still valid.
+        self._documents: OrderedDict[int, Tuple[CapyTransUnit, str, QTextDocument]] = OrderedDict()
+        self._prefetch_queue: List[CapyTransUnit] = []
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.setInterval(0)
+        self._prefetch_timer.timeout.connect(self.__prefetch_next)
+
+        # Tags of the current document, with the sorted positions of the tag objects and their placeholders.
+        # Built on first use for each document, then updated with the changed ranges only.
+        self._tags: Optional[TagMultiset] = None
+        self._tags_document: Optional[QTextDocument] = None
+        self._tag_positions: List[int] = []
+        self._tag_names: List[str] = []
+
         self.textChanged.connect(self.__on_text_changed)
 
     @property
@@ -162,14 +196,95 @@ class TagEditor(QTextEdit):
         Args:
             tu: Translation unit
         """
+        self.flush_pending_edit()
         blocked = self.blockSignals(True)
+        text = self.__segment_text(tu)
+        document = self.__take_document(tu, text) or self.__build_document(tu, text)
+        previous = self.document()
+        # The initial document belongs to the editor itself and is deleted by setDocument().
+        if self.tu is not None and previous.parent() is self:
+            self.__cache_document(self.tu, self.__segment_text(self.tu), previous)
         self.tu = tu
-        text = tu.source.text if self.is_source else tu.target.text
-        self.setText('')
-        self.insert_content(text or '')
+        self.setDocument(document)
+        self.moveCursor(QTextCursor.End)
         self.setFocus()
         self.document().clearUndoRedoStacks()
         self.blockSignals(blocked)
+        self._last_text = self.to_model_data()
+        self._last_line_count = self.line_count()
+
+    def __segment_text(self, tu: CapyTransUnit) -> str:
+        return (tu.source.text if self.is_source else tu.target.text) or ''
+
+    def __build_document(self, tu: CapyTransUnit, text: str) -> QTextDocument:
+        """Builds and lays out a document holding the content of a segment, ready to be set to this editor."""
+        document = QTextDocument(self)
+        document.setUndoRedoEnabled(False)
+        document.setDefaultFont(self.font())
+        document.setDefaultTextOption(self.document().defaultTextOption())
+        document.documentLayout().registerHandler(TagTextObject.type, self.tag_object_handler)
+        self.__insert_content(QTextCursor(document), text, tu)
+        document.setUndoRedoEnabled(True)
+        document.setTextWidth(self.viewport().width())
+        document.documentLayout().documentSize()
+        return document
+
+    def __take_document(self, tu: CapyTransUnit, text: str) -> Optional[QTextDocument]:
+        entry = self._documents.pop(id(tu), None)
+        if entry is None:
+            return None
+        cached_tu, cached_text, document = entry
+        if cached_tu is tu and cached_text == text:
+            return document
+        document.deleteLater()
+        return None
+
+    def __cache_document(self, tu: CapyTransUnit, text: str, document: QTextDocument) -> None:
+        entry = self._documents.pop(id(tu), None)
+        if entry and entry[2] is not document:
+            entry[2].deleteLater()
+        self._documents[id(tu)] = (tu, text, document)
+        while len(self._documents) > DOCUMENT_CACHE_SIZE:
+            _, (_, _, evicted) = self._documents.popitem(last=False)
+            evicted.deleteLater()
+
+    def clear_document_cache(self) -> None:
+        self._prefetch_queue = []
+        for _, _, document in self._documents.values():
+            document.deleteLater()
+        self._documents.clear()
+
+    def prefetch(self, tus: List[CapyTransUnit]) -> None:
+        """Prepares the documents of the given segments while the application is idle,
+        so that moving to one of them only swaps the document in.
+
+        Args:
+            tus: Translation units, the most likely to be visited next first
+        """
+        self._prefetch_queue = list(tus)
+        self._prefetch_timer.start()
+
+    def __prefetch_next(self) -> None:
+        # One document per run of the event loop, so that user input is not held up
+        while self._prefetch_queue:
+            tu = self._prefetch_queue.pop(0)
+            if tu is self.tu:
+                continue
+            text = self.__segment_text(tu)
+            entry = self._documents.get(id(tu))
+            if entry and entry[0] is tu and entry[1] == text:
+                self._documents.move_to_end(id(tu))
+                continue
+            self.__cache_document(tu, text, self.__build_document(tu, text))
+            break
+        if self._prefetch_queue:
+            self._prefetch_timer.start()
+
+    def changeEvent(self, e: QEvent) -> None:
+        super(TagEditor, self).changeEvent(e)
+        if e.type() == QEvent.FontChange:
+            # Prepared documents have been laid out with the previous font
+            self.clear_document_cache()
 
     def focusInEvent(self, e: QFocusEvent) -> None:
         super(TagEditor, self).focusInEvent(e)
@@ -177,24 +292,45 @@ class TagEditor(QTextEdit):
 
     def focusOutEvent(self, e: QFocusEvent) -> None:
         super(TagEditor, self).focusOutEvent(e)
+        self.flush_pending_edit()
         self.focusedIn.emit(False)
 
     def display_hidden_characters(self, display=False):
-        option = QTextOption()
+        flags = QTextOption.Flags()
         if display:
-            option.setFlags(QTextOption.ShowTabsAndSpaces | QTextOption.ShowLineAndParagraphSeparators)
-        self.document().setDefaultTextOption(option)
+            flags = QTextOption.ShowTabsAndSpaces | QTextOption.ShowLineAndParagraphSeparators
+        for document in [self.document()] + [document for _, _, document in self._documents.values()]:
+            option = document.defaultTextOption()
+            option.setFlags(flags)
+            document.setDefaultTextOption(option)
 
     def insert_content(self, text: str) -> None:
+        """Inserts model data at the cursor position, converting tag strings into tag objects.
+        The whole content is inserted within a single edit block, so that the document is laid out only once.
+
+        Args:
+            text: A model data string
+        """
         cursor = self.textCursor()
+        self.__insert_content(cursor, text, self.tu)
+        self.setTextCursor(cursor)
+
+    def __insert_content(self, cursor: QTextCursor, text: str, tu: CapyTransUnit) -> None:
+        text_format = QTextCharFormat()
+        cursor.beginEditBlock()
         for run in self.all_tags.split(text):
-            tag = self.__get_tag_info(run, from_source=self.is_source)
+            if not run:
+                continue
+            tag = self.__get_tag_info(run, from_source=self.is_source, tu=tu)
             if tag:
                 self.insert_tag(cursor, tag.id, tag.content, tag.kind)
             else:
                 run = run.replace('\r\n', '\n').replace('\r', '\n')
-                run = run.replace('\n', '<br/>')
-                cursor.insertHtml(f'<span style="white-space: pre;">{run}</span>')
+                # Line breaks are kept within the paragraph, as <br/> would be
+                run = run.replace('\n', chr(LINE_SEPARATOR))
+                # The format is given explicitly, otherwise the text would take over the format of a preceding tag.
+                cursor.insertText(run, text_format)
+        cursor.endEditBlock()
 
     def set_readonly_with_text_selectable(self):
         self.setReadOnly(True)
@@ -219,7 +355,7 @@ class TagEditor(QTextEdit):
         char_format.setVerticalAlignment(QTextCharFormat.AlignTop)
         cursor.insertText(chr(OBJECT_REPLACEMENT_CHARACTER), char_format)
 
-    def __get_tag_info(self, run: str, from_source: bool) -> Optional[TagInfo]:
+    def __get_tag_info(self, run: str, from_source: bool, tu: Optional[CapyTransUnit] = None) -> Optional[TagInfo]:
         """Converts a tag string ("{1>", "<1}", "{1}", etc.) into a TagInfo Object containing a tag id, kind, content.
         The content will be retrieved from source or target props in the translation unit,
         so from_source argument needs to be supplied to determine which of source and target props to retrieve from.
@@ -227,22 +363,24 @@ class TagEditor(QTextEdit):
         Args:
             run: A tag string ("{1>", "<1}", "{1}", etc.)
             from_source: True to retrieve content from source props. False from target props.
+            tu: Translation unit to retrieve content from. Defaults to the one being edited.
 
         Returns: A TagInfo object
 
         """
+        tu = tu or self.tu
         if self.start_tags.search(run):
             tag_id = run.strip('{>')
             kind = TagKind.START
-            capytag = self.tu.find_tag_by_id(tag_id, from_source)
+            capytag = tu.find_tag_by_id(tag_id, from_source)
         elif self.end_tags.search(run):
             tag_id = run.strip('<}')
             kind = TagKind.END
-            capytag = self.tu.find_tag_by_id(tag_id, from_source)
+            capytag = tu.find_tag_by_id(tag_id, from_source)
         elif self.empty_tags.search(run):
             tag_id = run.strip('{}')
             kind = TagKind.EMPTY
-            capytag = self.tu.find_tag_by_id(tag_id, from_source)
+            capytag = tu.find_tag_by_id(tag_id, from_source)
         else:
             return None
         # Non-builtin tags (tags other than b|i|u|_|^|j) should have content, otherwise empty string
@@ -254,15 +392,62 @@ class TagEditor(QTextEdit):
 
         Returns: A TagInfo object
         """
-        src_tags = self.all_tags.findall(self.tu.source.text)
-        content = self.to_model_data()
-        tgt_tags = self.all_tags.findall(content)
-        for src_tag in src_tags:
-            src_count = src_tags.count(src_tag)
-            tgt_count = tgt_tags.count(src_tag)
-            if src_count > tgt_count:
-                return self.__get_tag_info(src_tag, from_source=True)
-        return None
+        tag = tag_util.first_missing(self.tu.source.text, self.document_tags())
+        return self.__get_tag_info(tag, from_source=True) if tag else None
+
+    def document_tags(self) -> TagMultiset:
+        """Returns the tags in the editor, kept up to date as the content is edited."""
+        document = self.document()
+        if self._tags is None or self._tags_document is not document:
+            if self._tags_document is not None:
+                self._tags_document.contentsChange.disconnect(self.__on_contents_change)
+                self._tags_document.destroyed.disconnect(self.__on_tags_document_destroyed)
+            found = self.__find_tags(0, document.characterCount())
+            self._tag_positions = [position for position, _ in found]
+            self._tag_names = [name for _, name in found]
+            self._tags = TagMultiset(self._tag_names)
+            self._tags_document = document
+            document.contentsChange.connect(self.__on_contents_change)
+            # Dropped once the document has been deleted, so that a new document at the same address is scanned.
+            document.destroyed.connect(self.__on_tags_document_destroyed)
+        return self._tags
+
+    def __on_tags_document_destroyed(self) -> None:
+        self._tags = None
+        self._tags_document = None
+
+    def __on_contents_change(self, position: int, chars_removed: int, chars_added: int) -> None:
+        if self._tags is None or self.sender() is not self._tags_document:
+            return
+        # The tags in the removed range are known from their positions, and only the added range is scanned.
+        first = bisect_left(self._tag_positions, position)
+        last = bisect_left(self._tag_positions, position + chars_removed)
+        for name in self._tag_names[first:last]:
+            self._tags.remove(name)
+        found = self.__find_tags(position, position + chars_added)
+        for _, name in found:
+            self._tags.add(name)
+        shift = chars_added - chars_removed
+        self._tag_positions[first:] = [p for p, _ in found] + [p + shift for p in self._tag_positions[last:]]
+        self._tag_names[first:] = [name for _, name in found] + self._tag_names[last:]
+
+    def __find_tags(self, start: int, end: int) -> List[Tuple[int, str]]:
+        """Finds the tag objects within a range of the document.
+
+        Returns: A list of the positions of the tag objects and their placeholders ("{1>", "<1}", etc.)
+        """
+        # Characters are looked up one by one, as walking the fragments would start from the beginning of the block.
+        result = []
+        document = self.document()
+        cursor = QTextCursor(document)
+        for position in range(start, min(end, document.characterCount() - 1)):
+            if document.characterAt(position) == chr(OBJECT_REPLACEMENT_CHARACTER):
+                # The format of the character before the cursor
+                cursor.setPosition(position + 1)
+                char_format = cursor.charFormat()
+                if char_format.objectType() == TagTextObject.type:
+                    result.append((position, TagTextObject.stringify(char_format)))
+        return result
 
     def copy_tag_from_source(self) -> None:
         """Copies a tag from source to target.
@@ -294,10 +479,37 @@ class TagEditor(QTextEdit):
             self.tu.add_tag(tag.id, tag.content, to_source=False)
 
     def contains_tag_str(self):
-        return self.all_tags.search(self.to_model_data()) is not None
+        return len(self.document_tags()) > 0
 
     def __on_text_changed(self):
-        self.segmentEdited.emit(self.to_model_data())
+        self._is_edit_pending = True
+        self._edit_timer.start()
+
+    def line_count(self) -> int:
+        """Counts the lines of the content as laid out at the current width."""
+        count = 0
+        block = self.document().begin()
+        while block.isValid():
+            count += max(block.layout().lineCount(), 1)
+            block = block.next()
+        return count
+
+    def flush_pending_edit(self) -> None:
+        """Propagates the edit waiting for the idle interval to elapse, if any.
+        Emits segmentEdited if the serialized text has changed, and lineCountChanged if the number of lines has.
+        """
+        if not self._is_edit_pending:
+            return
+        self._is_edit_pending = False
+        self._edit_timer.stop()
+        text = self.to_model_data()
+        if text != self._last_text:
+            self._last_text = text
+            self.segmentEdited.emit(text)
+        line_count = self.line_count()
+        if line_count != self._last_line_count:
+            self._last_line_count = line_count
+            self.lineCountChanged.emit(line_count)
 
     def contextMenuEvent(self, e: QContextMenuEvent) -> None:
         menu = self.createStandardContextMenu()
@@ -342,25 +554,29 @@ class TagEditor(QTextEdit):
         """
         doc = self.document()
         substrings = []
-        for pos in range(start, end):
-            char = doc.characterAt(pos)
-            if ord(char) == OBJECT_REPLACEMENT_CHARACTER:
-                current_block = doc.findBlock(pos)
-
-                # iterate text fragments within the block
-                it = current_block.begin()
-                while not it.atEnd():
-                    current_fragment = it.fragment()
-                    # check if the current position is located within the fragment
-                    if current_fragment.contains(pos):
-                        char_format = current_fragment.charFormat()
-                        substrings.append(TagTextObject.stringify(char_format))
-                        break
-                    it += 1
-            elif ord(char) in (LINE_SEPARATOR, PARAGRAPH_SEPARATOR):
+        block = doc.findBlock(start)
+        while block.isValid() and block.position() < end:
+            # Walk the fragments of the block once, clipping them to the range
+            it = block.begin()
+            while not it.atEnd():
+                fragment = it.fragment()
+                fragment_start = fragment.position()
+                fragment_end = fragment_start + fragment.length()
+                if fragment_start >= end:
+                    break
+                if fragment_end > start:
+                    text = fragment.text()[max(start - fragment_start, 0):min(end, fragment_end) - fragment_start]
+                    text = text.replace(chr(LINE_SEPARATOR), '\n')
+                    if chr(OBJECT_REPLACEMENT_CHARACTER) in text:
+                        # Adjacent tags sharing the same format may be merged into a single fragment.
+                        text = text.replace(chr(OBJECT_REPLACEMENT_CHARACTER), TagTextObject.stringify(fragment.charFormat()))
+                    substrings.append(text)
+                it += 1
+            # The paragraph separator ending the block
+            block_end = block.position() + block.length() - 1
+            if start <= block_end < end:
                 substrings.append('\n')
-            else:
-                substrings.append(char)
+            block = block.next()
         text = ''.join(substrings)
         return text
 
@@ -0,0 +1,48 @@
+from typing import List
+
+from PyQt5.QtCore import QModelIndex, pyqtSignal
+from PyQt5.QtWidgets import (QAbstractItemView, QDockWidget, QHBoxLayout, QLabel, QPushButton, QTableWidget,
+                             QTableWidgetItem, QVBoxLayout, QWidget)
+
+from capybara_tw.model.capy_alt_trans import CapyAltTrans
+
+
+class TmPanel(QDockWidget):
+    """Lists the translation memory matches of the current segment. Activating a match inserts it into the target."""
+    translationActivated = pyqtSignal(str)  # Target text of the match
+
+    def __init__(self, parent=None):
+        super().__init__('Translation memory', parent)
+        self.setObjectName('tmPanel')
+        widget = QWidget(self)
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(0, 0, 0, 0)
+        header = QHBoxLayout()
+        self.openButton = QPushButton('Open TM...', widget)
+        self.tmLabel = QLabel('No translation memory', widget)
+        header.addWidget(self.openButton)
+        header.addWidget(self.tmLabel, 1)
+        layout.addLayout(header)
+        self.matchView = QTableWidget(0, 3, widget)
+        self.matchView.setHorizontalHeaderLabels(['Match', 'Translation', 'Origin'])
+        self.matchView.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.matchView.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.matchView.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.matchView.verticalHeader().hide()
+        self.matchView.horizontalHeader().setStretchLastSection(True)
+        self.matchView.activated.connect(self.__on_activated)
+        layout.addWidget(self.matchView)
+        self.setWidget(widget)
+        self._alt_translations: List[CapyAltTrans] = []
+
+    def set_alt_translations(self, alt_translations: List[CapyAltTrans]) -> None:
+        self._alt_translations = alt_translations
+        self.matchView.setRowCount(len(alt_translations))
+        for row, alt_trans in enumerate(alt_translations):
+            self.matchView.setItem(row, 0, QTableWidgetItem(f'{alt_trans.match_quality}%'))
+            self.matchView.setItem(row, 1, QTableWidgetItem(alt_trans.target.text))
+            self.matchView.setItem(row, 2, QTableWidgetItem(alt_trans.origin))
+        self.matchView.resizeColumnToContents(0)
+
+    def __on_activated(self, index: QModelIndex) -> None:
+        self.translationActivated.emit(self._alt_translations[index.row()].target.text)
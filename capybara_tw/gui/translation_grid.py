@@ -1,16 +1,24 @@
-from typing import Tuple
+from typing import Dict, List, Tuple
 
-from PyQt5.QtCore import QItemSelection, pyqtSignal, Qt, QSize
+from PyQt5.QtCore import (QItemSelection, pyqtSignal, Qt, QSize, QModelIndex, QTimer, QAbstractItemModel,
+                          QPersistentModelIndex)
+from PyQt5.QtGui import QResizeEvent
 from PyQt5.QtWidgets import QTableView, QHeaderView
 
 from capybara_tw.model.capy_trans_unit import CapyTransUnit
 from capybara_tw.xliff_model import GetTransUnitRole
 
+# Number of rows measured beyond each edge of the viewport
+ROW_HEIGHT_MARGIN = 20
+# Number of rows on each side of the current one whose segments are prepared in the editors
+PREFETCH_DISTANCE = 2
+
 
 class TranslationGrid(QTableView):
     currentSourceSegmentChanged = pyqtSignal(CapyTransUnit)  # Tuple of bool and CapyTransUnit
     currentTargetSegmentChanged = pyqtSignal(CapyTransUnit)  # Tuple of bool and CapyTransUnit
     sourceColumnSelected = pyqtSignal(bool)
+    adjacentSegmentsChanged = pyqtSignal(list)  # List of CapyTransUnit, nearest first
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -18,26 +26,77 @@ class TranslationGrid(QTableView):
         self.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)  # Auto-fit column width
         self.verticalScrollBar().valueChanged.connect(self.on_scroll)
 
+        # Row heights are only computed for the rows around the viewport, and cached with the key
+        # (text hash, font, column widths) they were computed for.
+        self._row_heights: Dict[int, Tuple[Tuple, int]] = {}
+        self._row_height_timer = QTimer(self)
+        self._row_height_timer.setSingleShot(True)
+        self._row_height_timer.setInterval(0)
+        self._row_height_timer.timeout.connect(self.update_visible_row_heights)
+        self.verticalScrollBar().valueChanged.connect(self.schedule_row_height_update)
+        self.horizontalHeader().sectionResized.connect(self.schedule_row_height_update)
+
+        # Row of the segment loaded in the editors, which edits are written back to
+        self._editing_index = QPersistentModelIndex()
+        # Row whose height is kept while its text is being edited, until resize_current_row() is called
+        self._keep_row_height = -1
+
+    def setModel(self, model: QAbstractItemModel) -> None:
+        previous = self.model()
+        if previous:
+            previous.dataChanged.disconnect(self.__on_data_changed)
+            previous.modelReset.disconnect(self.refresh_row_heights)
+            previous.layoutChanged.disconnect(self.refresh_row_heights)
+        super().setModel(model)
+        self._row_heights.clear()
+        self._editing_index = QPersistentModelIndex()
+        model.dataChanged.connect(self.__on_data_changed)
+        model.modelReset.connect(self.refresh_row_heights)
+        model.layoutChanged.connect(self.refresh_row_heights)
+        self.schedule_row_height_update()
+
     def selection_changed(self, selected: QItemSelection, deselected: QItemSelection) -> None:
         ci = self.selectionModel().currentIndex()
         # Retrieve the selected translation unit and send it to the segment editors.
         tu = ci.model().data(ci, GetTransUnitRole)
+        # The editors flush the edits pending on the previous segment when they are initialized,
+        # so the editing index is only moved afterwards.
         self.currentSourceSegmentChanged.emit(tu)
         self.currentTargetSegmentChanged.emit(tu)
+        self._editing_index = QPersistentModelIndex(ci)
         self.sourceColumnSelected.emit(ci.column() == 0)
+        self.adjacentSegmentsChanged.emit(self.__adjacent_trans_units(ci.row()))
+
+    def __adjacent_trans_units(self, row: int) -> List[CapyTransUnit]:
+        model = self.model()
+        tus = []
+        for distance in range(1, PREFETCH_DISTANCE + 1):
+            for adjacent in (row + distance, row - distance):
+                if 0 <= adjacent < model.rowCount():
+                    tus.append(model.index(adjacent, 0).data(GetTransUnitRole))
+        return tus
 
     def set_source_segment(self, text):
-        ci = self.selectionModel().currentIndex()
-        idx = ci.siblingAtColumn(0)
-        idx.model().setData(idx, text, Qt.EditRole)
-        if idx.isValid():
-            idx.model().setData(idx, text, Qt.EditRole)
+        self.__set_segment(0, text)
 
     def set_target_segment(self, text):
-        ci = self.selectionModel().currentIndex()
-        idx = ci.siblingAtColumn(1)
+        self.__set_segment(1, text)
+
+    def __set_segment(self, column: int, text: str) -> None:
+        if not self._editing_index.isValid():
+            return
+        idx = self.model().index(self._editing_index.row(), column)
         if idx.isValid():
+            # The row is only measured again if the number of lines in the editor changes.
+            self._keep_row_height = idx.row()
             idx.model().setData(idx, text, Qt.EditRole)
+            self._keep_row_height = -1
+
+    def rowsInserted(self, parent: QModelIndex, start: int, end: int) -> None:
+        super().rowsInserted(parent, start, end)
+        self.schedule_row_height_update()
+        if not self.currentIndex().isValid():
+            self.selectRow(0)
 
     def move_to_adjacent_segment(self, prev=False):
         if not self.selectionModel():
@@ -46,6 +105,9 @@ class TranslationGrid(QTableView):
         if prev:
             idx = ci.siblingAtRow(ci.row() - 1)
         else:
+            model = self.selectionModel().model()
+            if ci.row() + 1 >= model.rowCount() and model.canFetchMore(QModelIndex()):
+                model.fetchMore(QModelIndex())
             idx = ci.siblingAtRow(ci.row() + 1)
         if idx.isValid():
             self.setCurrentIndex(idx)
@@ -57,19 +119,95 @@ class TranslationGrid(QTableView):
         if first:
             idx = ci.siblingAtRow(0)
         else:
-            idx = ci.siblingAtRow(self.selectionModel().model().rowCount() - 1)
+            model = self.selectionModel().model()
+            while model.canFetchMore(QModelIndex()):
+                model.fetchMore(QModelIndex())
+            idx = ci.siblingAtRow(model.rowCount() - 1)
+        if idx.isValid():
+            self.setCurrentIndex(idx)
+
+    def move_to_row(self, row: int) -> None:
+        """ Makes a row current, fetching the rows up to it if needed, and scrolls it to the center of the view."""
+        model = self.model()
+        if not model:
+            return
+        while row >= model.rowCount() and model.canFetchMore(QModelIndex()):
+            model.fetchMore(QModelIndex())
+        column = max(self.currentIndex().column(), 0)
+        idx = model.index(row, column)
         if idx.isValid():
             self.setCurrentIndex(idx)
+            self.scrollTo(idx, QTableView.PositionAtCenter)
 
     def sizeHint(self) -> QSize:
         return QSize(self.width(), 600)
 
     def resize_current_row(self):
-        if not self.selectionModel():
+        """Fits the height of the row being edited to its contents."""
+        if self._editing_index.isValid():
+            self._row_heights.pop(self._editing_index.row(), None)
+            self.update_row_height(self._editing_index.row())
+
+    def resizeEvent(self, e: QResizeEvent) -> None:
+        super().resizeEvent(e)
+        self.schedule_row_height_update()
+
+    def schedule_row_height_update(self) -> None:
+        """Updates the heights of the rows around the viewport once control returns to the event loop."""
+        self._row_height_timer.start()
+
+    def refresh_row_heights(self) -> None:
+        """Discards all cached row heights. Called when the font or the rows have been changed."""
+        self._row_heights.clear()
+        self.schedule_row_height_update()
+
+    def update_visible_row_heights(self) -> None:
+        model = self.model()
+        if not model or not model.rowCount():
             return
-        ci = self.selectionModel().currentIndex()
-        if ci.isValid():
-            self.resizeRowToContents(ci.row())
+        first = self.rowAt(0)
+        last = self.rowAt(self.viewport().height() - 1)
+        if first < 0:
+            first = 0
+        if last < 0:
+            last = model.rowCount() - 1
+        first = max(0, first - ROW_HEIGHT_MARGIN)
+        last = min(model.rowCount() - 1, last + ROW_HEIGHT_MARGIN)
+        for row in range(first, last + 1):
+            self.update_row_height(row)
+
+    def update_row_height(self, row: int) -> None:
+        """Fits the height of a row to its contents, measuring its text only if it has not been measured
+        with the same text, font and column widths before.
+
+        Args:
+            row: Row number
+        """
+        key = self.__row_height_key(row)
+        cached = self._row_heights.get(row)
+        if cached and cached[0] == key:
+            height = cached[1]
+        else:
+            height = max(self.sizeHintForRow(row), self.verticalHeader().sectionSizeHint(row))
+            self._row_heights[row] = (key, height)
+        if self.rowHeight(row) != height:
+            self.setRowHeight(row, height)
+
+    def __row_height_key(self, row: int) -> Tuple:
+        model = self.model()
+        columns = range(model.columnCount())
+        texts = tuple(model.index(row, column).data(Qt.DisplayRole) for column in columns)
+        return hash(texts), self.font().key(), tuple(self.columnWidth(column) for column in columns)
+
+    def __on_data_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles: List[int] = ()) -> None:
+        if roles and Qt.DisplayRole not in roles and Qt.EditRole not in roles:
+            # The texts, and so the row heights, are unchanged.
+            return
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            cached = self._row_heights.pop(row, None)
+            if cached and row == self._keep_row_height:
+                self._row_heights[row] = (self.__row_height_key(row), cached[1])
+        self.schedule_row_height_update()
 
     def on_scroll(self):
         # Ensure that selected row moves when scrolling - it must be always visible.
@@ -21,7 +21,8 @@
 Provides custom word-boundary behaviour for QTextCursor and QTextEdit etc.
 
 You can inherit from BoundaryHandler to change the behaviour. You can just
-change the word_regexp expression, or override the boundaries() method.
+pass another segmenter (see capybara_tw.util.segmenter), or override the
+find_boundaries() method.
 
 Install a BoundaryHandler as eventfilter on a QTextEdit or QPlainTextEdit.
 If you also want the double-click word selection to work, install the handler
@@ -37,13 +38,15 @@ many textedit widgets as you like.
 """
 
 
-import itertools
-import operator
-import re
+import bisect
+from array import array
+from collections import OrderedDict
 
 from PyQt5.QtCore import QEvent, QObject, Qt
 from PyQt5.QtGui import QKeySequence, QTextCursor
 
+from capybara_tw.util.segmenter import default_segmenter
+
 
 _move_operations = (
     QTextCursor.StartOfWord,
@@ -54,32 +57,61 @@ _move_operations = (
     QTextCursor.WordRight,
 )
 
+# Number of block texts whose word boundaries are kept
+_cache_size = 256
+
 
 class BoundaryHandler(QObject):
 
     _double_click_time = 0.0
-    # word_regexp = re.compile(r'\\?\w+|^|$', re.UNICODE)
-    word_regexp = re.compile(r'[ぁ-んー]+|[ァ-ンー]+|[\u4e00-\u9FFF]+|[a-zA-Z0-9]+|[^ぁ-んァ-ンー\u4e00-\u9FFFa-zA-Z0-9]')
 
-    def boundaries(self, block):
-        """Return a list of tuples specifying the position of words in the block.
+    def __init__(self, parent=None, segmenter=None):
+        super().__init__(parent)
+        self.segmenter = segmenter or default_segmenter()
+        self._cache = OrderedDict()
+
+    def find_boundaries(self, text):
+        """Return a list of tuples specifying the position of words in the text.
 
         Each tuple denotes the start and end position of a "word" in the
-        specified block.
+        specified text.
 
-        You can return other boundaries by changing the word_regexp or by
+        You can return other boundaries by changing the segmenter or by
         inheriting from this class and overwriting this method.
 
         """
-        return [m.span() for m in self.word_regexp.finditer(block.text()) if not re.search(r'^\s+$', m.group(0))]
+        return self.segmenter.spans(text)
+
+    def sorted_boundaries(self, block):
+        """Return the start and end positions of the words in the block as two sorted arrays.
+
+        The arrays are cached by block text, so that they can be searched
+        with bisect on every key press without scanning the text again.
+
+        """
+        text = block.text()
+        try:
+            self._cache.move_to_end(text)
+            return self._cache[text]
+        except KeyError:
+            pass
+        spans = self.find_boundaries(text)
+        result = array('i', (start for start, _ in spans)), array('i', (end for _, end in spans))
+        self._cache[text] = result
+        if len(self._cache) > _cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def boundaries(self, block):
+        """Return a list of tuples specifying the position of words in the block."""
+        starts, ends = self.sorted_boundaries(block)
+        return list(zip(starts, ends))
 
     def left_boundaries(self, block):
-        left = operator.itemgetter(0)
-        return [left(b) for b in self.boundaries(block)]
+        return self.sorted_boundaries(block)[0]
 
     def right_boundaries(self, block):
-        right = operator.itemgetter(1)
-        return [right(b) for b in self.boundaries(block)]
+        return self.sorted_boundaries(block)[1]
 
     def move(self, cursor, operation, mode=QTextCursor.MoveAnchor, n=1):
         """Reimplements Word-related cursor operations:
@@ -97,45 +129,53 @@ class BoundaryHandler(QObject):
         pos = cursor.position() - block.position()
         if operation == QTextCursor.StartOfWord:
             if pos:
-                for start, end in reversed(self.boundaries(block)):
-                    if start < pos:
-                        if end < pos:
-                            return False
-                        cursor.setPosition(block.position() + start, mode)
-                        return True
-            return False
-        elif operation == QTextCursor.EndOfWord:
-            for start, end in self.boundaries(block):
-                if end > pos:
-                    if start > pos:
+                starts, ends = self.sorted_boundaries(block)
+                # the last word starting before pos
+                i = bisect.bisect_left(starts, pos) - 1
+                if i >= 0:
+                    if ends[i] < pos:
                         return False
-                    cursor.setPosition(block.position() + end, mode)
+                    cursor.setPosition(block.position() + starts[i], mode)
                     return True
             return False
+        elif operation == QTextCursor.EndOfWord:
+            starts, ends = self.sorted_boundaries(block)
+            # the first word ending after pos
+            i = bisect.bisect_right(ends, pos)
+            if i < len(ends):
+                if starts[i] > pos:
+                    return False
+                cursor.setPosition(block.position() + ends[i], mode)
+                return True
+            return False
         elif operation in (QTextCursor.PreviousWord, QTextCursor.WordLeft):
-            boundaries = list(itertools.takewhile(lambda b: b < pos, self.left_boundaries(block)))
+            boundaries = self.left_boundaries(block)
+            count = bisect.bisect_left(boundaries, pos)  # words starting before pos
             while True:
-                if len(boundaries) >= n:
-                    cursor.setPosition(block.position() + boundaries[-n], mode)
+                if count >= n:
+                    cursor.setPosition(block.position() + boundaries[count - n], mode)
                     return True
-                n -= len(boundaries)
+                n -= count
                 block = block.previous()
                 if not block.isValid():
                     cursor.setPosition(0, mode)
                     return False
                 boundaries = self.left_boundaries(block)
+                count = len(boundaries)
         elif operation in (QTextCursor.NextWord, QTextCursor.WordRight):
-            boundaries = list(itertools.dropwhile(lambda b: b <= pos, self.left_boundaries(block)))
+            boundaries = self.left_boundaries(block)
+            first = bisect.bisect_right(boundaries, pos)  # the first word starting after pos
             while True:
-                if len(boundaries) >= n:
-                    cursor.setPosition(block.position() + boundaries[n - 1], mode)
+                if len(boundaries) - first >= n:
+                    cursor.setPosition(block.position() + boundaries[first + n - 1], mode)
                     return True
-                n -= len(boundaries)
+                n -= len(boundaries) - first
                 block = block.next()
                 if not block.isValid():
                     cursor.movePosition(QTextCursor.End, mode)
                     return False
                 boundaries = self.left_boundaries(block)
+                first = 0
         else:
             return cursor.movePosition(operation, mode, n)
 
@@ -11,17 +11,21 @@ from capybara_tw.util.xliff_util import Xliff12Tag
 
 
 class CapyAltTrans(object):
+    __slots__ = ('origin', 'match_quality', 'target')
     origin: Optional[str]
+    match_quality: Optional[str]
     target: Optional[CapyTarget]
 
     def __init__(self):
         self.origin = None
+        self.match_quality = None
         self.target = None
 
     @classmethod
     def from_element(cls, elem) -> CapyAltTrans:
         obj = cls()
         obj.origin = elem.get('origin')
+        obj.match_quality = elem.get('match-quality')
         target_elem = xml_util.first(elem, Xliff12Tag.target)
         obj.target = CapyTarget.from_element(target_elem)
         return obj
@@ -29,5 +33,7 @@ class CapyAltTrans(object):
     def to_element(self):
         root = etree.Element(Xliff12Tag.alt_trans)
         root.set('origin', self.origin)
+        if self.match_quality is not None:
+            root.set('match-quality', self.match_quality)
         root.append(self.target.to_element())
         return root
@@ -11,6 +11,7 @@ from capybara_tw.util.xliff_util import Xliff12Tag
 
 
 class CapyBody(object):
+    __slots__ = ('groups',)
     groups: List[CapyGroup]
 
     def __init__(self):
@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import sys
+
 from lxml import etree
 
 from capybara_tw.util.xliff_util import CapyxliffTag
 
 
 class CapyContent(object):
+    __slots__ = ('value',)
     value: str
 
     def __init__(self):
@@ -15,7 +18,8 @@ class CapyContent(object):
     @classmethod
     def from_element(cls, elem) -> CapyContent:
         obj = cls()
-        obj.value = elem.text or ''
+        # Tag contents such as formatting codes are mostly repeated across units
+        obj.value = sys.intern(elem.text or '')
         return obj
 
     def to_element(self):
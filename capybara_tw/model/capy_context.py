@@ -9,6 +9,7 @@ from capybara_tw.util.xliff_util import Xliff12Tag
 
 
 class CapyContext(object):
+    __slots__ = ('value', 'context_type')
     context_type: Optional[str]
     value: str
 
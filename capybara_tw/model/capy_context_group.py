@@ -10,6 +10,7 @@ from capybara_tw.util.xliff_util import Xliff12Tag
 
 
 class CapyContextGroup(object):
+    __slots__ = ('contexts',)
     contexts: List[CapyContext]
 
     def __init__(self):
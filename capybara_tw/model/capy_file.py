@@ -11,6 +11,7 @@ from capybara_tw.util.xliff_util import Xliff12Tag
 
 
 class CapyFile(object):
+    __slots__ = ('body', 'original', 'source_language', 'target_language', 'datatype')
     body: Optional[CapyBody]
     original: Optional[str]
     source_language: Optional[str]
@@ -25,20 +26,37 @@ class CapyFile(object):
         self.datatype = None
 
     @classmethod
-    def from_element(cls, elem) -> CapyFile:
+    def from_start_element(cls, elem) -> CapyFile:
+        """Creates a CapyFile from the attributes of elem, leaving the body unset.
+
+        Args:
+            elem: A file element whose children may not have been parsed yet.
+
+        Returns: A CapyFile object
+        """
         obj = cls()
         obj.original = elem.get('original')
         obj.source_language = elem.get('source-language')
         obj.target_language = elem.get('target-language')
         obj.datatype = elem.get('datatype')
+        return obj
+
+    @classmethod
+    def from_element(cls, elem) -> CapyFile:
+        obj = cls.from_start_element(elem)
         obj.body = CapyBody.from_element(xml_util.first(elem, Xliff12Tag.body))
         return obj
 
-    def to_element(self):
+    def to_start_element(self):
+        """Creates a file element holding the attributes of this object, without children."""
         root = etree.Element(Xliff12Tag.file)
         root.set('original', self.original)
         root.set('source-language', self.source_language)
         root.set('target-language', self.target_language)
         root.set('datatype', self.datatype)
+        return root
+
+    def to_element(self):
+        root = self.to_start_element()
         root.append(self.body.to_element())
         return root
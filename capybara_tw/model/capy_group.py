@@ -13,6 +13,7 @@ from capybara_tw.util.xliff_util import Xliff12Tag
 
 
 class CapyGroup(object):
+    __slots__ = ('id', 'original_id', 'context_group', 'trans_units')
     id: Optional[str]
     original_id: Optional[str]
     trans_units: List[CapyTransUnit]
@@ -25,19 +26,36 @@ class CapyGroup(object):
         self.trans_units = []
 
     @classmethod
-    def from_element(cls, elem) -> CapyGroup:
+    def from_start_element(cls, elem) -> CapyGroup:
+        """Creates a CapyGroup from the attributes of elem, leaving the context group and trans-units unset.
+
+        Args:
+            elem: A group element whose children may not have been parsed yet.
+
+        Returns: A CapyGroup object
+        """
         obj = cls()
         obj.id = elem.get('id')
         obj.original_id = elem.get(CAPYXLF + 'original-id')
+        return obj
+
+    @classmethod
+    def from_element(cls, elem) -> CapyGroup:
+        obj = cls.from_start_element(elem)
         context_group_elem = xml_util.first(elem, Xliff12Tag.context_group)
         obj.context_group = CapyContextGroup.from_element(context_group_elem)
         obj.trans_units = [CapyTransUnit.from_element(e) for e in elem.iterchildren(Xliff12Tag.trans_unit)]
         return obj
 
-    def to_element(self):
+    def to_start_element(self):
+        """Creates a group element holding the attributes of this object, without children."""
         root = etree.Element(Xliff12Tag.group)
         root.set('id', self.id)
         root.set(CAPYXLF + 'original-id', self.original_id)
+        return root
+
+    def to_element(self):
+        root = self.to_start_element()
         if self.context_group:
             root.append(self.context_group.to_element())
         for tu in self.trans_units:
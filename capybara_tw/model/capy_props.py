@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from lxml import etree
+
+from capybara_tw.model.capy_tag import CapyTag
+from capybara_tw.util.xliff_util import CapyxliffTag
+
+
+class CapyProps(object):
+    """The tag list of a source or a target, with tags looked up by id.
+    Subclasses set the tag of the element they are serialized to.
+    """
+    __slots__ = ('_tags', 'dirty', '_tag_index')
+    element_tag: str
+    _tags: List[CapyTag]
+    dirty: bool
+    _tag_index: Optional[Dict[str, CapyTag]]
+
+    def __init__(self):
+        self._tags = []
+        self.dirty = False
+        self._tag_index = None  # Built on first lookup
+
+    @property
+    def tags(self) -> List[CapyTag]:
+        return self._tags
+
+    @tags.setter
+    def tags(self, value: List[CapyTag]) -> None:
+        self._tags = value
+        self._tag_index = None
+
+    def __get_tag_index(self) -> Dict[str, CapyTag]:
+        if self._tag_index is None:
+            # The first tag of an id wins, as with a linear search of the list
+            self._tag_index = {}
+            for tag in self._tags:
+                self._tag_index.setdefault(tag.id, tag)
+        return self._tag_index
+
+    def find_tag(self, tag_id: str) -> Optional[CapyTag]:
+        return self.__get_tag_index().get(tag_id)
+
+    def add_tag(self, tag: CapyTag) -> bool:
+        """ Appends tag to the tag list.
+
+        Args:
+            tag: A CapyTag object
+
+        Returns: True if added. False if the list already contains a tag having the same id.
+        """
+        index = self.__get_tag_index()
+        if tag.id in index:
+            return False
+        self._tags.append(tag)
+        index[tag.id] = tag
+        self.dirty = True
+        return True
+
+    def remove_tag(self, tag_id: str) -> Optional[CapyTag]:
+        """ Removes a tag from the tag list.
+
+        Args:
+            tag_id: Tag id
+
+        Returns: The removed CapyTag object. None if not found.
+        """
+        tag = self.__get_tag_index().get(tag_id)
+        if tag is not None:
+            self._tags.remove(tag)
+            # Another tag with the same id, if any, is found next
+            self._tag_index = None
+            self.dirty = True
+        return tag
+
+    def copy(self) -> CapyProps:
+        """ Copies the tag list, sharing the tags."""
+        obj = type(self)()
+        obj.tags = list(self._tags)
+        obj.dirty = self.dirty
+        return obj
+
+    @classmethod
+    def from_element(cls, elem) -> CapyProps:
+        obj = cls()
+        obj.tags = [CapyTag.from_element(e) for e in elem.iterchildren(CapyxliffTag.tag)]
+        return obj
+
+    def to_element(self):
+        root = etree.Element(self.element_tag)
+        for tag in self._tags:
+            root.append(tag.to_element())
+        return root
@@ -7,15 +7,28 @@ from capybara_tw.util.xliff_util import Xliff12Tag
 
 
 class CapySource(object):
-    text: str
+    __slots__ = ('_text', 'dirty')
+    _text: str
+    dirty: bool
 
     def __init__(self):
-        self.text = ''
+        self._text = ''
+        self.dirty = False
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @text.setter
+    def text(self, value: str) -> None:
+        if value != self._text:
+            self._text = value
+            self.dirty = True
 
     @classmethod
     def from_element(cls, elem) -> CapySource:
         obj = cls()
-        obj.text = elem.text or ''
+        obj._text = elem.text or ''
         return obj
 
     def to_element(self):
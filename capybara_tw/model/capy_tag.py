@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import sys
 from typing import Optional
 
 from lxml import etree
@@ -11,6 +12,7 @@ from capybara_tw.util.xliff_util import CapyxliffTag
 
 
 class CapyTag(object):
+    __slots__ = ('id', 'content')
     id: Optional[str]
     content: Optional[CapyContent]
 
@@ -21,7 +23,9 @@ class CapyTag(object):
     @classmethod
     def from_element(cls, elem) -> CapyTag:
         obj = cls()
-        obj.id = elem.get('id')
+        tag_id = elem.get('id')
+        # The same few tag ids appear in every unit
+        obj.id = sys.intern(tag_id) if tag_id is not None else None
         content_elem = xml_util.first(elem, CapyxliffTag.content)
         obj.content = CapyContent.from_element(content_elem)
         return obj
@@ -8,18 +8,41 @@ from capybara_tw.util.xliff_util import Xliff12Tag
 
 
 class CapyTarget(object):
-    text: str
-    state: State
+    __slots__ = ('_text', '_state', 'dirty')
+    _text: str
+    _state: State
+    dirty: bool
 
     def __init__(self):
-        self.text = ''
-        self.state = State.NONE
+        self._text = ''
+        self._state = State.NONE
+        self.dirty = False
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @text.setter
+    def text(self, value: str) -> None:
+        if value != self._text:
+            self._text = value
+            self.dirty = True
+
+    @property
+    def state(self) -> State:
+        return self._state
+
+    @state.setter
+    def state(self, value: State) -> None:
+        if value != self._state:
+            self._state = value
+            self.dirty = True
 
     @classmethod
     def from_element(cls, elem) -> CapyTarget:
         obj = cls()
-        obj.text = elem.text or ''
-        obj.state = State.create(elem.get('state'))
+        obj._text = elem.text or ''
+        obj._state = State.create(elem.get('state'))
         return obj
 
     def to_element(self):
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import copy
 from typing import List, Optional
 
 from lxml import etree
@@ -13,10 +14,11 @@ from capybara_tw.model.capy_target import CapyTarget
 from capybara_tw.model.capy_source_props import CapySourceProps
 from capybara_tw.model.capy_target_props import CapyTargetProps
 from capybara_tw.util.xliff_util import CapyxliffTag, CAPYXLF, Xliff12Tag
-from capybara_tw.util import xml_util
+from capybara_tw.util import tag_util, xml_util
 
 
 class CapyTransUnit(object):
+    __slots__ = ('id', 'original_id', 'source', 'target', 'alt_translations', 'translate', 'capy_source_props', 'capy_target_props')
     id: Optional[str]
     original_id: Optional[str]
     source: Optional[CapySource]
@@ -46,11 +48,8 @@ class CapyTransUnit(object):
         Returns: A CapyTag object if found. None if not found.
 
         """
-        tags = self.capy_source_props.tags if from_source else self.capy_target_props.tags
-        for tag in tags:
-            if tag.id == tag_id:
-                return tag
-        return None
+        props = self.capy_source_props if from_source else self.capy_target_props
+        return props.find_tag(tag_id)
 
     def add_tag(self, tag_id: str, content: str, to_source: bool) -> Optional[CapyTag]:
         """ Adds a tag definition to source/target tag list.
@@ -63,18 +62,71 @@ class CapyTransUnit(object):
         Returns: A CapyTag object if succeeded. None if failed because the list already contains a tag having the same id.
 
         """
-        tags = self.capy_source_props.tags if to_source else self.capy_target_props.tags
-        for tag in tags:
-            if tag.id == tag_id:
-                return None
+        props = self.capy_source_props if to_source else self.capy_target_props
+        if props.find_tag(tag_id):
+            return None
 
         tag = CapyTag()
         tag.id = tag_id
         tag.content = CapyContent()
         tag.content.value = content
-        tags.append(tag)
+        props.add_tag(tag)
         return tag
 
+    def remove_tag(self, tag_id: str, from_source: bool) -> Optional[CapyTag]:
+        """ Removes a tag definition from source/target tag list.
+
+        Args:
+            tag_id: Tag id
+            from_source: True to remove the tag from source tag list, otherwise from target tag list.
+
+        Returns: The removed CapyTag object. None if not found.
+
+        """
+        props = self.capy_source_props if from_source else self.capy_target_props
+        return props.remove_tag(tag_id)
+
+    def sync_target_tags(self) -> None:
+        """ Adds the definitions of the tags used in the target text but missing from the target tag list,
+        copying them from the source tag list. Builtin tags have no definition and are skipped.
+        """
+        for tag_id in tag_util.find_tag_ids(self.target.text):
+            if self.find_tag_by_id(tag_id, from_source=False):
+                continue
+            tag = self.find_tag_by_id(tag_id, from_source=True)
+            if tag:
+                self.add_tag(tag.id, tag.content.value, to_source=False)
+
+    @property
+    def is_dirty(self) -> bool:
+        """Indicates whether the source, the target or their tag lists have been modified since loaded or saved."""
+        return (self.source.dirty or self.target.dirty
+                or self.capy_source_props.dirty or self.capy_target_props.dirty)
+
+    def mark_dirty(self) -> None:
+        """Flags this unit as modified, so that it is written by the next incremental save."""
+        self.target.dirty = True
+
+    def mark_clean(self) -> None:
+        self.source.dirty = False
+        self.target.dirty = False
+        self.capy_source_props.dirty = False
+        self.capy_target_props.dirty = False
+
+    def copy(self) -> CapyTransUnit:
+        """ Copies the parts of this unit that can be edited: the source, the target, their tag lists
+        and the list of alternative translations. The tags and alternative translations themselves are shared.
+
+        Returns: A CapyTransUnit object
+        """
+        obj = copy.copy(self)
+        obj.source = copy.copy(self.source)
+        obj.target = copy.copy(self.target)
+        obj.alt_translations = list(self.alt_translations)
+        obj.capy_source_props = self.capy_source_props.copy()
+        obj.capy_target_props = self.capy_target_props.copy()
+        return obj
+
     @classmethod
     def from_element(cls, elem) -> CapyTransUnit:
         obj = cls()
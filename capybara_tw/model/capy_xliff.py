@@ -1,25 +1,34 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-from typing import List
+import copy
+from typing import BinaryIO, Iterator, List, Optional, Union
 
 from lxml import etree
 
+from capybara_tw.model.capy_body import CapyBody
+from capybara_tw.model.capy_context_group import CapyContextGroup
 from capybara_tw.model.capy_file import CapyFile
+from capybara_tw.model.capy_group import CapyGroup
 from capybara_tw.model.capy_trans_unit import CapyTransUnit
-from capybara_tw.util import xml_util
+from capybara_tw.model.capy_xliff_index import CapyXliffIndex, CapyXliffSnapshot
+from capybara_tw.util import file_util, xml_util
 from capybara_tw.util.xliff_util import XLFNS, CAPYXLFNS, CAPYXLF, Xliff12Tag
 
 
 class CapyXliff(object):
+    __slots__ = ('version', 'capy_version', 'files', 'source_index')
     version: str
     capy_version: str
     files: List[CapyFile]
+    source_index: Optional[CapyXliffIndex]
 
     def __init__(self):
         self.version = '1.2'
         self.capy_version = '1.0'
         self.files = []
+        # Offsets of the trans-units in the file this object was loaded from or last saved to
+        self.source_index = None
 
     @property
     def source_language(self) -> str:
@@ -43,23 +52,163 @@ class CapyXliff(object):
 
     @classmethod
     def load(cls, file: str) -> CapyXliff:
-        parser = xml_util.get_parser(file)
-        root = etree.parse(file, parser=parser).getroot()
-        return cls.from_element(root)
+        obj = cls()
+        for _ in obj.iter_load(file):
+            pass
+        return obj
 
-    def to_element(self):
+    def iter_load(self, file: Union[str, BinaryIO]) -> Iterator[CapyTransUnit]:
+        """Loads a capyxliff file into this object incrementally.
+
+        Each trans-unit element is converted into a CapyTransUnit as soon as its end tag has been parsed
+        and is discarded right after, so the element tree never holds more than the skeleton of the document.
+
+        Args:
+            file: Path to the capyxliff file, or the file opened in binary mode
+
+        Returns: An iterator yielding each CapyTransUnit in document order as soon as it has been loaded.
+        """
+        tags = (Xliff12Tag.xliff, Xliff12Tag.file, Xliff12Tag.body, Xliff12Tag.group,
+                Xliff12Tag.context_group, Xliff12Tag.trans_unit)
+        capy_file = None
+        group = None
+        count = 0
+        for event, elem in xml_util.iterparse(file, events=('start', 'end'), tag=tags):
+            parent = elem.getparent()
+            parent_tag = parent.tag if parent is not None else None
+            if event == 'start':
+                if elem.tag == Xliff12Tag.xliff:
+                    self.version = elem.get('version')
+                    self.capy_version = elem.get(CAPYXLF + 'version')
+                elif elem.tag == Xliff12Tag.file and parent_tag == Xliff12Tag.xliff:
+                    capy_file = CapyFile.from_start_element(elem)
+                    self.files.append(capy_file)
+                elif elem.tag == Xliff12Tag.body and parent_tag == Xliff12Tag.file:
+                    capy_file.body = CapyBody()
+                elif elem.tag == Xliff12Tag.group and parent_tag == Xliff12Tag.body:
+                    group = CapyGroup.from_start_element(elem)
+                    capy_file.body.groups.append(group)
+            elif elem.tag == Xliff12Tag.trans_unit and parent_tag == Xliff12Tag.group:
+                tu = CapyTransUnit.from_element(elem)
+                group.trans_units.append(tu)
+                count += 1
+                xml_util.discard(elem)
+                yield tu
+            elif elem.tag == Xliff12Tag.context_group and parent_tag == Xliff12Tag.group:
+                group.context_group = CapyContextGroup.from_element(elem)
+                xml_util.discard(elem)
+            elif elem.tag in (Xliff12Tag.file, Xliff12Tag.body, Xliff12Tag.group):
+                xml_util.discard(elem)
+        try:
+            index = CapyXliffIndex.build(file if isinstance(file, str) else file.name)
+        except ValueError:
+            # Trans-units in comments or CDATA sections, or empty ones, cannot be located by the index.
+            # The document is then saved in full.
+            self.source_index = None
+            return
+        # Trans-units out of groups are not loaded, so they cannot be matched with the index.
+        self.source_index = index if len(index) == count else None
+
+    def to_start_element(self):
+        """Creates the root element holding the attributes of this object, without children."""
         root = etree.Element(Xliff12Tag.xliff, nsmap={None: XLFNS, 'capy': CAPYXLFNS})
         root.set('version', self.version)
         root.set(CAPYXLF + 'version', self.capy_version)
+        return root
+
+    def to_element(self):
+        root = self.to_start_element()
         for file in self.files:
             root.append(file.to_element())
         return root
 
+    def snapshot(self) -> CapyXliffSnapshot:
+        """Takes a snapshot of this object to be saved, possibly on another thread.
+
+        If the trans-units can be matched with the file this object was loaded from or last saved to,
+        only the modified trans-units are serialized, and the rest of the file will be copied as is.
+        Otherwise the whole document is copied, to be streamed out with write().
+        Changes to anything but the source, target and tag lists of existing trans-units require a full copy,
+        which can be forced by setting source_index to None.
+
+        Returns: A CapyXliffSnapshot object
+        """
+        tus = self.get_all_trans_units()
+        if self.source_index is not None and len(self.source_index) == len(tus):
+            modified = {i: tu for i, tu in enumerate(tus) if tu.is_dirty}
+            return CapyXliffSnapshot.from_index(self.source_index, modified)
+        return CapyXliffSnapshot.from_xliff(self)
+
     def save(self, destination: str) -> None:
-        root = self.to_element()
-        content = etree.tostring(root, xml_declaration=True, encoding='utf-8', pretty_print=True)
-        with open(destination, 'wb') as outfile:
-            outfile.write(content)
+        """Saves this object to destination.
+
+        The file is written to a temporary file first, and moved over destination once complete.
+        Unlike snapshot(), nothing is copied: the document is streamed out as is, and must not be edited meanwhile.
+
+        Args:
+            destination: Path to the file to write.
+        """
+        tus = self.get_all_trans_units()
+        if self.source_index is not None and len(self.source_index) == len(tus):
+            snapshot = CapyXliffSnapshot.from_index(self.source_index, {i: tu for i, tu in enumerate(tus) if tu.is_dirty})
+            write = snapshot.write
+        else:
+            snapshot = None
+            write = self.write
+        try:
+            with file_util.atomic_write(destination) as outfile:
+                write(outfile)
+        except BaseException:
+            if snapshot:
+                snapshot.revert()
+            raise
+        if snapshot is None:
+            for tu in tus:
+                tu.mark_clean()
+        self.source_index = CapyXliffIndex.build(destination)
+
+    def copy(self) -> CapyXliff:
+        """Copies the files, groups and trans-unit lists of this object, and the editable parts of each trans-unit
+        (see CapyTransUnit.copy()), so that the copy can be written while this object keeps being edited.
+        Everything else, such as the context groups, is shared.
+
+        Returns: A CapyXliff object
+        """
+        obj = copy.copy(self)
+        obj.source_index = None
+        obj.files = []
+        for file in self.files:
+            file_copy = copy.copy(file)
+            if file.body:
+                file_copy.body = copy.copy(file.body)
+                file_copy.body.groups = []
+                for group in file.body.groups:
+                    group_copy = copy.copy(group)
+                    group_copy.trans_units = [tu.copy() for tu in group.trans_units]
+                    file_copy.body.groups.append(group_copy)
+            obj.files.append(file_copy)
+        return obj
+
+    def write(self, outfile: BinaryIO) -> None:
+        """Serializes this object into outfile incrementally, so that only one trans-unit is held
+        as an element tree at a time.
+
+        Args:
+            outfile: A file object opened in binary mode
+        """
+        with etree.xmlfile(outfile, encoding='utf-8') as xf:
+            xf.write_declaration()
+            with xml_util.write_start_element(xf, self.to_start_element()):
+                for file in self.files:
+                    with xml_util.write_start_element(xf, file.to_start_element(), level=1):
+                        with xml_util.write_start_element(xf, etree.Element(Xliff12Tag.body), level=2):
+                            for group in file.body.groups:
+                                with xml_util.write_start_element(xf, group.to_start_element(), level=3):
+                                    if group.context_group:
+                                        xml_util.write_element(xf, group.context_group.to_element(), level=4)
+                                    for tu in group.trans_units:
+                                        xml_util.write_element(xf, tu.to_element(), level=4)
+        outfile.write(b'\n')
 
     def get_all_trans_units(self) -> List[CapyTransUnit]:
         tus = []
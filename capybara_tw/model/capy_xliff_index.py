@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import mmap
+import re
+from array import array
+from collections import OrderedDict
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from capybara_tw.model.capy_trans_unit import CapyTransUnit
+from capybara_tw.util import file_util, xml_util
+from capybara_tw.util.xliff_util import State, Xliff12Tag
+
+if TYPE_CHECKING:
+    from capybara_tw.model.capy_xliff import CapyXliff
+
+TRANS_UNIT_START = re.compile(rb'<(?:[\w.-]+:)?trans-unit[\s/>]')
+TRANS_UNIT_END = re.compile(rb'</(?:[\w.-]+:)?trans-unit\s*>')
+
+# xliff > file > body > group > trans-unit
+TRANS_UNIT_LEVEL = 4
+
+DEFAULT_CACHE_SIZE = 2000
+
+
+class CapyXliffIndex(object):
+    """Byte offsets of the trans-unit elements in a capyxliff file.
+
+    The index allows a single trans-unit to be read without parsing the rest of the document.
+    """
+    filename: str
+    nsmap: Dict[Optional[str], str]
+    source_language: str
+    target_language: str
+    starts: array
+    ends: array
+
+    def __init__(self):
+        self.filename = ''
+        self.nsmap = {}
+        self.source_language = ''
+        self.target_language = ''
+        self.starts = array('q')
+        self.ends = array('q')
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @classmethod
+    def build(cls, file: str) -> CapyXliffIndex:
+        obj = cls()
+        obj.filename = file
+        for _, elem in xml_util.iterparse(file, events=('start',), tag=(Xliff12Tag.xliff, Xliff12Tag.file)):
+            if elem.tag == Xliff12Tag.xliff:
+                obj.nsmap = dict(elem.nsmap)
+            else:
+                obj.source_language = elem.get('source-language') or ''
+                obj.target_language = elem.get('target-language') or ''
+                break
+        with open(file, 'rb') as infile, mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            obj.starts = array('q', (m.start() for m in TRANS_UNIT_START.finditer(content)))
+            obj.ends = array('q', (m.end() for m in TRANS_UNIT_END.finditer(content)))
+        if len(obj.starts) != len(obj.ends):
+            raise ValueError(f'Unbalanced trans-unit elements in {file}')
+        return obj
+
+    def read(self, i: int) -> bytes:
+        """ Reads the serialized i-th trans-unit.
+
+        Args:
+            i: Index of the trans-unit in document order
+
+        Returns: The trans-unit element as it is written in the file.
+        """
+        with open(self.filename, 'rb') as infile:
+            infile.seek(self.starts[i])
+            return infile.read(self.ends[i] - self.starts[i])
+
+    def load_trans_unit(self, i: int) -> CapyTransUnit:
+        elem = xml_util.parse_fragment(self.read(i), self.nsmap)
+        return CapyTransUnit.from_element(elem)
+
+    def serialize(self, tu: CapyTransUnit) -> bytes:
+        """ Serializes a trans-unit to be spliced into the indexed file."""
+        return xml_util.serialize_fragment(tu.to_element(), self.nsmap, TRANS_UNIT_LEVEL)
+
+    def write_spliced(self, outfile: BinaryIO, replacements: Dict[int, bytes]) -> None:
+        """ Copies the indexed file to outfile, replacing some of the trans-units.
+
+        Only the replaced trans-units need to be serialized; the rest of the document is copied as is.
+
+        Args:
+            outfile: A file object opened in binary mode
+            replacements: Serialized trans-units keyed by their index in document order
+        """
+        with open(self.filename, 'rb') as infile, mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            pos = 0
+            for i in sorted(replacements):
+                outfile.write(content[pos:self.starts[i]])
+                outfile.write(replacements[i])
+                pos = self.ends[i]
+            outfile.write(content[pos:])
+
+
+def iter_segments(filename: str) -> Iterator[Tuple[str, str, State]]:
+    """ Reads the source text, target text and target state of each trans-unit in a capyxliff file in document order,
+    without building the trans-units.
+    """
+    for _, elem in xml_util.iterparse(filename, tag=Xliff12Tag.trans_unit):
+        target = elem.find(Xliff12Tag.target)
+        if target is None:
+            yield elem.findtext(Xliff12Tag.source) or '', '', State.NONE
+        else:
+            yield elem.findtext(Xliff12Tag.source) or '', target.text or '', State.create(target.get('state'))
+        xml_util.discard(elem)
+
+
+class CapyXliffSnapshot(object):
+    """The state of a document to save, taken so that it can be written on another thread
+    while the document keeps being edited.
+
+    The trans-units modified so far are marked as clean when the snapshot is taken,
+    and flagged again by revert() if the snapshot could not be saved.
+    """
+    modified: List[CapyTransUnit]
+    index: Optional[CapyXliffIndex]
+    replacements: Dict[int, bytes]
+    xliff: Optional[CapyXliff]
+
+    def __init__(self):
+        self.modified = []
+        self.index = None
+        self.replacements = {}
+        self.xliff = None
+
+    @classmethod
+    def from_index(cls, index: CapyXliffIndex, modified: Dict[int, CapyTransUnit]) -> CapyXliffSnapshot:
+        """ Creates a snapshot copying the indexed file, except for the modified trans-units.
+
+        Args:
+            index: Index of the file the document has been loaded from or last saved to
+            modified: Modified trans-units keyed by their index in document order
+        """
+        obj = cls()
+        obj.index = index
+        obj.replacements = {i: index.serialize(tu) for i, tu in modified.items()}
+        obj.modified = list(modified.values())
+        for tu in obj.modified:
+            tu.mark_clean()
+        return obj
+
+    @classmethod
+    def from_xliff(cls, xliff: CapyXliff) -> CapyXliffSnapshot:
+        """ Creates a snapshot holding a copy of the document, see CapyXliff.copy()."""
+        obj = cls()
+        obj.xliff = xliff.copy()
+        obj.modified = [tu for tu in xliff.get_all_trans_units() if tu.is_dirty]
+        for tu in obj.modified:
+            tu.mark_clean()
+        return obj
+
+    def write(self, outfile: BinaryIO) -> None:
+        if self.index is not None:
+            self.index.write_spliced(outfile, self.replacements)
+        else:
+            self.xliff.write(outfile)
+
+    def write_temporary(self, destination: str) -> str:
+        """ Writes the snapshot into a temporary file next to destination.
+        The file is moved over destination with file_util.replace().
+
+        Args:
+            destination: Path to the file to save
+
+        Returns: Path to the temporary file
+        """
+        with file_util.write_temporary(destination) as outfile:
+            self.write(outfile)
+        return outfile.name
+
+    def revert(self) -> None:
+        for tu in self.modified:
+            tu.mark_dirty()
+
+
+class LazyTransUnitList(object):
+    """A read-mostly sequence of the trans-units in an indexed file.
+
+    Trans-units are built on first access and kept in a bounded LRU cache.
+    Modified units are pinned when evicted, until they have been saved.
+    """
+    index: CapyXliffIndex
+    capacity: int
+
+    def __init__(self, index: CapyXliffIndex, capacity: int = DEFAULT_CACHE_SIZE):
+        self.index = index
+        self.capacity = capacity
+        self._cache: OrderedDict[int, CapyTransUnit] = OrderedDict()
+        self._pinned: Dict[int, CapyTransUnit] = {}
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, i: int) -> CapyTransUnit:
+        tu = self._pinned.get(i)
+        if tu is not None:
+            return tu
+        tu = self._cache.get(i)
+        if tu is not None:
+            self._cache.move_to_end(i)
+            return tu
+        tu = self.index.load_trans_unit(i)
+        self._cache[i] = tu
+        if len(self._cache) > self.capacity:
+            evicted_i, evicted = self._cache.popitem(last=False)
+            if evicted.is_dirty:
+                self._pinned[evicted_i] = evicted
+        return tu
+
+    @property
+    def is_dirty(self) -> bool:
+        return any(tu.is_dirty for tu in self._pinned.values()) or any(tu.is_dirty for tu in self._cache.values())
+
+    def unsaved(self) -> Dict[int, CapyTransUnit]:
+        """ Returns the trans-units which may differ from the indexed file: the modified ones and those being saved,
+        keyed by their index in document order.
+        """
+        unsaved = {i: tu for i, tu in self._cache.items() if tu.is_dirty}
+        unsaved.update(self._pinned)
+        return unsaved
+
+    def snapshot(self) -> CapyXliffSnapshot:
+        """ Takes a snapshot of the modified trans-units.
+        They stay pinned, and the indexed file must not be replaced, until saved() or revert() has been called.
+        """
+        modified = {i: tu for i, tu in self._cache.items() if tu.is_dirty}
+        modified.update((i, tu) for i, tu in self._pinned.items() if tu.is_dirty)
+        self._pinned.update(modified)
+        return CapyXliffSnapshot.from_index(self.index, modified)
+
+    def saved(self, index: CapyXliffIndex) -> None:
+        """ Switches to the index of the file a snapshot has been saved to, and unpins the units saved clean.
+
+        Args:
+            index: Index of the saved file
+        """
+        self.index = index
+        for i, tu in list(self._pinned.items()):
+            if not tu.is_dirty:
+                del self._pinned[i]
+                self._cache[i] = tu
+        while len(self._cache) > self.capacity:
+            evicted_i, evicted = self._cache.popitem(last=False)
+            if evicted.is_dirty:
+                self._pinned[evicted_i] = evicted
+
+    def save(self, destination: str) -> None:
+        """ Writes the modified trans-units back to destination, copying the others from the indexed file.
+
+        Args:
+            destination: Path to the file to write. May be the indexed file itself.
+        """
+        snapshot = self.snapshot()
+        try:
+            with file_util.atomic_write(destination) as outfile:
+                snapshot.write(outfile)
+        except BaseException:
+            snapshot.revert()
+            raise
+        self.saved(CapyXliffIndex.build(destination))
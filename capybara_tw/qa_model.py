@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+import typing
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Executor
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, QThread, pyqtSignal
+
+from capybara_tw.util import qa
+from capybara_tw.util.qa import QaIssue, Segment
+from capybara_tw.xliff_model import XliffModel
+
+
+class QaRunner(QThread):
+    """Feeds the segments of a document to the workers of a process pool on a worker thread,
+    handing the issues found over chunk by chunk, in row order, as they are checked.
+    """
+    chunkChecked = pyqtSignal(list, int)  # Issues found in the next rows, and row up to which they have been checked
+    failed = pyqtSignal(str)
+
+    def __init__(self, executor: Executor, segments: typing.Iterator[Segment], first_row: int = 0, parent=None):
+        super().__init__(parent)
+        self.executor = executor
+        self.segments = segments
+        self.first_row = first_row
+
+    def run(self) -> None:
+        results = qa.iter_issues(self.executor, self.segments, self.first_row)
+        try:
+            for checked, issues in results:
+                self.chunkChecked.emit(issues, checked)
+                if self.isInterruptionRequested():
+                    return
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            results.close()
+
+
+class QaIssueModel(QAbstractTableModel):
+    """The QA issues of the segments of an XliffModel, sorted by row.
+
+    All the segments are checked by run(), over a pool of processes. Segments edited afterwards are checked again
+    on their own, as soon as they are edited.
+    In lazy mode the segments are read from the file, so the run is suspended while a save replaces the file,
+    and resumed from the last row checked once the save is over.
+    """
+    runProgressed = pyqtSignal(int)  # Progress in percent
+    runFinished = pyqtSignal()
+    runFailed = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._headers = ['Segment', 'Check', 'Issue']
+        self._issues: typing.List[QaIssue] = []
+        self._rows = array('i')  # Row of each issue, for bisection
+        self._model: typing.Optional[XliffModel] = None
+        self._executor: typing.Optional[Executor] = None
+        self._runner: typing.Optional[QaRunner] = None
+        self._has_run = False
+        self._checked = 0  # Rows checked by the run so far
+        self._is_suspended = False
+        # Rows checked again while running, whose issues are not to be overwritten by the run
+        self._rechecked_rows: typing.Set[int] = set()
+
+    def set_xliff_model(self, model: XliffModel) -> None:
+        self.stop()
+        if self._model:
+            self._model.segmentsEdited.disconnect(self.recheck)
+            self._model.fileAboutToBeReplaced.disconnect(self.__suspend)
+            self._model.savingFinished.disconnect(self.__resume)
+            self._model.savingFailed.disconnect(self.__resume)
+        self._model = model
+        model.segmentsEdited.connect(self.recheck)
+        model.fileAboutToBeReplaced.connect(self.__suspend)
+        model.savingFinished.connect(self.__resume)
+        model.savingFailed.connect(self.__resume)
+        self._has_run = False
+        self.beginResetModel()
+        self._issues = []
+        self._rows = array('i')
+        self.endResetModel()
+
+    @property
+    def is_running(self) -> bool:
+        return self._runner is not None
+
+    def run(self) -> None:
+        """Starts checking all the segments loaded. Issues are added as soon as they are found."""
+        if not self._model:
+            return
+        self.stop()
+        if self._executor is None:
+            self._executor = qa.create_executor()
+        self._has_run = True
+        self._rechecked_rows.clear()
+        self.beginResetModel()
+        self._issues = []
+        self._rows = array('i')
+        self.endResetModel()
+        self.__start_runner(0)
+
+    def __start_runner(self, first_row: int) -> None:
+        self._checked = first_row
+        self._runner = QaRunner(self._executor, self._model.iter_segments(first_row), first_row, self)
+        self._runner.chunkChecked.connect(self.__on_chunk_checked)
+        self._runner.failed.connect(self.runFailed)
+        self._runner.finished.connect(self.__on_runner_finished)
+        self._runner.start()
+        self.runProgressed.emit(first_row * 100 // max(self._model.segment_count, 1))
+
+    def stop(self) -> None:
+        self._is_suspended = False
+        if self._runner:
+            self._runner.requestInterruption()
+            self._runner.wait()
+            self._runner = None
+
+    def __suspend(self) -> None:
+        if self._runner and self._model.lazy:
+            self.stop()
+            self._is_suspended = True
+
+    def __resume(self) -> None:
+        if self._is_suspended:
+            self._is_suspended = False
+            # The chunks checked but not handed over before suspending are checked again.
+            self.__start_runner(self._checked)
+
+    def shutdown(self) -> None:
+        """Stops the run, if any, and the worker processes."""
+        self.stop()
+        if self._executor:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __on_chunk_checked(self, issues: typing.List[QaIssue], checked: int) -> None:
+        if self._runner is None or self._runner is not self.sender():
+            # Queued by a runner stopped since
+            return
+        if self._rechecked_rows:
+            issues = [issue for issue in issues if issue.row not in self._rechecked_rows]
+        self.__insert_issues(issues)
+        self._checked = checked
+        self.runProgressed.emit(checked * 100 // max(self._model.segment_count, 1))
+
+    def __on_runner_finished(self) -> None:
+        if self._runner is not self.sender():
+            # A runner stopped by stop()
+            return
+        self._runner = None
+        self.runFinished.emit()
+
+    def recheck(self, rows: typing.List[int]) -> None:
+        """ Checks edited segments again, replacing their issues. Ignored until the first run."""
+        if not self._has_run:
+            return
+        for row in rows:
+            self.__set_row_issues(row, qa.check_segment(row, *self._model.segment(row)))
+        if self._runner:
+            self._rechecked_rows.update(rows)
+
+    def __insert_issues(self, issues: typing.List[QaIssue]) -> None:
+        """ Inserts issues sorted by row, of rows without any issue yet.
+        They are inserted in blocks between the rows already holding issues, which are the rows checked again
+        while running, so that a chunk is usually appended at once.
+        """
+        rows = [issue.row for issue in issues]
+        i = 0
+        while i < len(issues):
+            position = bisect_left(self._rows, rows[i])
+            end = len(issues) if position == len(self._rows) else bisect_left(rows, self._rows[position], i)
+            self.beginInsertRows(QModelIndex(), position, position + end - i - 1)
+            self._issues[position:position] = issues[i:end]
+            self._rows[position:position] = array('i', rows[i:end])
+            self.endInsertRows()
+            i = end
+
+    def __set_row_issues(self, row: int, issues: typing.List[QaIssue]) -> None:
+        first = bisect_left(self._rows, row)
+        last = bisect_right(self._rows, row)
+        if self._issues[first:last] == issues:
+            return
+        if last > first:
+            self.beginRemoveRows(QModelIndex(), first, last - 1)
+            del self._issues[first:last]
+            del self._rows[first:last]
+            self.endRemoveRows()
+        self.__insert_issues(issues)
+
+    def issue(self, i: int) -> QaIssue:
+        return self._issues[i]
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._issues)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._headers)
+
+    def data(self, index: QModelIndex, role: int = ...) -> typing.Any:
+        if role == Qt.DisplayRole:
+            issue = self._issues[index.row()]
+            if index.column() == 0:
+                # Segments are numbered from 1, as in the grid
+                return issue.row + 1
+            return issue.check if index.column() == 1 else issue.message
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = ...) -> typing.Any:
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self._headers[section]
+        return super().headerData(section, orientation, role)
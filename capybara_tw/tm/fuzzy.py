@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Text normalization, trigrams and edit distance used for fuzzy matching."""
+import re
+from typing import Set
+
+from capybara_tw.util import tag_util
+
+# Tags are replaced with this single character, so that a tag counts as one edit regardless of its id
+TAG_PLACEHOLDER = '\ue000'
+WHITESPACES = re.compile(r'\s+')
+
+
+def normalize(text: str) -> str:
+    """ Normalizes a segment for fuzzy matching: tags are replaced with a placeholder character
+    and runs of whitespace are collapsed.
+    """
+    text = tag_util.ALL_TAGS.sub(TAG_PLACEHOLDER, text or '')
+    return WHITESPACES.sub(' ', text).strip()
+
+
+def trigrams(normalized: str) -> Set[str]:
+    """ Returns the set of the case-insensitive character trigrams of a normalized text, padded with spaces.
+    Texts shorter than a trigram yield the whole text.
+    """
+    padded = f' {normalized.lower()} '
+    if len(padded) < 3:
+        return {padded}
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def levenshtein(a: str, b: str) -> int:
+    """ Computes the edit distance between a and b with the bit-parallel algorithm of Myers (Hyyrö's formulation),
+    which runs in O(len(b)) operations on integers of len(a) bits.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    # The shorter string is the pattern
+    a, b = b, a
+    peq = {}
+    for i, c in enumerate(a):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    pv = full
+    mv = 0
+    score = len(a)
+    for c in b:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score
+
+
+def similarity_bound(length_a: int, length_b: int, grams_a: int, grams_b: int, shared: int) -> float:
+    """ Returns an upper bound of similarity() computed from the lengths and trigrams of two texts:
+    an edit changes the length by one, and removes at most 3 trigrams of either text.
+
+    Args:
+        length_a: Length of the first text
+        length_b: Length of the second text
+        grams_a: Number of trigrams of the first text
+        grams_b: Number of trigrams of the second text
+        shared: Number of trigrams of both texts
+    """
+    length = max(length_a, length_b)
+    if not length:
+        return 1.0
+    min_edits = max(abs(length_a - length_b), -(shared - grams_a) // 3, -(shared - grams_b) // 3)
+    return 1.0 - min_edits / length
+
+
+def similarity(a: str, b: str) -> float:
+    """ Returns 1 - edit distance / length of the longer text, between 0 and 1."""
+    length = max(len(a), len(b))
+    if not length:
+        return 1.0
+    return 1.0 - levenshtein(a, b) / length
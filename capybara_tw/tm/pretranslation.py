@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Pre-translation of documents from a translation memory, with the lookups sharded over worker processes."""
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from capybara_tw.model.capy_trans_unit import CapyTransUnit
+from capybara_tw.model.capy_xliff import CapyXliff
+from capybara_tw.tm.translation_memory import TmMatch, TranslationMemory
+from capybara_tw.util.xliff_util import State
+
+# Minimum score of the fuzzy matches filled into the targets
+DEFAULT_MIN_SCORE = 0.85
+# Number of sources looked up per task sent to a worker
+CHUNK_SIZE = 500
+
+# TM opened read-only by each worker process
+_worker_tm: Optional[TranslationMemory] = None
+
+
+def _open_worker_tm(path: str) -> None:
+    global _worker_tm
+    _worker_tm = TranslationMemory(path, read_only=True)
+
+
+def _lookup_chunk(sources: List[str], source_language: str, target_language: str,
+                  min_score: float) -> List[Optional[TmMatch]]:
+    result = []
+    for source in sources:
+        matches = _worker_tm.lookup(source, source_language, target_language, limit=1, min_score=min_score)
+        result.append(matches[0] if matches else None)
+    return result
+
+
+def create_executor(tm_path: str, max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """ Creates a pool of processes each opening the TM at tm_path, to be passed to pretranslate()."""
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_open_worker_tm, initargs=(tm_path,))
+
+
+def find_matches(executor: Executor, sources: Sequence[str], source_language: str, target_language: str,
+                 min_score: float = DEFAULT_MIN_SCORE) -> Dict[str, TmMatch]:
+    """ Looks up the best match of each source in chunks spread over the workers of executor.
+
+    Args:
+        executor: An executor created by create_executor()
+        sources: Distinct source texts
+        source_language: Language code of the sources
+        target_language: Language code of the translations
+        min_score: Minimum similarity between 0 and 1
+
+    Returns: The best matches keyed by source. Sources without a match are left out.
+    """
+    chunks = [sources[i:i + CHUNK_SIZE] for i in range(0, len(sources), CHUNK_SIZE)]
+    futures = [executor.submit(_lookup_chunk, chunk, source_language, target_language, min_score) for chunk in chunks]
+    matches = {}
+    for chunk, future in zip(chunks, futures):
+        matches.update((source, match) for source, match in zip(chunk, future.result()) if match)
+    return matches
+
+
+def apply_match(tu: CapyTransUnit, match: TmMatch) -> None:
+    """ Fills the target of a trans-unit with a match, and records the match as an alt-trans.
+    Exact matches are translated, fuzzy ones need a review.
+    """
+    tu.target.text = match.target
+    tu.target.state = State.TRANSLATED if match.is_exact else State.NEEDS_REVIEW_TRANSLATION
+    tu.sync_target_tags()
+    tu.alt_translations.append(match.to_alt_trans())
+    tu.mark_dirty()
+
+
+def pretranslate(xliff: CapyXliff, executor: Executor, min_score: float = DEFAULT_MIN_SCORE) -> int:
+    """ Fills the empty targets of a document from the exact and fuzzy matches of a TM.
+    Repeated sources are looked up once.
+
+    Args:
+        xliff: Document to pre-translate
+        executor: An executor created by create_executor()
+        min_score: Minimum score of the fuzzy matches
+
+    Returns: Number of trans-units filled
+    """
+    tus = [tu for tu in xliff.get_all_trans_units() if tu.translate and not tu.target.text and tu.source.text]
+    sources = list(dict.fromkeys(tu.source.text for tu in tus))
+    matches = find_matches(executor, sources, xliff.source_language, xliff.target_language, min_score)
+    count = 0
+    for tu in tus:
+        match = matches.get(tu.source.text)
+        if match:
+            apply_match(tu, match)
+            count += 1
+    return count
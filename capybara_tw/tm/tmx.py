@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Reading of TMX 1.4 files."""
+from typing import Iterator, Optional, Tuple
+
+from capybara_tw.util import xml_util
+from capybara_tw.util.xliff_util import XML
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def segment_text(seg) -> str:
+    """ Converts a seg element into model data. Paired inline codes (bpt/ept) become {i>...<i},
+    and standalone ones (ph/it/ut) become {x} or {i}, numbered in order of appearance if they have no id.
+    """
+    parts = [seg.text or '']
+    count = 0
+    for child in seg.iterdescendants():
+        name = local_name(child.tag) if isinstance(child.tag, str) else ''
+        if name == 'bpt':
+            parts.append(f'{{{child.get("i")}>')
+        elif name == 'ept':
+            parts.append(f'<{child.get("i")}}}')
+        elif name in ('ph', 'it', 'ut'):
+            count += 1
+            parts.append(f'{{{child.get("x") or child.get("i") or count}}}')
+        elif name == 'hi':
+            parts.append(child.text or '')
+        # The content of inline codes is native code, which is not part of the text
+        if child.getparent() is seg or local_name(child.getparent().tag) == 'hi':
+            parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+def find_language(languages, language: str) -> Optional[str]:
+    """ Finds language among languages, falling back on the first one with the same primary subtag (en-US -> en-GB)."""
+    language = language.lower()
+    for candidate in languages:
+        if candidate.lower() == language:
+            return candidate
+    primary = language.split('-')[0]
+    for candidate in languages:
+        if candidate.lower().split('-')[0] == primary:
+            return candidate
+    return None
+
+
+def iter_tmx(path: str, source_language: str, target_language: str) -> Iterator[Tuple[str, str]]:
+    """ Reads the translation units of a TMX file.
+
+    Args:
+        path: Path to the TMX file
+        source_language: Language code of the source, such as en-US
+        target_language: Language code of the target
+
+    Returns: An iterator yielding tuples of source and target text, for the units having both languages.
+    """
+    for _, tu in xml_util.iterparse(path, events=('end',)):
+        if not isinstance(tu.tag, str) or local_name(tu.tag) != 'tu':
+            continue
+        segments = {}
+        for tuv in tu:
+            if not isinstance(tuv.tag, str) or local_name(tuv.tag) != 'tuv':
+                continue
+            # TMX 1.4 uses xml:lang, older versions lang
+            language = tuv.get(XML + 'lang') or tuv.get('lang')
+            seg = next((e for e in tuv if isinstance(e.tag, str) and local_name(e.tag) == 'seg'), None)
+            if language and seg is not None:
+                segments[language] = segment_text(seg)
+        source = find_language(segments, source_language)
+        target = find_language(segments, target_language)
+        if source and target and source != target:
+            yield segments[source], segments[target]
+        xml_util.discard(tu)
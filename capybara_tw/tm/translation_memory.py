@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import dataclasses
+import heapq
+import math
+import pathlib
+import sqlite3
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+from capybara_tw.model.capy_alt_trans import CapyAltTrans
+from capybara_tw.model.capy_target import CapyTarget
+from capybara_tw.model.capy_trans_unit import CapyTransUnit
+from capybara_tw.tm import fuzzy, tmx
+from capybara_tw.util.xliff_util import State
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    source_language TEXT NOT NULL,
+    target_language TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    origin TEXT,
+    UNIQUE (source_language, target_language, source, target)
+);
+CREATE INDEX IF NOT EXISTS units_source ON units (source_language, target_language, source);
+-- Postings are clustered by trigram and length, so that a lookup only reads the units of a plausible length
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    unit_id INTEGER NOT NULL,
+    PRIMARY KEY (gram, length, unit_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS gram_stats (
+    gram TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+'''
+
+# States of the trans-units whose translation is stored into the TM
+CONFIRMED_STATES = (State.TRANSLATED, State.SIGNED_OFF, State.FINAL)
+# Number of units sharing the most trigrams with the query, retrieved as candidates
+MAX_CANDIDATES = 100
+# Number of candidates with the highest Dice coefficient, whose edit distance is computed
+MAX_SCORED = 25
+# Maximum number of the rarest trigrams of the query used to retrieve candidates
+MAX_PREFIX = 16
+# Number of units inserted per transaction on import
+IMPORT_BATCH_SIZE = 10000
+# Page cache of the database connection, in KiB
+CACHE_SIZE_KIB = 65536
+# Size of the memory-mapped part of a TM opened read-only. SQLite caps it at its compile-time maximum.
+MMAP_SIZE = 1 << 31
+
+
+@dataclasses.dataclass
+class TmMatch:
+    source: str
+    target: str
+    score: float  # Between 0 and 1. 1 for an exact match.
+    origin: Optional[str] = None
+
+    @property
+    def is_exact(self) -> bool:
+        return self.score >= 1.0
+
+    def to_alt_trans(self) -> CapyAltTrans:
+        alt_trans = CapyAltTrans()
+        alt_trans.origin = self.origin or 'tm'
+        alt_trans.match_quality = f'{math.floor(self.score * 100)}'
+        alt_trans.target = CapyTarget()
+        alt_trans.target.text = self.target
+        return alt_trans
+
+
+class TranslationMemory(object):
+    """A translation memory stored in a SQLite database, with a trigram inverted index for fuzzy lookup.
+
+    Units are indexed by the trigrams of their normalized source (see fuzzy.normalize).
+    A lookup only retrieves the units sharing one of the rarest trigrams of the query that any unit
+    above the minimum score must share (prefix filtering), ranks them by shared trigrams,
+    and scores the best ones by edit distance.
+    """
+    path: str
+    connection: sqlite3.Connection
+
+    def __init__(self, path: str, read_only: bool = False):
+        """
+        Args:
+            path: Path to the database file. Created if it does not exist, unless read_only.
+            read_only: Opens the database read-only and memory-maps it,
+                so that the processes looking up the same TM share its pages through the OS page cache.
+        """
+        self.path = path
+        if read_only:
+            self.connection = sqlite3.connect(pathlib.Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+            self.connection.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+        else:
+            self.connection = sqlite3.connect(path)
+            self.connection.executescript(SCHEMA)
+        self.connection.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KIB}')
+        # Postings and document frequencies of the units added since the last flush
+        self._pending_grams: List[Tuple[str, int, int]] = []
+        self._pending_df: Counter[str] = Counter()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> TranslationMemory:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM units').fetchone()[0]
+
+    def add(self, source: str, target: str, source_language: str, target_language: str,
+            origin: Optional[str] = None) -> bool:
+        """ Adds a unit to the TM. Commit with commit(), or use add_all() to add many.
+        The trigrams are indexed in bulk when committing.
+
+        Returns: True if added. False if the TM already contains the unit.
+        """
+        normalized = fuzzy.normalize(source)
+        if not normalized or not target:
+            return False
+        cursor = self.connection.execute(
+            'INSERT OR IGNORE INTO units (source_language, target_language, source, target, normalized, length, origin)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (source_language.lower(), target_language.lower(), source, target, normalized, len(normalized), origin))
+        if not cursor.rowcount:
+            return False
+        grams = fuzzy.trigrams(normalized)
+        unit_id = cursor.lastrowid
+        self._pending_grams.extend((gram, len(normalized), unit_id) for gram in grams)
+        self._pending_df.update(grams)
+        return True
+
+    def __flush(self) -> None:
+        """ Inserts the pending postings in key order, which keeps the writes to the index local."""
+        if not self._pending_grams:
+            return
+        self._pending_grams.sort()
+        self.connection.executemany('INSERT INTO grams (gram, length, unit_id) VALUES (?, ?, ?)', self._pending_grams)
+        self.connection.executemany('INSERT INTO gram_stats (gram, df) VALUES (?, ?)'
+                                    ' ON CONFLICT (gram) DO UPDATE SET df = df + excluded.df',
+                                    self._pending_df.items())
+        self._pending_grams.clear()
+        self._pending_df.clear()
+
+    def add_all(self, units: Iterable[Tuple[str, str]], source_language: str, target_language: str,
+                origin: Optional[str] = None) -> int:
+        """ Adds pairs of source and target text, committing in batches.
+
+        Returns: Number of units added
+        """
+        count = 0
+        with self.connection:
+            for i, (source, target) in enumerate(units, 1):
+                count += self.add(source, target, source_language, target_language, origin)
+                if i % IMPORT_BATCH_SIZE == 0:
+                    self.commit()
+            self.__flush()
+        return count
+
+    def commit(self) -> None:
+        self.__flush()
+        self.connection.commit()
+
+    def import_tmx(self, path: str, source_language: str, target_language: str) -> int:
+        """ Imports the units of a TMX 1.4 file for a language pair.
+
+        Returns: Number of units added
+        """
+        return self.add_all(tmx.iter_tmx(path, source_language, target_language),
+                            source_language, target_language, origin=path)
+
+    def import_trans_units(self, tus: Iterable[CapyTransUnit], source_language: str, target_language: str,
+                           origin: Optional[str] = None) -> int:
+        """ Imports the confirmed translations of trans-units.
+
+        Returns: Number of units added
+        """
+        units = ((tu.source.text, tu.target.text) for tu in tus
+                 if tu.target.text and tu.target.state in CONFIRMED_STATES)
+        return self.add_all(units, source_language, target_language, origin)
+
+    def lookup(self, source: str, source_language: str, target_language: str,
+               limit: int = 5, min_score: float = 0.7) -> List[TmMatch]:
+        """ Finds the units whose source is the most similar to source.
+
+        Args:
+            source: Source text to look up
+            source_language: Language code of the source
+            target_language: Language code of the target
+            limit: Maximum number of matches
+            min_score: Minimum similarity between 0 and 1
+
+        Returns: Matches sorted by decreasing score
+        """
+        source_language = source_language.lower()
+        target_language = target_language.lower()
+        normalized = fuzzy.normalize(source)
+        if not normalized:
+            return []
+        self.__flush()
+
+        # Exact matches come from the source index and rank first.
+        exact = self.connection.execute(
+            'SELECT source, target, origin FROM units WHERE source_language = ? AND target_language = ? AND source = ?'
+            ' ORDER BY id DESC LIMIT ?', (source_language, target_language, source, limit)).fetchall()
+        matches = [TmMatch(s, t, 1.0, o) for s, t, o in exact]
+        if len(matches) >= limit:
+            return matches
+        seen = {(m.source, m.target) for m in matches}
+
+        # A unit above min_score has a length within these bounds, and is at most max_edits edits away.
+        # Each edit removes at most 3 of the query trigrams, so it shares one of the 3 * max_edits + 1 rarest.
+        # That prefix is capped for long queries, which makes the retrieval approximate.
+        length = len(normalized)
+        min_length = math.ceil(length * min_score)
+        max_length = math.floor(length / min_score) if min_score > 0 else 1 << 31
+        max_edits = math.floor((1 - min_score) * max_length)
+        grams = fuzzy.trigrams(normalized)
+        prefix = self.__rarest(grams, min(len(grams), 3 * max_edits + 1, MAX_PREFIX))
+
+        placeholders = ','.join('?' * len(prefix))
+        rows = self.connection.execute(
+            f'SELECT u.source, u.target, u.origin, u.normalized FROM'
+            f' (SELECT unit_id, COUNT(*) AS shared FROM grams'
+            f'  WHERE gram IN ({placeholders}) AND length BETWEEN ? AND ? GROUP BY unit_id) g'
+            f' JOIN units u ON u.id = g.unit_id'
+            f' WHERE u.source_language = ? AND u.target_language = ?'
+            f' ORDER BY g.shared DESC LIMIT ?',
+            (*prefix, min_length, max_length, source_language, target_language, MAX_CANDIDATES)).fetchall()
+
+        # The edit distance is only computed for the candidates sharing the most trigrams (Dice coefficient),
+        # and only while their upper bound of the score may still let them into the results.
+        bounded = []
+        for row in rows:
+            candidate_grams = fuzzy.trigrams(row[3])
+            shared = len(grams & candidate_grams)
+            bound = fuzzy.similarity_bound(length, len(row[3]), len(grams), len(candidate_grams), shared)
+            if bound >= min_score and (row[0], row[1]) not in seen:
+                bounded.append((2 * shared / (len(grams) + len(candidate_grams)), bound, row))
+        bounded = heapq.nlargest(MAX_SCORED, bounded, key=lambda item: item[0])
+        bounded.sort(key=lambda item: item[1], reverse=True)
+        scores = []  # Min-heap of the best fuzzy scores
+        fuzzy_limit = limit - len(matches)
+        for _, bound, (s, t, o, n) in bounded:
+            if len(scores) == fuzzy_limit and bound <= scores[0]:
+                break
+            score = min(fuzzy.similarity(normalized, n), 0.99)  # Only identical sources are exact matches
+            if score >= min_score:
+                matches.append(TmMatch(s, t, score, o))
+                if len(scores) < fuzzy_limit:
+                    heapq.heappush(scores, score)
+                else:
+                    heapq.heappushpop(scores, score)
+        matches.sort(key=lambda m: m.score, reverse=True)
+        return matches[:limit]
+
+    def __rarest(self, grams, count: int) -> List[str]:
+        """ Returns the count trigrams of grams that the fewest units contain."""
+        grams = list(grams)
+        placeholders = ','.join('?' * len(grams))
+        df = Counter(dict(self.connection.execute(
+            f'SELECT gram, df FROM gram_stats WHERE gram IN ({placeholders})', grams).fetchall()))
+        # Trigrams no unit contains cannot retrieve anything, but still count in the prefix.
+        return sorted(grams, key=lambda gram: df[gram])[:count]
+
+    def find_alt_translations(self, tu: CapyTransUnit, source_language: str, target_language: str,
+                              limit: int = 5, min_score: float = 0.7) -> List[CapyAltTrans]:
+        """ Looks up the source of a trans-unit, and returns the matches as alt-trans entries."""
+        return [match.to_alt_trans()
+                for match in self.lookup(tu.source.text, source_language, target_language, limit, min_score)]
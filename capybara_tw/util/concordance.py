@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Inverted index of the segments of a document, for concordance search."""
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set
+
+from capybara_tw.util import tag_util
+from capybara_tw.util.segmenter import CJK_PATTERN, Segmenter, default_segmenter
+
+# Postings longer than this many times the shortest one are intersected by binary search instead of a set
+BISECT_RATIO = 32
+
+
+def terms(text: str, segmenter: Optional[Segmenter] = None) -> Set[str]:
+    """ Returns the terms a text is indexed by: its words in lowercase with tags stripped.
+    Words are runs of letters of a single script (see segmenter.WORD_PATTERN), indexed as a whole.
+    Runs of Japanese and Chinese characters, which are not delimited by spaces, are indexed by their characters and
+    character bigrams instead, so that any part of them can be searched for (see query_terms()). Kana and kanji are
+    taken as a single run, and so are the characters on both sides of a tag.
+
+    Args:
+        text: Source or target text, with tags
+        segmenter: Segmenter splitting the text into words. The default segmenter if omitted.
+    """
+    return _terms(text, segmenter, with_characters=True)
+
+
+def query_terms(query: str, segmenter: Optional[Segmenter] = None) -> Set[str]:
+    """ Returns the terms to look up for query. Unlike terms(), runs of Japanese and Chinese characters are looked up
+    by their bigrams only, a single character being looked up on its own.
+    """
+    return _terms(query, segmenter, with_characters=False)
+
+
+def _terms(text: str, segmenter: Optional[Segmenter], with_characters: bool) -> Set[str]:
+    segmenter = segmenter or default_segmenter()
+    text = (text or '').lower()
+    result = set()
+    for word in segmenter.words(tag_util.ALL_TAGS.sub(' ', text)):
+        # Words are runs of a single script, so punctuation is never part of a word.
+        if word.isalnum() and not CJK_PATTERN.match(word):
+            result.add(word)
+    for m in CJK_PATTERN.finditer(tag_util.ALL_TAGS.sub('', text)):
+        run = m.group(0)
+        result.update(run[i:i + 2] for i in range(len(run) - 1))
+        if with_characters or len(run) == 1:
+            result.update(run)
+    return result
+
+
+class ConcordanceIndex(object):
+    """Maps the terms of the texts of a column to the sorted rows containing them.
+
+    Rows are indexed in order as they are loaded, with add(). Edits are applied with update().
+    """
+    segmenter: Segmenter
+
+    def __init__(self, segmenter: Optional[Segmenter] = None):
+        self.segmenter = segmenter or default_segmenter()
+        self._postings: Dict[str, array] = {}
+        self._row_count = 0  # Rows indexed so far
+
+    def __len__(self) -> int:
+        return self._row_count
+
+    def terms(self, text: str) -> Set[str]:
+        return terms(text, self.segmenter)
+
+    def query_terms(self, query: str) -> Set[str]:
+        return query_terms(query, self.segmenter)
+
+    def add(self, row_terms: List[Set[str]]) -> None:
+        """ Indexes the next rows.
+
+        Args:
+            row_terms: Terms of each row, as returned by terms(), starting from the row after the last one indexed
+        """
+        for row, term_set in enumerate(row_terms, self._row_count):
+            for term in term_set:
+                postings = self._postings.get(term)
+                if postings is None:
+                    self._postings[term] = array('i', (row,))
+                else:
+                    postings.append(row)
+        self._row_count += len(row_terms)
+
+    def update(self, row: int, old_text: str, new_text: str) -> None:
+        """ Reindexes a row whose text has been changed. Rows not indexed yet are ignored."""
+        if row >= self._row_count:
+            return
+        old_terms = self.terms(old_text)
+        new_terms = self.terms(new_text)
+        for term in old_terms - new_terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            i = bisect_left(postings, row)
+            if i < len(postings) and postings[i] == row:
+                del postings[i]
+            if not postings:
+                del self._postings[term]
+        for term in new_terms - old_terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                self._postings[term] = array('i', (row,))
+            else:
+                insort(postings, row)
+
+    def search(self, query: str) -> List[int]:
+        """ Finds the rows containing all the terms of query.
+
+        Returns: Sorted rows. Empty if query has no term.
+        """
+        lookup = self.query_terms(query)
+        if not lookup:
+            return []
+        postings = sorted((self._postings.get(term, array('i')) for term in lookup), key=len)
+        shortest = postings[0]
+        if len(postings) == 1:
+            return shortest.tolist()
+        rows = set(shortest)
+        for other in postings[1:]:
+            if not rows:
+                break
+            if len(other) > len(shortest) * BISECT_RATIO:
+                rows = {row for row in rows if self.__contains(other, row)}
+            else:
+                rows.intersection_update(other)
+        return sorted(rows)
+
+    @staticmethod
+    def __contains(postings: array, row: int) -> bool:
+        i = bisect_left(postings, row)
+        return i < len(postings) and postings[i] == row
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import json
+import os
+from typing import BinaryIO, Iterable, List, Optional, Tuple
+
+from capybara_tw.util import file_util
+
+# Suffix appended to the name of the edited file
+JOURNAL_SUFFIX = '.journal'
+
+
+class EditJournal(object):
+    """An append-only log of the edits made to a file since it was last saved.
+
+    Each edit is written as a JSON line [row, column, text] as soon as it is made,
+    so that unsaved edits can be replayed onto the file after a crash.
+    The journal is flushed to the OS on every append but not synced to disk, which keeps appends cheap
+    while still surviving a crash of the application.
+    """
+    path: str
+
+    def __init__(self, filename: str):
+        """
+        Args:
+            filename: Path to the edited file. The journal is kept next to it.
+        """
+        self.path = filename + JOURNAL_SUFFIX
+        self._outfile: Optional[BinaryIO] = None
+
+    @property
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def append(self, row: int, column: int, text: str) -> None:
+        self.extend([(row, column, text)])
+
+    def extend(self, edits: Iterable[Tuple[int, int, str]]) -> None:
+        """ Appends several edits made at once, with a single flush."""
+        if self._outfile is None:
+            self._outfile = open(self.path, 'ab')
+        lines = ''.join(json.dumps([row, column, text], ensure_ascii=False) + '\n' for row, column, text in edits)
+        self._outfile.write(lines.encode('utf-8'))
+        self._outfile.flush()
+
+    def read(self) -> List[Tuple[int, int, str]]:
+        """ Reads the edits recorded in the journal.
+        A line left incomplete by a crash ends the journal.
+
+        Returns: A list of (row, column, text) in the order the edits were made.
+        """
+        if not self.exists:
+            return []
+        edits = []
+        with open(self.path, 'rb') as infile:
+            for line in infile:
+                try:
+                    row, column, text = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    break
+                edits.append((row, column, text))
+        return edits
+
+    def mark(self) -> int:
+        """ Returns the current end of the journal, to be passed to discard_until() once the edits made so far are saved."""
+        return os.path.getsize(self.path) if self.exists else 0
+
+    def discard_until(self, position: int) -> None:
+        """ Discards the edits recorded before position, keeping the ones made since.
+
+        Args:
+            position: A position returned by mark()
+        """
+        if not self.exists:
+            return
+        self.close()
+        with open(self.path, 'rb') as infile:
+            infile.seek(position)
+            rest = infile.read()
+        if rest:
+            with file_util.atomic_write(self.path) as outfile:
+                outfile.write(rest)
+        else:
+            file_util.remove_if_exists(self.path)
+
+    def clear(self) -> None:
+        self.close()
+        file_util.remove_if_exists(self.path)
+
+    def close(self) -> None:
+        if self._outfile is not None:
+            self._outfile.close()
+            self._outfile = None
@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
 import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
 
 
 def remove_if_exists(filepath: str) -> bool:
@@ -7,3 +11,58 @@ def remove_if_exists(filepath: str) -> bool:
         os.remove(filepath)
         return True
     return False
+
+
+@contextmanager
+def write_temporary(destination: str) -> Iterator[BinaryIO]:
+    """Opens a temporary file next to destination for writing in binary mode.
+    Once written, the temporary file is flushed to disk. Its path is available as the name attribute of the file object.
+    If an exception is raised while writing, the temporary file is removed.
+
+    Args:
+        destination: Path to the file the temporary file will replace
+
+    Returns: A context manager yielding the temporary file object.
+    """
+    directory, basename = os.path.split(os.path.abspath(destination))
+    temp_path = os.path.join(directory, f'.{basename}.{uuid.uuid4().hex[:8]}.tmp')
+    try:
+        with open(temp_path, 'xb') as outfile:
+            yield outfile
+            outfile.flush()
+            os.fsync(outfile.fileno())
+    except BaseException:
+        remove_if_exists(temp_path)
+        raise
+
+
+def replace(temp_path: str, destination: str) -> None:
+    """Moves a file written with write_temporary() over destination, keeping the permissions of destination.
+
+    Args:
+        temp_path: Path to the temporary file
+        destination: Path to the file to replace
+    """
+    try:
+        if os.path.isfile(destination):
+            shutil.copymode(destination, temp_path)
+        os.replace(temp_path, destination)
+    except BaseException:
+        remove_if_exists(temp_path)
+        raise
+
+
+@contextmanager
+def atomic_write(destination: str) -> Iterator[BinaryIO]:
+    """Opens a temporary file next to destination for writing in binary mode.
+    Once written, the temporary file is flushed to disk and renamed to destination.
+    If an exception is raised while writing, the temporary file is removed and destination is left untouched.
+
+    Args:
+        destination: Path to the file to write
+
+    Returns: A context manager yielding the temporary file object.
+    """
+    with write_temporary(destination) as outfile:
+        yield outfile
+    replace(outfile.name, destination)
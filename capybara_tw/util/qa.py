@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Quality checks of the translations: tags, numbers, leading and trailing whitespace, and empty targets."""
+import multiprocessing
+import re
+from collections import Counter, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from capybara_tw.util import tag_util
+from capybara_tw.util.xliff_util import State
+
+# Numbers, with their decimal and thousands separators
+NUMBERS = re.compile(r'\d+(?:[.,]\d+)*')
+# Number of segments checked per task sent to a worker
+CHUNK_SIZE = 2000
+# Number of tasks sent to the workers ahead of the results being consumed
+MAX_PENDING_CHUNKS = 8
+
+CHECK_TAGS = 'tags'
+CHECK_NUMBERS = 'numbers'
+CHECK_WHITESPACE = 'whitespace'
+CHECK_EMPTY_TARGET = 'empty-target'
+CHECKS = (CHECK_TAGS, CHECK_NUMBERS, CHECK_WHITESPACE, CHECK_EMPTY_TARGET)
+
+# Source text, target text and target state of a segment
+Segment = Tuple[str, str, State]
+
+
+class QaIssue(NamedTuple):
+    row: int
+    check: str  # One of CHECKS
+    message: str
+
+
+def check_tags(source: str, target: str) -> List[str]:
+    """ Finds the tags missing from target or not found in source."""
+    missing, extra = tag_util.diff_tags(source, target)
+    messages = []
+    if missing:
+        messages.append(f'missing tags {" ".join(missing)}')
+    if extra:
+        messages.append(f'extra tags {" ".join(extra)}')
+    return messages
+
+
+def numbers(text: str) -> Counter:
+    """ Counts the numbers in text, tags excluded. Digits are converted to ASCII and separators are dropped,
+    as they differ between languages ("1,000.5" and "1.000,5" are the same number).
+    """
+    return Counter(''.join(str(int(c)) for c in number if c.isdecimal())
+                   for number in NUMBERS.findall(tag_util.ALL_TAGS.sub(' ', text)))
+
+
+def check_numbers(source: str, target: str) -> List[str]:
+    """ Finds the numbers of source missing from target, and those of target not found in source."""
+    source_numbers = numbers(source)
+    target_numbers = numbers(target)
+    if source_numbers == target_numbers:
+        return []
+    messages = []
+    missing = source_numbers - target_numbers
+    if missing:
+        messages.append(f'missing numbers {" ".join(missing.elements())}')
+    extra = target_numbers - source_numbers
+    if extra:
+        messages.append(f'extra numbers {" ".join(extra.elements())}')
+    return messages
+
+
+def check_whitespace(source: str, target: str) -> List[str]:
+    """ Compares the whitespace at the start and at the end of source and target."""
+    messages = []
+    if source[:len(source) - len(source.lstrip())] != target[:len(target) - len(target.lstrip())]:
+        messages.append('leading whitespace differs from the source')
+    if source[len(source.rstrip()):] != target[len(target.rstrip()):]:
+        messages.append('trailing whitespace differs from the source')
+    return messages
+
+
+def check_segment(row: int, source: str, target: str, state: State) -> List[QaIssue]:
+    """ Runs all the checks on a segment.
+
+    Args:
+        row: Row of the segment, reported in the issues
+        source: Source text
+        target: Target text
+        state: Target state
+
+    Returns: The issues found, in the order of CHECKS
+    """
+    if not target:
+        message = f'empty target in state {state.value}' if state != State.NONE else 'empty target'
+        return [QaIssue(row, CHECK_EMPTY_TARGET, message)]
+    issues = [QaIssue(row, CHECK_TAGS, message) for message in check_tags(source, target)]
+    issues += [QaIssue(row, CHECK_NUMBERS, message) for message in check_numbers(source, target)]
+    issues += [QaIssue(row, CHECK_WHITESPACE, message) for message in check_whitespace(source, target)]
+    return issues
+
+
+def check_chunk(first_row: int, segments: List[Segment]) -> List[QaIssue]:
+    return [issue for row, segment in enumerate(segments, first_row) for issue in check_segment(row, *segment)]
+
+
+def create_executor(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    # The workers are started from a thread of a multi-threaded Qt process, which they must not be forked from:
+    # a lock held by another thread (loader, indexer, saver) at that time would never be released in the child.
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def iter_issues(executor: Executor, segments: Iterable[Segment], first_row: int = 0) -> Iterator[Tuple[int, List[QaIssue]]]:
+    """ Checks segments in chunks spread over the workers of executor.
+    Chunks are read from segments only as the workers need them, so that the segments are never all held in memory.
+
+    Args:
+        executor: An executor created by create_executor()
+        segments: Segments in row order, starting from first_row
+        first_row: Row of the first segment
+
+    Returns: An iterator over the row up to which the segments have been checked and the issues found in the last
+        chunk, in row order. Closing the iterator cancels the chunks not checked yet.
+    """
+    pending = deque()
+    rows = first_row
+    chunk = []
+    try:
+        for segment in segments:
+            chunk.append(segment)
+            if len(chunk) >= CHUNK_SIZE:
+                pending.append((rows + len(chunk), executor.submit(check_chunk, rows, chunk)))
+                rows += len(chunk)
+                chunk = []
+                if len(pending) >= MAX_PENDING_CHUNKS:
+                    checked, future = pending.popleft()
+                    yield checked, future.result()
+        if chunk:
+            pending.append((rows + len(chunk), executor.submit(check_chunk, rows, chunk)))
+        while pending:
+            checked, future = pending.popleft()
+            yield checked, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
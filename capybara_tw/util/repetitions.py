@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Groups of the segments whose sources are repetitions of each other, for propagating translations."""
+import re
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, List
+
+from capybara_tw.util import tag_util
+
+WHITESPACES = re.compile(r'\s+')
+
+
+def numbered_tag_ids(text: str) -> List[str]:
+    """ Lists the distinct ids of the numbered tags in text, in order of first appearance."""
+    return list(dict.fromkeys(tag_id for tag_id in tag_util.find_tag_ids(text) if not tag_util.is_builtin(tag_id)))
+
+
+def renumber_tags(text: str, mapping: Dict[str, str]) -> str:
+    """ Replaces the ids of the tags in text found in mapping ("{1>" -> "{3>" with {'1': '3'})."""
+    if not mapping:
+        return text
+
+    def replace(m: re.Match) -> str:
+        tag = m.group(0)
+        tag_id = tag_util.tag_id(tag)
+        return tag[0] + mapping[tag_id] + tag[-1] if tag_id in mapping else tag
+
+    return tag_util.ALL_TAGS.sub(replace, text)
+
+
+def repetition_key(source: str) -> str:
+    """ Returns the key shared by the repetitions of a source: its text with runs of whitespace folded,
+    and its numbered tags canonicalized by renumbering them in order of appearance.
+    "{3>Save<3}  now" and "{1>Save<1} now" are repetitions of each other.
+    """
+    ids = numbered_tag_ids(source)
+    text = renumber_tags(source, {tag_id: str(i) for i, tag_id in enumerate(ids, 1)}) if ids else source
+    return WHITESPACES.sub(' ', text).strip()
+
+
+def adapt_translation(target: str, source: str, repetition: str) -> str:
+    """ Adapts the translation of source to a repetition of it, mapping the tags of source to those of the repetition.
+
+    Args:
+        target: Translation of source
+        source: Source text
+        repetition: Source text with the same repetition_key() as source
+    """
+    mapping = dict(zip(numbered_tag_ids(source), numbered_tag_ids(repetition)))
+    return renumber_tags(target, {old: new for old, new in mapping.items() if old != new})
+
+
+class RepetitionIndex(object):
+    """Groups the rows by the repetition key of their source, in a hash table.
+
+    Rows are indexed in order as they are loaded, with add(). Edits of the sources are applied with update().
+    """
+
+    def __init__(self):
+        self._groups = array('i')  # Group of each row
+        self._group_ids: Dict[str, int] = {}  # Group of each key
+        self._group_rows: List[array] = []  # Sorted rows of each group
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    @property
+    def repetition_count(self) -> int:
+        """Number of rows repeating the source of an earlier row."""
+        return len(self._groups) - sum(1 for rows in self._group_rows if rows)
+
+    def add(self, keys: List[str]) -> None:
+        """ Indexes the next rows.
+
+        Args:
+            keys: Repetition key of each row, starting from the row after the last one indexed
+        """
+        for row, key in enumerate(keys, len(self._groups)):
+            group = self._group_ids.get(key)
+            if group is None:
+                group = self._group_ids[key] = len(self._group_rows)
+                self._group_rows.append(array('i'))
+            self._group_rows[group].append(row)
+            self._groups.append(group)
+
+    def update(self, row: int, key: str) -> None:
+        """ Reindexes a row whose source has been changed. Rows not indexed yet are ignored."""
+        if row >= len(self._groups):
+            return
+        rows = self._group_rows[self._groups[row]]
+        del rows[bisect_left(rows, row)]
+        group = self._group_ids.get(key)
+        if group is None:
+            group = self._group_ids[key] = len(self._group_rows)
+            self._group_rows.append(array('i'))
+        insort(self._group_rows[group], row)
+        self._groups[row] = group
+
+    def repetitions(self, row: int) -> List[int]:
+        """ Returns the other rows with the same key as row, sorted. Empty if row has not been indexed yet."""
+        if row >= len(self._groups):
+            return []
+        return [other for other in self._group_rows[self._groups[row]] if other != row]
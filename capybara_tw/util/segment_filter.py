@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Row sets of the segments by state, empty target and tag mismatch, for filtering the grid."""
+from __future__ import annotations
+
+from array import array
+from typing import Collection, Dict, List, NamedTuple, Optional, Set
+
+from capybara_tw.util import tag_util
+from capybara_tw.util.xliff_util import State
+
+STATES = list(State)
+STATE_ORDINALS = {state: i for i, state in enumerate(STATES)}
+
+
+class SegmentFlags(NamedTuple):
+    state: State
+    empty_target: bool
+    tag_mismatch: bool
+
+    @classmethod
+    def of(cls, source: str, target: str, state: State) -> SegmentFlags:
+        tag_mismatch = bool(target) and any(tag_util.diff_tags(source, target))
+        return cls(state, not target, tag_mismatch)
+
+
+class SegmentFilterIndex(object):
+    """Keeps the rows of each state, and the rows with an empty target or mismatching tags,
+    up to date as segments are loaded and edited.
+
+    Filters are then applied in proportion to the number of matching rows, instead of checking every segment.
+    """
+
+    def __init__(self):
+        self._states = array('B')  # Ordinal of the state of each row
+        self._state_rows: Dict[State, Set[int]] = {state: set() for state in STATES}
+        self._empty_targets: Set[int] = set()
+        self._tag_mismatches: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def add(self, flags: List[SegmentFlags]) -> None:
+        """ Indexes the next rows.
+
+        Args:
+            flags: Flags of each row, starting from the row after the last one indexed
+        """
+        for row, (state, empty_target, tag_mismatch) in enumerate(flags, len(self._states)):
+            self._states.append(STATE_ORDINALS[state])
+            self._state_rows[state].add(row)
+            if empty_target:
+                self._empty_targets.add(row)
+            if tag_mismatch:
+                self._tag_mismatches.add(row)
+
+    def update(self, row: int, flags: SegmentFlags) -> None:
+        """ Reindexes a row whose segment has been changed. Rows not indexed yet are ignored."""
+        if row >= len(self._states):
+            return
+        old_state = STATES[self._states[row]]
+        if old_state != flags.state:
+            self._state_rows[old_state].discard(row)
+            self._state_rows[flags.state].add(row)
+            self._states[row] = STATE_ORDINALS[flags.state]
+        for rows, value in ((self._empty_targets, flags.empty_target), (self._tag_mismatches, flags.tag_mismatch)):
+            if value:
+                rows.add(row)
+            else:
+                rows.discard(row)
+
+    def count(self, state: State) -> int:
+        return len(self._state_rows[state])
+
+    def rows(self, states: Optional[Collection[State]] = None, empty_target: bool = False,
+             tag_mismatch: bool = False) -> Optional[Set[int]]:
+        """ Finds the rows meeting all the given criteria.
+
+        Args:
+            states: States any of which the rows must be in
+            empty_target: True for the rows whose target is empty only
+            tag_mismatch: True for the rows whose target tags differ from the source ones only
+
+        Returns: The rows, or None if no criterion has been given (all rows match).
+        """
+        candidates = []
+        if states is not None:
+            candidates.append(set().union(*(self._state_rows[state] for state in states)))
+        if empty_target:
+            candidates.append(self._empty_targets)
+        if tag_mismatch:
+            candidates.append(self._tag_mismatches)
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        return candidates[0].intersection(*candidates[1:])
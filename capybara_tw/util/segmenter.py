@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Word segmentation shared by the editors (cursor movement and selection) and non-GUI components
+(word counts, concordance), so that they all tokenize text identically.
+
+Segmenters are stateless once built and can be shared between threads and editors.
+"""
+from __future__ import annotations
+
+import abc
+import functools
+import re
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+# Runs of Latin letters and digits, hiragana, katakana, kanji, or letters of other scripts (Cyrillic, Greek, Hangul, Arabic...).
+# Any other character but whitespace is a word on its own.
+WORD_PATTERN = re.compile(r'[a-zA-Z0-9\u00C0-\u024F]+|[ぁ-んー]+|[ァ-ンー]+|[\u4e00-\u9FFF]+|[^\W\d_ぁ-んァ-ンー\u4e00-\u9FFFa-zA-Z\u00C0-\u024F]+'
+                          r'|[^\sぁ-んァ-ンー\u4e00-\u9FFFa-zA-Z0-9\u00C0-\u024F]')
+# Runs of Japanese and Chinese characters, looked up in the dictionary by DictionarySegmenter
+CJK_PATTERN = re.compile(r'[ぁ-んァ-ンー\u4e00-\u9FFF]+')
+
+
+class Segmenter(abc.ABC):
+    """Splits text into words."""
+
+    @abc.abstractmethod
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """ Finds the words in text.
+
+        Args:
+            text: Text to segment
+
+        Returns: A sorted list of (start, end) positions of the words. Whitespace is not a word.
+        """
+
+    def words(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.spans(text)]
+
+    def count_words(self, text: str) -> int:
+        """ Counts the words in text, punctuation excluded."""
+        # isalnum() settles most words at once
+        return sum(1 for word in self.words(text) if word.isalnum() or any(c.isalnum() for c in word))
+
+
+class RegexSegmenter(Segmenter):
+    """Splits text into runs of characters of the same script."""
+    pattern: Pattern
+
+    def __init__(self, pattern: Pattern = WORD_PATTERN):
+        self.pattern = pattern
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        return [m.span() for m in self.pattern.finditer(text) if not m.group(0).isspace()]
+
+    def words(self, text: str) -> List[str]:
+        # Faster than slicing the spans, which matters to the concordance index
+        return [word for word in self.pattern.findall(text) if not word.isspace()]
+
+
+class DictionarySegmenter(Segmenter):
+    """Splits runs of Japanese and Chinese characters into the longest words found in a dictionary,
+    scanning from left to right. The rest of the text, and the characters not found in the dictionary,
+    are segmented by a fallback segmenter.
+    """
+    dictionary: frozenset
+    max_length: int
+    fallback: Segmenter
+
+    def __init__(self, words: Iterable[str], fallback: Optional[Segmenter] = None):
+        self.dictionary = frozenset(word for word in words if len(word) > 1)
+        self.max_length = max((len(word) for word in self.dictionary), default=0)
+        self.fallback = fallback or default_segmenter()
+
+    @classmethod
+    def from_file(cls, path: str, fallback: Optional[Segmenter] = None) -> DictionarySegmenter:
+        """ Loads a dictionary file with one word per line. Anything after a tab is ignored."""
+        with open(path, encoding='utf-8') as infile:
+            return cls((line.split('\t', 1)[0].strip() for line in infile), fallback)
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        spans = []
+        last = 0
+        for m in CJK_PATTERN.finditer(text):
+            spans.extend(self.__fallback_spans(text, last, m.start()))
+            spans.extend(self.__match(text, m.start(), m.end()))
+            last = m.end()
+        spans.extend(self.__fallback_spans(text, last, len(text)))
+        return spans
+
+    def __match(self, text: str, start: int, end: int) -> List[Tuple[int, int]]:
+        spans = []
+        pos = unmatched = start
+        while pos < end:
+            for length in range(min(self.max_length, end - pos), 1, -1):
+                if text[pos:pos + length] in self.dictionary:
+                    break
+            else:
+                pos += 1
+                continue
+            spans.extend(self.__fallback_spans(text, unmatched, pos))
+            spans.append((pos, pos + length))
+            pos = unmatched = pos + length
+        spans.extend(self.__fallback_spans(text, unmatched, end))
+        return spans
+
+    def __fallback_spans(self, text: str, start: int, end: int) -> List[Tuple[int, int]]:
+        if start >= end:
+            return []
+        return [(start + s, start + e) for s, e in self.fallback.spans(text[start:end])]
+
+
+@functools.lru_cache(maxsize=None)
+def default_segmenter() -> Segmenter:
+    """Returns the segmenter shared by default across the application."""
+    return RegexSegmenter()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Word, character, tag and repetition counts of the segments of documents, for quoting and progress tracking."""
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from capybara_tw.model.capy_trans_unit import CapyTransUnit
+from capybara_tw.model.capy_xliff import CapyXliff
+from capybara_tw.tm.translation_memory import CONFIRMED_STATES
+from capybara_tw.util import tag_util
+from capybara_tw.util.repetitions import repetition_key
+from capybara_tw.util.segment_filter import STATES, STATE_ORDINALS
+from capybara_tw.util.segmenter import Segmenter, default_segmenter
+
+# Totals computed by SegmentStatistics.aggregate()
+FIELDS = ('segments', 'translated', 'words', 'characters', 'tags', 'repetitions', 'repeated_words')
+# Keys SegmentStatistics.aggregate() can group the segments by
+GROUP_BY = ('file', 'group', 'state')
+
+
+class SegmentStatistics(object):
+    """Counts of each segment, held in columns of arrays with one entry per segment in document order.
+
+    Segments are counted once per distinct source text, and totals are aggregated over the columns by file,
+    group or state. A segment is a repetition if a segment with the same repetition key (see repetitions.repetition_key)
+    has been added before it, in the same document or another one.
+    """
+    segmenter: Segmenter
+
+    def __init__(self, segmenter: Optional[Segmenter] = None):
+        self.segmenter = segmenter or default_segmenter()
+        # Columns
+        self.words = array('i')
+        self.characters = array('i')  # Characters of the source, tags excluded
+        self.tags = array('i')  # Tags of the source
+        self.translated = array('b')  # 1 if the target is not empty and in one of CONFIRMED_STATES
+        self.repeated = array('b')  # 1 if the segment is a repetition
+        self.states = array('b')  # Ordinal of the target state in segment_filter.STATES
+        self.files = array('i')  # Index in file_names
+        self.groups = array('i')  # Index in group_names
+        self.file_names: List[str] = []
+        self.group_names: List[str] = []
+        # Counts of each source text, and repetition keys seen so far
+        self._counts: Dict[str, Tuple[int, int, int, str]] = {}
+        self._keys: set = set()
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @classmethod
+    def of(cls, xliff: CapyXliff, name: str = '', segmenter: Optional[Segmenter] = None) -> 'SegmentStatistics':
+        obj = cls(segmenter)
+        obj.add_xliff(xliff, name)
+        return obj
+
+    def add_xliff(self, xliff: CapyXliff, name: str = '') -> None:
+        """ Counts the segments of a document.
+
+        Args:
+            xliff: Document to count
+            name: Name of the document, prepended to the names of its files
+        """
+        for capy_file in xliff.files:
+            file_index = len(self.file_names)
+            self.file_names.append(f'{name}:{capy_file.original}' if name else capy_file.original or '')
+            for group in capy_file.body.groups if capy_file.body else []:
+                group_index = len(self.group_names)
+                self.group_names.append(f'{self.file_names[file_index]}#{group.id}')
+                for tu in group.trans_units:
+                    self.add_trans_unit(tu, file_index, group_index)
+
+    def add_trans_unit(self, tu: CapyTransUnit, file_index: int, group_index: int) -> None:
+        text = tu.source.text
+        counts = self._counts.get(text)
+        if counts is None:
+            plain = tag_util.ALL_TAGS.sub(' ', text)
+            counts = (self.segmenter.count_words(plain), len(tag_util.ALL_TAGS.sub('', text)),
+                      len(tag_util.ALL_TAGS.findall(text)), repetition_key(text))
+            self._counts[text] = counts
+        words, characters, tags, key = counts
+        self.words.append(words)
+        self.characters.append(characters)
+        self.tags.append(tags)
+        self.translated.append(1 if tu.target.text and tu.target.state in CONFIRMED_STATES else 0)
+        self.repeated.append(1 if key in self._keys else 0)
+        self._keys.add(key)
+        self.states.append(STATE_ORDINALS[tu.target.state])
+        self.files.append(file_index)
+        self.groups.append(group_index)
+
+    def aggregate(self, by: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """ Sums the columns over the segments.
+
+        Args:
+            by: 'file', 'group' or 'state' to total the segments of each separately, None for a grand total
+
+        Returns: Totals of FIELDS keyed by file name, group name, state value, or 'total'
+        """
+        if by is None:
+            keys, names = None, ['total']
+        elif by == 'file':
+            keys, names = self.files, self.file_names
+        elif by == 'group':
+            keys, names = self.groups, self.group_names
+        elif by == 'state':
+            keys, names = self.states, [state.value for state in STATES]
+        else:
+            raise ValueError(f'Unknown grouping: {by}')
+
+        totals = [[0] * len(FIELDS) for _ in names]
+        columns = (self.translated, self.words, self.characters, self.tags, self.repeated)
+        if keys is None:
+            totals[0] = [len(self)] + [sum(column) for column in columns]
+            totals[0].append(sum(w for w, r in zip(self.words, self.repeated) if r))
+        else:
+            for key, translated, words, characters, tags, repeated in zip(keys, *columns):
+                total = totals[key]
+                total[0] += 1
+                total[1] += translated
+                total[2] += words
+                total[3] += characters
+                total[4] += tags
+                total[5] += repeated
+                if repeated:
+                    total[6] += words
+        return {name: dict(zip(FIELDS, total)) for name, total in zip(names, totals) if total[0]}
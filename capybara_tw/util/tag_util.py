@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import re
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+# Tag placeholders in the text of a segment: {1>, <1}, {1}, {b>, <b}, {j}, etc.
+START_TAGS = re.compile(r'({[biu_^]+?>|{[0-9]{1,2}>)')
+END_TAGS = re.compile(r'(<[biu_^]+?\}|<[0-9]{1,2}\})')
+EMPTY_TAGS = re.compile(r'({[0-9]{1,2}\}|{j\})')
+ALL_TAGS = re.compile(r'({[biu_^]+?>|<[biu_^]+?\}|{[0-9]{1,2}>|<[0-9]{1,2}\}|{[0-9]{1,2}\}|{j\})')
+
+
+def tag_id(tag: str) -> str:
+    """ Extracts the id from a tag placeholder ("{1>" -> "1", "<b}" -> "b", "{j}" -> "j").
+
+    Args:
+        tag: A tag placeholder
+
+    Returns: The tag id
+    """
+    return tag.strip('{}<>')
+
+
+def find_tag_ids(text: str) -> List[str]:
+    """ Lists the ids of the tags in text, in order of appearance.
+
+    Args:
+        text: Text of a segment
+
+    Returns: A list of tag ids. Paired tags appear twice.
+    """
+    return [tag_id(tag) for tag in ALL_TAGS.findall(text or '')]
+
+
+def is_builtin(tag_id: str) -> bool:
+    """ Indicates whether a tag is a builtin formatting tag (b|i|u|^|_|j), which has no definition in the tag lists."""
+    return not tag_id.isdigit()
+
+
+def diff_tags(source: str, target: str) -> Tuple[List[str], List[str]]:
+    """ Compares the tags of a source and a target segment.
+
+    Args:
+        source: Source text
+        target: Target text
+
+    Returns: A tuple of the tags missing from target and the tags not found in source,
+        as placeholders sorted in order of appearance.
+    """
+    source_tags = ALL_TAGS.findall(source or '')
+    target_tags = ALL_TAGS.findall(target or '')
+    source_set = TagMultiset(source_tags)
+    target_set = TagMultiset(target_tags)
+    return in_order(source_tags, source_set - target_set), in_order(target_tags, target_set - source_set)
+
+
+def in_order(tags: List[str], subset: TagMultiset) -> List[str]:
+    """ Lists the tags of subset in the order they first appear in tags, of which subset is a multiset subset."""
+    remaining = Counter(subset.counts)
+    result = []
+    for tag in tags:
+        if remaining[tag] > 0:
+            remaining[tag] -= 1
+            result.append(tag)
+    return result
+
+
+def first_missing(source: str, target_tags: TagMultiset) -> Optional[str]:
+    """ Finds the first tag of source, in order of appearance, occurring more times in source than in target_tags.
+
+    Args:
+        source: Source text
+        target_tags: Tags of the target
+
+    Returns: A tag placeholder, or None if no tag is missing from the target
+    """
+    source_tags = ALL_TAGS.findall(source or '')
+    source_counts = Counter(source_tags)
+    for tag in source_tags:
+        if source_counts[tag] > target_tags.count(tag):
+            return tag
+    return None
+
+
+class TagMultiset(object):
+    """The tag placeholders of a text counted with a Counter, so that the tags of two texts are compared in linear time.
+    Tags can be added and removed as they are inserted into or deleted from the text, instead of parsing it again.
+    """
+    __slots__ = ('counts',)
+    counts: Counter
+
+    def __init__(self, tags: Iterable[str] = ()):
+        self.counts = Counter(tags)
+
+    @classmethod
+    def of(cls, text: str) -> TagMultiset:
+        return cls(ALL_TAGS.findall(text or ''))
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, TagMultiset) and self.counts == other.counts
+
+    def __sub__(self, other: TagMultiset) -> TagMultiset:
+        """ Returns the tags occurring more times in this multiset than in other."""
+        result = TagMultiset()
+        result.counts = self.counts - other.counts
+        return result
+
+    def count(self, tag: str) -> int:
+        return self.counts[tag]
+
+    def add(self, tag: str) -> None:
+        self.counts[tag] += 1
+
+    def remove(self, tag: str) -> None:
+        if self.counts[tag] > 1:
+            self.counts[tag] -= 1
+        else:
+            del self.counts[tag]
+
+    def __repr__(self):
+        return f'TagMultiset({dict(self.counts)})'
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 import os
 import re
-from typing import Callable, Optional, Any
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Any, Sequence, Union, BinaryIO, Iterator
 
 from lxml import etree
 
+NS_DECLARATION = re.compile(rb'\s+xmlns(?::([\w.-]+))?="([^"]*)"')
+
 
 def get_parser(xml_file: str, encoding: Optional[str] = None) -> etree.XMLParser:
     size_mb = os.path.getsize(xml_file) / 1000000
@@ -15,6 +18,103 @@ def get_parser(xml_file: str, encoding: Optional[str] = None) -> etree.XMLParser
     return parser
 
 
+def iterparse(xml_file: Union[str, BinaryIO], events: Sequence[str] = ('end',),
+              tag: Optional[Any] = None) -> etree.iterparse:
+    if isinstance(xml_file, str):
+        size_mb = os.path.getsize(xml_file) / 1000000
+    else:
+        size_mb = os.fstat(xml_file.fileno()).st_size / 1000000
+    return etree.iterparse(xml_file, events=events, tag=tag, huge_tree=size_mb > 9)
+
+
+def discard(elem) -> None:
+    """Frees an element that has been fully processed during iterparse, together with its preceding siblings.
+
+    Args:
+        elem: An element whose end event has been received.
+    """
+    elem.clear(keep_tail=True)
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def parse_fragment(fragment: bytes, nsmap: Dict[Optional[str], str]) -> Any:
+    """Parses an element cut out of a utf-8 document whose root element declares nsmap.
+
+    Args:
+        fragment: Serialized element
+        nsmap: Namespace declarations in scope in the original document
+
+    Returns: The parsed element
+    """
+    # <fragment xmlns="..." xmlns:capy="..."/> with the namespace declarations quoted by lxml
+    start_tag = etree.tostring(etree.Element('fragment', nsmap=nsmap))[:-2] + b'>'
+    wrapper = etree.fromstring(start_tag + fragment + b'</fragment>')
+    return wrapper[0]
+
+
+def serialize_fragment(elem, nsmap: Dict[Optional[str], str], level: int = 0) -> bytes:
+    """Serializes an element to be spliced into a utf-8 document whose root element declares nsmap.
+
+    Namespace declarations already made by the root element are left out,
+    and the content is indented as if the element was nested at the given level.
+
+    Args:
+        elem: Element to serialize
+        nsmap: Namespace declarations in scope in the destination document
+        level: Nesting level of the element in the destination document
+
+    Returns: The serialized element without tail
+    """
+    wrapper = etree.Element('fragment', nsmap=nsmap)
+    wrapper.append(elem)
+    etree.indent(elem, level=level)
+    xml = etree.tostring(elem, encoding='utf-8', with_tail=False)
+    declared = {(prefix.encode('utf-8') if prefix else None, uri.encode('utf-8')) for prefix, uri in nsmap.items()}
+    start_tag_end = xml.index(b'>')
+    start_tag = NS_DECLARATION.sub(lambda m: b'' if (m.group(1), m.group(2)) in declared else m.group(0),
+                                   xml[:start_tag_end])
+    return start_tag + xml[start_tag_end:]
+
+
+@contextmanager
+def write_start_element(xf: etree.xmlfile, elem, level: int = 0) -> Iterator[None]:
+    """Writes the start tag of elem through an incremental writer, and its end tag when the context exits.
+    The children of elem are ignored; they are expected to be written within the context.
+
+    Args:
+        xf: Incremental writer created with etree.xmlfile
+        elem: Element holding the tag, attributes and namespace declarations to write
+        level: Nesting level used for indentation
+    """
+    if level:
+        xf.write('\n' + '  ' * level)
+    with xf.element(elem.tag, elem.attrib, nsmap=elem.nsmap if level == 0 else None):
+        yield
+        xf.write('\n' + '  ' * level)
+
+
+def write_element(xf: etree.xmlfile, elem, level: int = 0) -> None:
+    """Writes elem and its descendants through an incremental writer, indented at the given level.
+    Unlike xf.write(elem), the namespace prefixes declared by the enclosing elements are reused.
+
+    Args:
+        xf: Incremental writer created with etree.xmlfile
+        elem: Element to write. Mixed content is not supported.
+        level: Nesting level of the element
+    """
+    xf.write('\n' + '  ' * level)
+    with xf.element(elem.tag, elem.attrib):
+        if elem.text:
+            xf.write(elem.text)
+        if len(elem):
+            for child in elem:
+                write_element(xf, child, level + 1)
+            xf.write('\n' + '  ' * level)
+
+
 def remove_invalid_chars(chars: str) -> str:
     if not chars:
         return ''
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import typing
+from bisect import bisect_left, bisect_right
+
+from PyQt5.QtCore import QAbstractProxyModel, QModelIndex, Qt
+
+from capybara_tw.util.xliff_util import State
+from capybara_tw.xliff_model import XliffModel
+
+
+class XliffFilterModel(QAbstractProxyModel):
+    """Shows the rows of an XliffModel meeting a filter.
+
+    Unlike QSortFilterProxyModel, which checks every row whenever the filter changes, the rows are looked up in the
+    indexes of the source model (see XliffModel.filter_rows), and kept as a sorted list mapping the rows to the source.
+    Rows edited so that they no longer meet the filter stay visible until the filter is set again.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: typing.List[int] = []  # Source row of each row, in increasing order
+        self._states: typing.Optional[typing.Collection[State]] = None
+        self._empty_target = False
+        self._tag_mismatch = False
+        self._pattern: typing.Optional[typing.Pattern] = None
+        self._is_filtering = False
+
+    def setSourceModel(self, model: XliffModel) -> None:
+        self.beginResetModel()
+        if self.sourceModel():
+            self.sourceModel().dataChanged.disconnect(self.__on_source_data_changed)
+            self.sourceModel().rowsInserted.disconnect(self.__on_source_rows_inserted)
+            self.sourceModel().loadingProgressed.disconnect(self.__on_source_loading_progressed)
+            self.sourceModel().headerDataChanged.disconnect(self.headerDataChanged)
+        super().setSourceModel(model)
+        model.dataChanged.connect(self.__on_source_data_changed)
+        model.rowsInserted.connect(self.__on_source_rows_inserted)
+        model.loadingProgressed.connect(self.__on_source_loading_progressed)
+        model.headerDataChanged.connect(self.headerDataChanged)
+        self._rows = []
+        self._is_filtering = False
+        self.endResetModel()
+
+    def set_filter(self, states: typing.Optional[typing.Collection[State]] = None, empty_target: bool = False,
+                   tag_mismatch: bool = False, pattern: typing.Optional[typing.Pattern] = None) -> None:
+        """ Shows the rows meeting all the given criteria. See XliffModel.filter_rows()."""
+        self._states = states
+        self._empty_target = empty_target
+        self._tag_mismatch = tag_mismatch
+        self._pattern = pattern
+        self._is_filtering = True
+        self.refresh()
+
+    def clear_filter(self) -> None:
+        """Stops following the source model, once the filter is no longer shown."""
+        self._is_filtering = False
+        self._states = None
+        self._empty_target = False
+        self._tag_mismatch = False
+        self._pattern = None
+        self.beginResetModel()
+        self._rows = []
+        self.endResetModel()
+
+    def refresh(self) -> None:
+        """Applies the filter again, to the rows loaded and edited since it has been set."""
+        model: XliffModel = self.sourceModel()
+        # Rows matching the filter may not have been fetched by the views of the source model yet.
+        model.fetch_all()
+        self.beginResetModel()
+        self._rows = model.filter_rows(self._states, self._empty_target, self._tag_mismatch, self._pattern)
+        self.endResetModel()
+
+    def __on_source_rows_inserted(self, parent: QModelIndex, first: int, last: int) -> None:
+        # Rows are only appended to the source model, as the file is being loaded.
+        if not self._is_filtering:
+            return
+        model: XliffModel = self.sourceModel()
+        if self._rows:
+            first = max(first, self._rows[-1] + 1)
+        rows = model.filter_rows(self._states, self._empty_target, self._tag_mismatch, self._pattern, first, last + 1)
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+
+    def __on_source_loading_progressed(self, progress: int) -> None:
+        # Views only fetch more rows when they are scrolled to the end, which a few rows meeting the filter may never
+        # fill, so every row loaded is exposed while filtering.
+        if self._is_filtering:
+            self.sourceModel().fetch_all()
+
+    def __on_source_data_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles: typing.List[int] = ()) -> None:
+        first = bisect_left(self._rows, top_left.row())
+        last = bisect_right(self._rows, bottom_right.row()) - 1
+        if first <= last:
+            self.dataChanged.emit(self.index(first, top_left.column()), self.index(last, bottom_right.column()), roles)
+
+    def mapToSource(self, proxy_index: QModelIndex) -> QModelIndex:
+        if not proxy_index.isValid() or not self.sourceModel() or proxy_index.row() >= len(self._rows):
+            return QModelIndex()
+        return self.sourceModel().index(self._rows[proxy_index.row()], proxy_index.column())
+
+    def mapFromSource(self, source_index: QModelIndex) -> QModelIndex:
+        if not source_index.isValid():
+            return QModelIndex()
+        i = bisect_left(self._rows, source_index.row())
+        if i < len(self._rows) and self._rows[i] == source_index.row():
+            return self.index(i, source_index.column())
+        return QModelIndex()
+
+    def source_row(self, row: int) -> int:
+        return self._rows[row]
+
+    def rows_from_source(self, source_rows: typing.Iterable[int]) -> typing.List[int]:
+        """ Maps sorted rows of the source model to the rows shown, leaving out those filtered out."""
+        rows = []
+        for source_row in source_rows:
+            i = bisect_left(self._rows, source_row)
+            if i < len(self._rows) and self._rows[i] == source_row:
+                rows.append(i)
+        return rows
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        if parent.isValid() or not 0 <= row < len(self._rows) or not 0 <= column < self.columnCount():
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index: QModelIndex = ...) -> QModelIndex:
+        return QModelIndex()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid() or not self.sourceModel():
+            return 0
+        return self.sourceModel().columnCount(QModelIndex())
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = ...) -> typing.Any:
+        if orientation == Qt.Horizontal:
+            return self.sourceModel().headerData(section, orientation, role)
+        # Rows are numbered as in the source model
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        # Rows loaded after refresh() are exposed as the source model fetches them
+        if parent.isValid() or not self.sourceModel():
+            return False
+        return self.sourceModel().canFetchMore(QModelIndex())
+
+    def fetchMore(self, parent: QModelIndex) -> None:
+        if parent.isValid() or not self.sourceModel():
+            return
+        model: XliffModel = self.sourceModel()
+        count = len(self._rows)
+        # A batch fetched may hold no row meeting the filter, which would leave views waiting.
+        while len(self._rows) == count and model.canFetchMore(QModelIndex()):
+            model.fetchMore(QModelIndex())
@@ -1,26 +1,295 @@
 #!/usr/bin/env python3
+import itertools
+import os
 import typing
 
-from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor
 
 from capybara_tw.model.capy_xliff import CapyXliff
+from capybara_tw.model.capy_trans_unit import CapyTransUnit
+from capybara_tw.model.capy_xliff_index import CapyXliffIndex, CapyXliffSnapshot, LazyTransUnitList, iter_segments
+from capybara_tw.tm.translation_memory import CONFIRMED_STATES
+from capybara_tw.util import concordance, file_util, repetitions
+from capybara_tw.util.concordance import ConcordanceIndex
+from capybara_tw.util.edit_journal import EditJournal
+from capybara_tw.util.repetitions import RepetitionIndex
+from capybara_tw.util.segment_filter import SegmentFilterIndex, SegmentFlags
+from capybara_tw.util.xliff_util import State
 
 GetSourceRole = Qt.UserRole + 1
 GetTargetRole = Qt.UserRole + 2
 GetTransUnitRole = Qt.UserRole + 3
 
+# Number of trans-units handed over from the loader thread at once
+LOAD_BATCH_SIZE = 500
+# Number of rows exposed to views by each fetchMore call
+FETCH_BATCH_SIZE = 200
+# Background of the cells matching the search
+SEARCH_HIGHLIGHT = QBrush(QColor(255, 236, 140))
+# Column recorded in the edit journal for a change of state, whose text is then the new state value
+STATE_COLUMN = 2
+
+IndexEntry = typing.Tuple[typing.Set[str], typing.Set[str], SegmentFlags, str]
+
+
+def index_entry(source: str, target: str, state: State) -> IndexEntry:
+    """Computes what the model indexes about a segment: the concordance terms of its source and target, its flags,
+    and the repetition key of its source.
+    """
+    return (concordance.terms(source), concordance.terms(target), SegmentFlags.of(source, target, state),
+            repetitions.repetition_key(source))
+
+
+class XliffLoader(QThread):
+    """Loads a capyxliff file into a CapyXliff on a worker thread, handing trans-units over in batches
+    together with their index entries.
+    """
+    batchLoaded = pyqtSignal(list, list, int)  # Trans-units, their index entries, and progress in percent
+    loaded = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, xliff: CapyXliff, filename: str, parent=None):
+        super().__init__(parent)
+        self.xliff = xliff
+        self.filename = filename
+
+    def run(self) -> None:
+        try:
+            batch = []
+            with open(self.filename, 'rb') as infile:
+                size = os.fstat(infile.fileno()).st_size or 1
+                for tu in self.xliff.iter_load(infile):
+                    batch.append(tu)
+                    if len(batch) >= LOAD_BATCH_SIZE:
+                        self.emit_batch(batch, infile.tell() * 100 // size)
+                        batch = []
+                    if self.isInterruptionRequested():
+                        return
+            self.emit_batch(batch, 100)
+            self.loaded.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def emit_batch(self, batch: typing.List[CapyTransUnit], progress: int) -> None:
+        entries = [index_entry(tu.source.text, tu.target.text, tu.target.state) for tu in batch]
+        self.batchLoaded.emit(batch, entries, progress)
+
+
+class SegmentIndexer(QThread):
+    """Reads the segments of a capyxliff file on a worker thread, handing their index entries over in batches.
+    Used in lazy mode, where the trans-units are not loaded up front.
+    """
+    batchIndexed = pyqtSignal(list)  # Index entries of the next trans-units
+    failed = pyqtSignal(str)  # Emitted after the entries read so far have been handed over
+
+    def __init__(self, filename: str, parent=None):
+        super().__init__(parent)
+        self.filename = filename
+
+    def run(self) -> None:
+        batch = []
+        try:
+            for source, target, state in iter_segments(self.filename):
+                batch.append(index_entry(source, target, state))
+                if len(batch) >= LOAD_BATCH_SIZE:
+                    self.batchIndexed.emit(batch)
+                    batch = []
+                if self.isInterruptionRequested():
+                    return
+        except Exception as e:
+            # Search and filters are limited to the trans-units indexed so far.
+            self.batchIndexed.emit(batch)
+            self.failed.emit(str(e))
+            return
+        self.batchIndexed.emit(batch)
+
+
+class XliffSaver(QThread):
+    """Writes a snapshot into a temporary file next to the destination on a worker thread, and indexes it.
+
+    The temporary file is moved over the destination by the model on the GUI thread once the thread has finished,
+    so that the file is never replaced while trans-units are being read from it.
+    """
+
+    def __init__(self, snapshot: CapyXliffSnapshot, filename: str, parent=None):
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.filename = filename
+        self.temp_path: typing.Optional[str] = None
+        self.index: typing.Optional[CapyXliffIndex] = None
+        self.error: typing.Optional[str] = None
+
+    def run(self) -> None:
+        try:
+            self.temp_path = self.snapshot.write_temporary(self.filename)
+            self.index = CapyXliffIndex.build(self.temp_path)
+        except Exception as e:
+            if self.temp_path:
+                file_util.remove_if_exists(self.temp_path)
+            self.error = str(e)
+
 
 class XliffModel(QAbstractTableModel):
+    loadingProgressed = pyqtSignal(int)
+    loadingFinished = pyqtSignal()
+    loadingFailed = pyqtSignal(str)
+    indexingFailed = pyqtSignal(str)  # Lazy mode only. The rows left out of the index are not searched or filtered.
+    savingFinished = pyqtSignal()
+    savingFailed = pyqtSignal(str)
+    # Emitted before a save moves the new file over the old one. Readers of the file, such as the QA runner,
+    # stop reading it until savingFinished or savingFailed has been emitted.
+    fileAboutToBeReplaced = pyqtSignal()
+    segmentsEdited = pyqtSignal(list)  # Rows whose source, target or state has been changed
 
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, lazy: bool = False):
+        """
+        Args:
+            filename: Path to the capyxliff file
+            lazy: True to index the trans-units at open time and build them on first access,
+                  otherwise all trans-units are loaded on a worker thread after load() has been called.
+        """
         super().__init__()
         self.filename = filename
-        self.xliff = CapyXliff.load(self.filename)
+        index = None
+        if lazy:
+            try:
+                index = CapyXliffIndex.build(filename)
+            except ValueError:
+                # The trans-units cannot be located by the index, so the file is loaded in full.
+                lazy = False
+        self.lazy = lazy
         self._headers = ['Source', 'Target']
-        self._data = [tu for tu in self.xliff.get_all_trans_units()]
+        self._row_count = 0  # Number of rows exposed to views so far
+        self._loader: typing.Optional[XliffLoader] = None
+        self._indexer: typing.Optional[SegmentIndexer] = None
+        # Concordance indexes of the source and target columns, and the rows of each column matching the search
+        self._concordance = (ConcordanceIndex(), ConcordanceIndex())
+        self._search_hits: typing.Tuple[typing.Set[int], typing.Set[int]] = (set(), set())
+        self._filter_index = SegmentFilterIndex()
+        self._repetitions = RepetitionIndex()
+        # Rows edited before the indexer has reached them (lazy mode)
+        self._edited_rows: typing.Set[int] = set()
+        self._indexing_failed = False
+        if lazy:
+            self.xliff = None
+            self._data = LazyTransUnitList(index)
+            self._indexer = SegmentIndexer(self.filename, self)
+            self._indexer.batchIndexed.connect(self.__on_batch_indexed)
+            self._indexer.failed.connect(self.__on_indexing_failed)
+        else:
+            self.xliff = CapyXliff()
+            self._data = []
+            self._loader = XliffLoader(self.xliff, self.filename, self)
+            self._loader.batchLoaded.connect(self.__on_batch_loaded)
+            self._loader.loaded.connect(self.__on_loaded)
+            self._loader.failed.connect(self.__on_failed)
+        self._is_loading = False
+        self._saver: typing.Optional[XliffSaver] = None
+        self._journal_mark = 0  # End of the journal when the running save was started
+        self._is_modified = False
+        self._journal = EditJournal(self.filename)
+        # Edits left unsaved by a previous session, to be recovered or discarded once loaded
+        self._pending_edits = self._journal.read()
+        self._pending_edits_end = self._journal.mark()
+
+    def load(self) -> None:
+        """Starts loading the trans-units. Rows are added through fetchMore as soon as they are available."""
+        if self._loader:
+            self._is_loading = True
+            self._loader.start()
+        else:
+            self._indexer.start()
+            self.fetchMore(QModelIndex())
+            self.loadingProgressed.emit(100)
+            self.loadingFinished.emit()
+
+    def stop_loading(self) -> None:
+        for thread in (self._loader, self._indexer):
+            if thread and thread.isRunning():
+                thread.requestInterruption()
+                thread.wait()
+        self._is_loading = False
+
+    @property
+    def is_loading(self) -> bool:
+        return self._is_loading
+
+    @property
+    def is_indexing(self) -> bool:
+        """Indicates whether the segments are still being indexed, so searches and filters may miss some rows."""
+        return not self._indexing_failed and not self.is_index_complete
+
+    @property
+    def is_index_complete(self) -> bool:
+        """Indicates whether all the rows loaded have been indexed. Never the case again once indexing has failed."""
+        return len(self._filter_index) >= len(self._data)
+
+    def __on_batch_loaded(self, batch: typing.List, entries: typing.List[IndexEntry], progress: int) -> None:
+        is_first_batch = not self._data
+        exhausted = self._row_count == len(self._data)
+        self._data.extend(batch)
+        self.__index(entries)
+        if is_first_batch:
+            # The languages are known once the first file element has been parsed
+            self.headerDataChanged.emit(Qt.Horizontal, 0, len(self._headers) - 1)
+        if exhausted:
+            # Views have already fetched every row available, so keep feeding them.
+            self.fetchMore(QModelIndex())
+        self.loadingProgressed.emit(progress)
+
+    def __on_batch_indexed(self, entries: typing.List[IndexEntry]) -> None:
+        start = len(self._filter_index)
+        for row in sorted(self._edited_rows):
+            if start <= row < start + len(entries):
+                # The entry read from the file is outdated.
+                tu = self._data[row]
+                entries[row - start] = index_entry(tu.source.text, tu.target.text, tu.target.state)
+                self._edited_rows.discard(row)
+        self.__index(entries)
+
+    def __index(self, entries: typing.List[IndexEntry]) -> None:
+        self._concordance[0].add([source_terms for source_terms, _, _, _ in entries])
+        self._concordance[1].add([target_terms for _, target_terms, _, _ in entries])
+        self._filter_index.add([flags for _, _, flags, _ in entries])
+        self._repetitions.add([key for _, _, _, key in entries])
+
+    def __on_indexing_failed(self, message: str) -> None:
+        self._indexing_failed = True
+        self.indexingFailed.emit(message)
+
+    def __on_loaded(self) -> None:
+        self._is_loading = False
+        self.loadingFinished.emit()
+
+    def __on_failed(self, message: str) -> None:
+        self._is_loading = False
+        self.loadingFailed.emit(message)
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        if parent.isValid():
+            return False
+        return self._row_count < len(self._data)
+
+    def fetchMore(self, parent: QModelIndex) -> None:
+        if parent.isValid():
+            return
+        count = min(FETCH_BATCH_SIZE, len(self._data) - self._row_count)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._row_count, self._row_count + count - 1)
+        self._row_count += count
+        self.endInsertRows()
+
+    def fetch_all(self) -> None:
+        """Exposes all the rows loaded so far to views at once."""
+        if self._row_count < len(self._data):
+            self.beginInsertRows(QModelIndex(), self._row_count, len(self._data) - 1)
+            self._row_count = len(self._data)
+            self.endInsertRows()
 
     def rowCount(self, parent: QModelIndex = ...) -> int:
-        return len(self._data)
+        return self._row_count
 
     def columnCount(self, parent: QModelIndex = ...) -> int:
         return len(self._headers)
@@ -40,6 +309,9 @@ class XliffModel(QAbstractTableModel):
         if role == GetTransUnitRole:
             tu = self._data[index.row()]
             return tu
+        if role == Qt.BackgroundRole and index.column() in (0, 1):
+            if index.row() in self._search_hits[index.column()]:
+                return SEARCH_HIGHLIGHT
 
     def headerData(self, section: int, orientation: Qt.Orientation, role: int = ...) -> typing.Any:
         if orientation == Qt.Horizontal and role == Qt.DisplayRole:
@@ -53,25 +325,260 @@ class XliffModel(QAbstractTableModel):
 
     def setData(self, index: QModelIndex, value: typing.Any, role: int = ...) -> bool:
         if index.isValid() and role == Qt.EditRole:
-            if index.column() == 0:
-                self._data[index.row()].source.text = value
-            else:
-                self._data[index.row()].target.text = value
+            self._journal.append(index.row(), index.column(), value)
+            self.__set_text(index.row(), index.column(), value)
+            self._is_modified = True
             self.dataChanged.emit(index, index, [role])
+            self.segmentsEdited.emit([index.row()])
             return True
         return False
 
-    def save_data(self):
-        self.xliff.save(self.filename)
+    def __set_text(self, row: int, column: int, text: str) -> None:
+        tu = self._data[row]
+        segment = tu.source if column == 0 else tu.target
+        old_text = segment.text
+        segment.text = text
+        if row < len(self._filter_index):
+            self._concordance[column].update(row, old_text, text)
+            self._filter_index.update(row, SegmentFlags.of(tu.source.text, tu.target.text, tu.target.state))
+            if column == 0:
+                self._repetitions.update(row, repetitions.repetition_key(text))
+        else:
+            self._edited_rows.add(row)
+
+    def __set_state(self, row: int, state: State) -> None:
+        tu = self._data[row]
+        tu.target.state = state
+        if row < len(self._filter_index):
+            self._filter_index.update(row, SegmentFlags.of(tu.source.text, tu.target.text, state))
+        else:
+            self._edited_rows.add(row)
+
+    def repetitions(self, row: int) -> typing.List[int]:
+        """ Returns the other rows whose source is a repetition of the source of row (see repetitions.repetition_key()).
+        Rows not indexed yet in lazy mode are left out.
+        """
+        return self._repetitions.repetitions(row)
+
+    def confirm(self, row: int) -> int:
+        """ Confirms the translation of a row, and propagates it to the repetitions of the row which have not been
+        confirmed, with their tags mapped. Views are notified of all the rows changed with a single dataChanged.
+
+        Args:
+            row: Row whose target is not empty
+
+        Returns: Number of repetitions filled
+        """
+        tu = self._data[row]
+        edits = []
+        if tu.target.state not in CONFIRMED_STATES:
+            self.__set_state(row, State.TRANSLATED)
+            edits.append((row, STATE_COLUMN, State.TRANSLATED.value))
+        changed = [row]
+        for other in self._repetitions.repetitions(row):
+            other_tu = self._data[other]
+            if other_tu.target.state in CONFIRMED_STATES:
+                continue
+            text = repetitions.adapt_translation(tu.target.text, tu.source.text, other_tu.source.text)
+            self.__set_text(other, 1, text)
+            other_tu.sync_target_tags()
+            self.__set_state(other, State.TRANSLATED)
+            edits += [(other, 1, text), (other, STATE_COLUMN, State.TRANSLATED.value)]
+            changed.append(other)
+        if edits:
+            self._journal.extend(edits)
+            self._is_modified = True
+        self.__emit_rows_changed(changed)
+        self.segmentsEdited.emit(changed)
+        return len(changed) - 1
+
+    def unconfirm(self, row: int) -> None:
+        """ Sends a confirmed translation back to review. Its repetitions are left as they are."""
+        if self._data[row].target.state in CONFIRMED_STATES:
+            self.__set_state(row, State.NEEDS_REVIEW_TRANSLATION)
+            self._journal.append(row, STATE_COLUMN, State.NEEDS_REVIEW_TRANSLATION.value)
+            self._is_modified = True
+            self.__emit_rows_changed([row])
+            self.segmentsEdited.emit([row])
+
+    def __emit_rows_changed(self, rows: typing.List[int]) -> None:
+        rows = [row for row in rows if row < self._row_count]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), len(self._headers) - 1),
+                                  [Qt.DisplayRole, Qt.EditRole])
+
+    @property
+    def segment_count(self) -> int:
+        """Number of rows loaded, including those not fetched by views yet."""
+        return len(self._data)
+
+    def segment(self, row: int) -> typing.Tuple[str, str, State]:
+        """ Returns the source text, target text and target state of a row."""
+        tu = self._data[row]
+        return tu.source.text, tu.target.text, tu.target.state
+
+    def iter_segments(self, first: int = 0) -> typing.Iterator[typing.Tuple[str, str, State]]:
+        """ Returns an iterator over the source text, target text and target state of each row loaded,
+        which can be consumed on another thread. In lazy mode, the segments are read from the file,
+        except for those modified since it has been saved.
+
+        Args:
+            first: Row to start from
+        """
+        if not self.lazy:
+            tus = self._data[first:]
+            return ((tu.source.text, tu.target.text, tu.target.state) for tu in tus)
+        # Copied on this thread, as the trans-units can be modified while the file is being read
+        unsaved = {i: (tu.source.text, tu.target.text, tu.target.state) for i, tu in self._data.unsaved().items()}
+        segments = itertools.islice(enumerate(iter_segments(self._data.index.filename)), first, None)
+        return (unsaved.get(i, segment) for i, segment in segments)
+
+    def filter_rows(self, states: typing.Optional[typing.Collection[State]] = None, empty_target: bool = False,
+                    tag_mismatch: bool = False, pattern: typing.Optional[typing.Pattern] = None,
+                    first: int = 0, end: typing.Optional[int] = None) -> typing.List[int]:
+        """ Finds the rows meeting all the given criteria.
+
+        The states, empty targets and tag mismatches are looked up in the filter index,
+        so only the rows meeting them are matched against pattern.
+
+        Args:
+            states: States any of which the targets must be in
+            empty_target: True for the rows whose target is empty only
+            tag_mismatch: True for the rows whose target tags differ from the source ones only
+            pattern: Regular expression the source or the target must match
+            first: First row to consider
+            end: Row to stop at, None for all the rows loaded
+
+        Returns: Sorted rows
+        """
+        end = len(self._data) if end is None else min(end, len(self._data))
+        rows = self._filter_index.rows(states, empty_target, tag_mismatch)
+        rows = range(first, end) if rows is None else sorted(row for row in rows if first <= row < end)
+        if pattern is not None:
+            rows = [row for row in rows
+                    if pattern.search(self._data[row].source.text) or pattern.search(self._data[row].target.text)]
+        return list(rows)
+
+    def search(self, query: str) -> typing.List[int]:
+        """ Finds the rows whose source or target contains all the words of query, and highlights the matching cells.
+        Japanese and Chinese text is matched by pairs of characters.
+
+        Args:
+            query: Words to search for. Tags are ignored. An empty query clears the highlights.
+
+        Returns: Sorted rows
+        """
+        previous = self._search_hits
+        if query.strip():
+            self._search_hits = (set(self._concordance[0].search(query)), set(self._concordance[1].search(query)))
+        else:
+            self._search_hits = (set(), set())
+        changed = [row for row in (previous[0] ^ self._search_hits[0]) | (previous[1] ^ self._search_hits[1])
+                   if row < self._row_count]
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), 0), self.index(max(changed), len(self._headers) - 1),
+                                  [Qt.BackgroundRole])
+        return sorted(self._search_hits[0] | self._search_hits[1])
+
+    @property
+    def is_modified(self) -> bool:
+        """Indicates whether the data has been edited since the last save was started."""
+        return self._is_modified
+
+    @property
+    def has_pending_edits(self) -> bool:
+        """Indicates whether the journal holds edits left unsaved by a previous session."""
+        return bool(self._pending_edits)
+
+    def recover_pending_edits(self) -> None:
+        """Replays the edits left unsaved by a previous session onto the loaded data.
+        They are kept in the journal until the next save.
+        """
+        for row, column, text in self._pending_edits:
+            if not 0 <= row < len(self._data):
+                continue
+            if column == STATE_COLUMN:
+                self.__set_state(row, State.create(text))
+            else:
+                self.__set_text(row, column, text)
+                # Tags copied from the source are added to the target tag list after the edit has been journaled.
+                self._data[row].sync_target_tags()
+        rows = sorted({row for row, _, _ in self._pending_edits if 0 <= row < len(self._data)})
+        if self._pending_edits:
+            self._is_modified = True
+        self._pending_edits = []
+        if self._row_count:
+            self.dataChanged.emit(self.index(0, 0), self.index(self._row_count - 1, len(self._headers) - 1))
+        if rows:
+            self.segmentsEdited.emit(rows)
+
+    def discard_pending_edits(self) -> None:
+        self._journal.discard_until(self._pending_edits_end)
+        self._pending_edits = []
+
+    @property
+    def is_saving(self) -> bool:
+        return self._saver is not None
+
+    def save_data(self) -> None:
+        """Starts saving the data to the file on a worker thread.
+
+        A snapshot of the modified trans-units is taken on the calling thread,
+        so that editing can go on while the file is written. Emits savingFinished or savingFailed when done.
+        """
+        if self._saver:
+            return
+        snapshot = self._data.snapshot() if self.lazy else self.xliff.snapshot()
+        self._journal_mark = self._journal.mark()
+        self._is_modified = False
+        self._saver = XliffSaver(snapshot, self.filename, self)
+        self._saver.finished.connect(self.__on_saver_finished)
+        self._saver.start()
+
+    def finish_saving(self) -> None:
+        """Blocks until the running save, if any, has completed."""
+        if self._saver:
+            self._saver.wait()
+            self.__on_saver_finished()
+
+    def __on_saver_finished(self) -> None:
+        saver = self._saver
+        if saver is None or saver.isRunning():
+            # Already handled by finish_saving()
+            return
+        self._saver = None
+        error = saver.error
+        if error is None:
+            self.fileAboutToBeReplaced.emit()
+            try:
+                file_util.replace(saver.temp_path, self.filename)
+            except OSError as e:
+                error = str(e)
+        if error is not None:
+            saver.snapshot.revert()
+            self._is_modified = True
+            self.savingFailed.emit(error)
+            return
+        saver.index.filename = self.filename
+        if self.lazy:
+            self._data.saved(saver.index)
+        else:
+            self.xliff.source_index = saver.index
+        self._journal.discard_until(self._journal_mark)
+        self.savingFinished.emit()
 
     @property
     def source_language(self) -> str:
+        if self.lazy:
+            return self._data.index.source_language
         if self.xliff:
             return self.xliff.source_language
         return ''
 
     @property
     def target_language(self) -> str:
+        if self.lazy:
+            return self._data.index.target_language
         if self.xliff:
             return self.xliff.target_language
         return ''
@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
 from capybara_tw import run
 
-run()
+# Guarded, as the QA worker processes are spawned and import the main module
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,52 @@
+import pytest
+
+from capybara_tw.model.capy_body import CapyBody
+from capybara_tw.model.capy_file import CapyFile
+from capybara_tw.model.capy_group import CapyGroup
+from capybara_tw.model.capy_source import CapySource
+from capybara_tw.model.capy_source_props import CapySourceProps
+from capybara_tw.model.capy_target import CapyTarget
+from capybara_tw.model.capy_target_props import CapyTargetProps
+from capybara_tw.model.capy_trans_unit import CapyTransUnit
+from capybara_tw.model.capy_xliff import CapyXliff
+from capybara_tw.util.xliff_util import State
+
+
+def make_trans_unit(source: str, target: str = '', state: State = State.NONE, tu_id: str = '1') -> CapyTransUnit:
+    tu = CapyTransUnit()
+    tu.id = tu.original_id = tu_id
+    tu.source = CapySource()
+    tu.source.text = source
+    tu.target = CapyTarget()
+    tu.target.text = target
+    tu.target.state = state
+    tu.capy_source_props = CapySourceProps()
+    tu.capy_target_props = CapyTargetProps()
+    return tu
+
+
+@pytest.fixture(name='make_trans_unit')
+def make_trans_unit_fixture():
+    return make_trans_unit
+
+
+@pytest.fixture
+def make_xliff():
+    """Returns a function building a document from groups of (source, target, state) tuples, all in one file."""
+
+    def make(*groups, original: str = 'doc.docx') -> CapyXliff:
+        xliff = CapyXliff()
+        capy_file = CapyFile()
+        capy_file.original = original
+        capy_file.source_language = 'en-US'
+        capy_file.target_language = 'ja-JP'
+        capy_file.body = CapyBody()
+        for i, segments in enumerate(groups):
+            group = CapyGroup()
+            group.id = f'g{i}'
+            group.trans_units = [make_trans_unit(*segment, tu_id=f'{i}-{j}') for j, segment in enumerate(segments)]
+            capy_file.body.groups.append(group)
+        xliff.files.append(capy_file)
+        return xliff
+
+    return make
@@ -0,0 +1,50 @@
+from capybara_tw.util.concordance import ConcordanceIndex, query_terms, terms
+
+JAPANESE = '{1>リンゴ<1}を一日一個食べれば医者いらず'
+
+
+def build_index(texts):
+    index = ConcordanceIndex()
+    index.add([index.terms(text) for text in texts])
+    return index
+
+
+def test_terms_strip_tags_and_lowercase():
+    assert terms('Hello {1>World<1}!') == {'hello', 'world'}
+
+
+def test_terms_keep_letter_runs_whole():
+    assert terms('Привет, мир') == {'привет', 'мир'}
+
+
+def test_cjk_query_terms_are_bigrams():
+    assert query_terms('食べれば') == {'食べ', 'べれ', 'れば'}
+    assert query_terms('食') == {'食'}
+
+
+def test_search_cjk_substrings():
+    index = build_index(['Hello world', JAPANESE])
+    for query in ('食べれば', '個食べ', '一日一個食べれば', '食', 'リンゴを', '医者いらず'):
+        assert index.search(query) == [1], query
+    assert index.search('食べない') == []
+
+
+def test_search_whole_words_only():
+    index = build_index(['Привет, Мария', 'Привет, мир'])
+    assert index.search('мир') == [1]
+    assert index.search('привет') == [0, 1]
+    assert index.search('привет мир') == [1]
+
+
+def test_search_empty_query():
+    assert build_index(['Hello']).search('  ') == []
+
+
+def test_update():
+    index = build_index(['red apple', 'green apple'])
+    index.update(0, 'red apple', 'red pear')
+    assert index.search('apple') == [1]
+    assert index.search('pear') == [0]
+    # Rows not indexed yet are ignored
+    index.update(5, '', 'pear')
+    assert index.search('pear') == [0]
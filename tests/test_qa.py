@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from capybara_tw.util import qa
+from capybara_tw.util.qa import QaIssue
+from capybara_tw.util.xliff_util import State
+
+
+def test_check_tags():
+    assert qa.check_tags('{1>a<1} {2}', '{1>b<1} {2}') == []
+    assert qa.check_tags('{1>a<1} {2}', '{1>b<1} {3}') == ['missing tags {2}', 'extra tags {3}']
+
+
+def test_check_numbers_ignores_separators():
+    assert qa.check_numbers('1,000.5 apples', '1.000,5 リンゴ') == []
+    assert qa.check_numbers('3 of 12', '12 of 4') == ['missing numbers 3', 'extra numbers 4']
+
+
+def test_check_numbers_ignores_tags():
+    assert qa.check_numbers('{1>Text<1} 5', '5 {2}') == []
+
+
+def test_check_whitespace():
+    assert qa.check_whitespace(' a ', ' b ') == []
+    assert qa.check_whitespace(' a', 'b ') == ['leading whitespace differs from the source',
+                                               'trailing whitespace differs from the source']
+
+
+def test_check_segment_empty_target():
+    assert qa.check_segment(3, 'a 1', '', State.NONE) == [QaIssue(3, qa.CHECK_EMPTY_TARGET, 'empty target')]
+    assert qa.check_segment(3, 'a', '', State.TRANSLATED)[0].message == 'empty target in state translated'
+
+
+def test_check_segment_order():
+    issues = qa.check_segment(0, '{1>a<1} 1', ' b 2', State.TRANSLATED)
+    assert [issue.check for issue in issues] == [qa.CHECK_TAGS, qa.CHECK_NUMBERS, qa.CHECK_NUMBERS,
+                                                 qa.CHECK_WHITESPACE]
+
+
+def test_iter_issues_in_chunks(monkeypatch):
+    monkeypatch.setattr(qa, 'CHUNK_SIZE', 3)
+    monkeypatch.setattr(qa, 'MAX_PENDING_CHUNKS', 2)
+    segments = [('a', '' if row % 4 == 0 else 'a', State.NONE) for row in range(10)]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(qa.iter_issues(executor, iter(segments), first_row=5))
+    assert [checked for checked, _ in results] == [8, 11, 14, 15]
+    assert [issue.row for _, issues in results for issue in issues] == [5, 9, 13]
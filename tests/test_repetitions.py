@@ -0,0 +1,47 @@
+from capybara_tw.util.repetitions import RepetitionIndex, adapt_translation, renumber_tags, repetition_key
+
+
+def test_repetition_key_folds_whitespace_and_renumbers_tags():
+    assert repetition_key(' {3>Save<3}  now\n') == '{1>Save<1} now'
+    assert repetition_key('{3>Save<3} {5}now') == repetition_key('{1>Save<1} {2}now')
+    assert repetition_key('{b>Save<b}') == '{b>Save<b}'
+    assert repetition_key('Save') != repetition_key('save')
+
+
+def test_renumber_tags():
+    assert renumber_tags('{1>a<1}{2}{b>c<b}', {'1': '3', '2': '4'}) == '{3>a<3}{4}{b>c<b}'
+    assert renumber_tags('{1>a<1}', {}) == '{1>a<1}'
+
+
+def test_adapt_translation():
+    assert adapt_translation('{2}{1>保存<1}', '{1>Save<1}{2}', '{4>Save<4}{7}') == '{7}{4>保存<4}'
+    assert adapt_translation('{1>保存<1}', '{1>Save<1}', '{1>Save<1}') == '{1>保存<1}'
+
+
+def build_index():
+    index = RepetitionIndex()
+    index.add([repetition_key(source) for source in ['Apple', 'Pear', '{2>Apple<2}', 'Apple', 'Plum']])
+    return index
+
+
+def test_repetitions():
+    index = build_index()
+    assert len(index) == 5
+    assert index.repetitions(0) == [3]
+    assert index.repetitions(3) == [0]
+    assert index.repetitions(1) == []
+    assert index.repetitions(5) == []
+    assert index.repetition_count == 1
+
+
+def test_update():
+    index = build_index()
+    index.update(1, repetition_key('Apple'))
+    assert index.repetitions(0) == [1, 3]
+    assert index.repetition_count == 2
+    index.update(3, repetition_key('Plum'))
+    assert index.repetitions(0) == [1]
+    assert index.repetitions(4) == [3]
+    assert index.repetition_count == 2
+    index.update(5, repetition_key('Apple'))
+    assert index.repetitions(0) == [1]
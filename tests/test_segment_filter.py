@@ -0,0 +1,51 @@
+from capybara_tw.util.segment_filter import SegmentFilterIndex, SegmentFlags
+from capybara_tw.util.xliff_util import State
+
+
+def build_index():
+    index = SegmentFilterIndex()
+    index.add([SegmentFlags.of('{1>Apple<1}', '', State.NONE),
+               SegmentFlags.of('{1>Apple<1}', '{1>リンゴ<1}', State.TRANSLATED),
+               SegmentFlags.of('{1>Apple<1}', 'リンゴ', State.TRANSLATED),
+               SegmentFlags.of('Pear', '梨', State.FINAL)])
+    return index
+
+
+def test_flags():
+    assert SegmentFlags.of('{1>Apple<1}', '', State.NEW) == SegmentFlags(State.NEW, True, False)
+    assert SegmentFlags.of('{1>Apple<1}', 'リンゴ', State.NEW) == SegmentFlags(State.NEW, False, True)
+    assert SegmentFlags.of('{1>Apple<1}', '{1>リンゴ<1}', State.NEW) == SegmentFlags(State.NEW, False, False)
+
+
+def test_no_criteria_matches_all_rows():
+    assert build_index().rows() is None
+
+
+def test_rows_by_criteria():
+    index = build_index()
+    assert len(index) == 4
+    assert index.count(State.TRANSLATED) == 2
+    assert index.rows(states=[State.TRANSLATED, State.FINAL]) == {1, 2, 3}
+    assert index.rows(empty_target=True) == {0}
+    assert index.rows(tag_mismatch=True) == {2}
+    assert index.rows(states=[State.TRANSLATED], tag_mismatch=True) == {2}
+    assert index.rows(states=[State.FINAL], empty_target=True) == set()
+    assert index.rows(states=[]) == set()
+
+
+def test_update():
+    index = build_index()
+    index.update(0, SegmentFlags.of('{1>Apple<1}', '{1>リンゴ<1}', State.TRANSLATED))
+    assert index.rows(states=[State.NONE]) == set()
+    assert index.rows(states=[State.TRANSLATED]) == {0, 1, 2}
+    assert index.rows(empty_target=True) == set()
+    index.update(2, SegmentFlags.of('{1>Apple<1}', '{1>リンゴ<1}', State.FINAL))
+    assert index.rows(tag_mismatch=True) == set()
+    assert index.rows(states=[State.FINAL]) == {2, 3}
+
+
+def test_update_of_unindexed_row_is_ignored():
+    index = build_index()
+    index.update(4, SegmentFlags.of('Plum', '', State.NONE))
+    assert len(index) == 4
+    assert index.rows(states=[State.NONE]) == {0}
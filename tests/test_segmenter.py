@@ -0,0 +1,30 @@
+import pytest
+
+from capybara_tw.util.segmenter import DictionarySegmenter, RegexSegmenter, Segmenter
+
+
+def test_segmenter_is_abstract():
+    with pytest.raises(TypeError):
+        Segmenter()
+
+
+def test_regex_segmenter_words():
+    assert RegexSegmenter().words('Save 2 files, Мария!') == ['Save', '2', 'files', ',', 'Мария', '!']
+
+
+def test_regex_segmenter_splits_scripts():
+    assert RegexSegmenter().words('日本語のテキスト') == ['日本語', 'の', 'テキスト']
+
+
+def test_count_words_excludes_punctuation():
+    assert RegexSegmenter().count_words('Привет, мир! 안녕하세요 세계') == 4
+
+
+def test_spans():
+    assert RegexSegmenter().spans('ab  c') == [(0, 2), (4, 5)]
+
+
+def test_dictionary_segmenter():
+    segmenter = DictionarySegmenter(['東京', '東京都', '都庁'])
+    assert segmenter.words('東京都庁へ行く') == ['東京都', '庁', 'へ', '行', 'く']
+    assert segmenter.words('Tokyo 東京') == ['Tokyo', '東京']
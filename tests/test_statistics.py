@@ -0,0 +1,47 @@
+import pytest
+
+from capybara_tw.util.statistics import SegmentStatistics
+from capybara_tw.util.xliff_util import State
+
+
+@pytest.fixture
+def stats(make_xliff):
+    xliff = make_xliff(
+        [('Save the {1>file<1}.', '{1>ファイル<1}を保存します。', State.TRANSLATED),
+         ('Save  the {2>file<2}.', '', State.NONE)],
+        [('Open it', 'Open it', State.NEEDS_TRANSLATION),
+         ('Close it', '閉じる', State.FINAL)])
+    return SegmentStatistics.of(xliff, 'a')
+
+
+def test_total(stats):
+    total = stats.aggregate()['total']
+    assert total == {'segments': 4, 'translated': 2, 'words': 10, 'characters': 44, 'tags': 4,
+                     'repetitions': 1, 'repeated_words': 3}
+
+
+def test_translated_counts_confirmed_states_only(stats):
+    by_state = stats.aggregate('state')
+    assert by_state['needs-translation']['translated'] == 0
+    assert by_state['translated']['translated'] == 1
+    assert by_state['final']['translated'] == 1
+    assert 'none' in by_state and by_state['none']['translated'] == 0
+
+
+def test_by_group(stats):
+    by_group = stats.aggregate('group')
+    assert list(by_group) == ['a:doc.docx#g0', 'a:doc.docx#g1']
+    assert by_group['a:doc.docx#g0']['repetitions'] == 1
+    assert by_group['a:doc.docx#g1']['segments'] == 2
+
+
+def test_repetitions_across_documents(make_xliff):
+    stats = SegmentStatistics()
+    stats.add_xliff(make_xliff([('Hello', '', State.NONE)]), 'a')
+    stats.add_xliff(make_xliff([('Hello', '', State.NONE)]), 'b')
+    assert stats.aggregate('file')['b:doc.docx']['repetitions'] == 1
+
+
+def test_unknown_grouping(stats):
+    with pytest.raises(ValueError):
+        stats.aggregate('language')
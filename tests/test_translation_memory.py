@@ -0,0 +1,47 @@
+import pytest
+
+from capybara_tw.tm.translation_memory import TranslationMemory
+from capybara_tw.util.xliff_util import State
+
+
+@pytest.fixture
+def tm(tmp_path):
+    with TranslationMemory(str(tmp_path / 'tm.db')) as tm:
+        tm.add_all([('Save the file', 'ファイルを保存します'),
+                    ('Save the files', 'ファイルを保存します。'),
+                    ('Open the window', 'ウィンドウを開きます')], 'en-US', 'ja-JP')
+        yield tm
+
+
+def test_exact_match_ranks_first(tm):
+    matches = tm.lookup('Save the file', 'en-US', 'ja-JP')
+    assert [(m.target, m.is_exact) for m in matches] == [('ファイルを保存します', True), ('ファイルを保存します。', False)]
+    assert 0.7 <= matches[1].score < 1
+
+
+def test_min_score(tm):
+    assert tm.lookup('Save the file', 'en-US', 'ja-JP', min_score=0.99) == tm.lookup('Save the file', 'en-US', 'ja-JP', limit=1)
+    assert tm.lookup('Something else entirely', 'en-US', 'ja-JP') == []
+
+
+def test_language_pair(tm):
+    assert tm.lookup('Save the file', 'en-US', 'fr-FR') == []
+    # Language codes are case-insensitive
+    assert tm.lookup('Save the file', 'EN-us', 'JA-jp')
+
+
+def test_duplicates_are_ignored(tm):
+    assert not tm.add('Save the file', 'ファイルを保存します', 'en-US', 'ja-JP')
+    assert len(tm) == 3
+
+
+def test_import_trans_units_confirmed_only(tm, make_trans_unit):
+    tus = [make_trans_unit('Close', '閉じる', State.TRANSLATED),
+           make_trans_unit('Print', '印刷', State.NEEDS_REVIEW_TRANSLATION),
+           make_trans_unit('Quit', '', State.FINAL)]
+    assert tm.import_trans_units(tus, 'en-US', 'ja-JP') == 1
+
+
+def test_find_alt_translations(tm, make_trans_unit):
+    alt_translations = tm.find_alt_translations(make_trans_unit('Save the file'), 'en-US', 'ja-JP', limit=1)
+    assert [(a.match_quality, a.target.text) for a in alt_translations] == [('100', 'ファイルを保存します')]